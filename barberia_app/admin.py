@@ -1,29 +1,121 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.template.response import TemplateResponse
 from django.utils.html import format_html
-from django.db.models import Count, Sum
+from django.db.models import Count, F, Sum
 from django.urls import reverse
 from django.utils import timezone
 from django.db import models  # Añade esta importación
+from django.forms.models import BaseInlineFormSet
+from django.shortcuts import redirect
 from django.urls import path
 from .models import *
 from .views import crear_venta_desde_cita
+from . import (
+    auditoria, busqueda_clientes, catalogo, comisiones, dashboard, exportacion, generacion_ventas, graficos, importacion,
+    instrumentacion, replicas, reposicion, resumen_ventas, visitas_clientes,
+)
+from .fechas import fecha_local
 from django.contrib.admin import ModelAdmin, TabularInline
 from django.contrib.admin import AdminSite
 # Importar los modelos
 from .models import (
     Cliente, Empleado, Servicio, Cita, DetalleCita,
     Producto, Venta, DetalleVenta, MovimientoInventario,
-    HorarioEmpleado, Auditoria
+    HorarioEmpleado, Auditoria, PeriodoComision, PronosticoReposicion, SegmentoCliente, SegmentoRFM
 )
 
 
+# Importación masiva desde CSV/XLSX (ver importacion.py)
+class ImportarCatalogoMixin:
+    catalogo_importacion = None
+    change_list_template = 'admin/barberia_app/importar_change_list.html'
+    rechazos_visibles = 200
+    
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.model_name
+        return [
+            path('importar/', self.admin_site.admin_view(self.importar_view), name='%s_%s_importar' % info),
+        ] + super().get_urls()
+    
+    def importar_view(self, request):
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+        request.current_app = self.admin_site.name
+        contexto = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': f'Importar {self.model._meta.verbose_name_plural}',
+            'clave': importacion.CATALOGOS[self.catalogo_importacion][1],
+        }
+        archivo = request.FILES.get('archivo') if request.method == 'POST' else None
+        if archivo:
+            rechazos = []
+            
+            def rechazar(numero, fila, motivo):
+                if len(rechazos) < self.rechazos_visibles:
+                    rechazos.append((numero, fila, motivo))
+            
+            lector = importacion.LECTORES[importacion.formato_de(archivo.name)]
+            try:
+                resultado = importacion.importar(self.catalogo_importacion, lector(archivo.file), rechazos=rechazar)
+            except ValueError as exc:
+                self.message_user(request, str(exc), messages.ERROR)
+            else:
+                contexto.update(resultado=resultado, rechazos=rechazos)
+        return TemplateResponse(request, 'admin/barberia_app/importar_catalogo.html', contexto)
+
+# Autocompletado: en lugar de contar todos los resultados de la búsqueda
+# (un COUNT(*) que recorre todas las coincidencias) se lee una fila de más
+# para saber si hay otra página.
+class PaginaSinConteo(Page):
+    def __init__(self, object_list, number, paginator, hay_mas):
+        super().__init__(object_list, number, paginator)
+        self.hay_mas = hay_mas
+    
+    def has_next(self):
+        return self.hay_mas
+
+class PaginadorSinConteo(Paginator):
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('El número de página no es un entero')
+        if number < 1:
+            raise EmptyPage('El número de página es menor que 1')
+        return number
+    
+    def page(self, number):
+        number = self.validate_number(number)
+        inicio = (number - 1) * self.per_page
+        filas = list(self.object_list[inicio:inicio + self.per_page + 1])
+        return PaginaSinConteo(filas[:self.per_page], number, self, len(filas) > self.per_page)
+
+# Filtro por el segmento RFM calculado en lote (ver segmentos_clientes.py)
+class SegmentoRFMFilter(admin.SimpleListFilter):
+    title = 'segmento RFM'
+    parameter_name = 'segmento'
+    
+    def lookups(self, request, model_admin):
+        return SegmentoRFM.choices
+    
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(segmento__segmento=self.value())
+        return queryset
+
 # Cliente Admin
-class ClienteAdmin(admin.ModelAdmin):
-    list_display = ('nombre_completo', 'telefono', 'email', 'fecha_registro', 'ultima_visita', 'activo')
-    list_filter = ('activo', 'fecha_registro')
+class ClienteAdmin(ImportarCatalogoMixin, admin.ModelAdmin):
+    catalogo_importacion = 'clientes'
+    list_display = ('nombre_completo', 'telefono', 'email', 'fecha_registro', 'ultima_visita', 'visitas', 'activo')
+    list_filter = ('activo', SegmentoRFMFilter, 'fecha_registro')
     search_fields = ('nombre', 'apellido', 'telefono', 'email')
     date_hierarchy = 'fecha_registro'
-    readonly_fields = ('fecha_registro', 'ultima_visita')
+    # Más recientes primero; el autocompletado necesita un orden estable
+    ordering = ('-cliente_id',)
+    readonly_fields = ('fecha_registro', 'ultima_visita', 'visitas', 'gasto_total')
     fieldsets = (
         ('Información Personal', {
             'fields': (('nombre', 'apellido'), 'fecha_nacimiento', ('telefono', 'email'), 'direccion')
@@ -32,7 +124,7 @@ class ClienteAdmin(admin.ModelAdmin):
             'fields': ('preferencias', 'historial_notas')
         }),
         ('Estado', {
-            'fields': ('activo', ('fecha_registro', 'ultima_visita'))
+            'fields': ('activo', ('fecha_registro', 'ultima_visita'), ('visitas', 'gasto_total'))
         }),
     )
     
@@ -40,19 +132,55 @@ class ClienteAdmin(admin.ModelAdmin):
         return f"{obj.nombre} {obj.apellido}"
     nombre_completo.short_description = 'Nombre Completo'
     
+    def get_search_results(self, request, queryset, search_term):
+        # Buscador y autocompletado (Cita, Venta) usan el índice de busqueda_clientes.py
+        # en lugar de icontains sobre search_fields
+        if not search_term.strip():
+            return queryset, False
+        return busqueda_clientes.filtrar(queryset, search_term, con_limite=self._es_autocompletado(request)), False
+    
+    def _es_autocompletado(self, request):
+        return bool(request.resolver_match and request.resolver_match.url_name == 'autocomplete')
+    
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        if self._es_autocompletado(request):
+            return PaginadorSinConteo(queryset, per_page, orphans, allow_empty_first_page)
+        return super().get_paginator(request, queryset, per_page, orphans, allow_empty_first_page)
+    
     actions = ['marcar_como_activo', 'marcar_como_inactivo']
     
     def marcar_como_activo(self, request, queryset):
-        queryset.update(activo=True)
+        auditoria.actualizar(queryset, activo=True)
     marcar_como_activo.short_description = "Marcar clientes seleccionados como activos"
     
     def marcar_como_inactivo(self, request, queryset):
-        queryset.update(activo=False)
+        auditoria.actualizar(queryset, activo=False)
     marcar_como_inactivo.short_description = "Marcar clientes seleccionados como inactivos"
 
+# La duración de la cita sale de sus servicios: se valida el turno y los solapes
+# aquí, cuando ya se conocen las líneas (la cita nueva aún no tiene duracion_total)
+class DetalleCitaFormSet(BaseInlineFormSet):
+    def clean(self):
+        super().clean()
+        if any(self.errors):
+            return
+        duraciones = [
+            form.cleaned_data['duracion_minutos'] for form in self.forms
+            if form.cleaned_data and not form.cleaned_data.get('DELETE')
+        ]
+        cita = self.instance
+        if not duraciones or not (cita.empleado_id and cita.fecha_hora):
+            return
+        cita.duracion_total = sum(duraciones)
+        try:
+            cita.validar_agenda()
+        except ValidationError as exc:
+            raise ValidationError(exc.messages)
+
 # DetalleCita Inline para Cita Admin
 class DetalleCitaInline(admin.TabularInline):
     model = DetalleCita
+    formset = DetalleCitaFormSet
     extra = 1
     fields = ('servicio', 'precio_aplicado', 'duracion_minutos', 'notas')
     autocomplete_fields = ['servicio']
@@ -62,20 +190,27 @@ class CitaAdmin(admin.ModelAdmin):
     list_display = ('cita_id', 'cliente_nombre', 'empleado_nombre', 'fecha_hora', 'duracion_total', 'estado', 'acciones')
     list_filter = ('estado', 'fecha_hora', 'empleado')
     search_fields = ('cliente__nombre', 'cliente__apellido', 'empleado__nombre', 'empleado__apellido')
-    readonly_fields = ('fecha_creacion', 'duracion_total')
+    readonly_fields = ('fecha_creacion', 'duracion_total', 'fecha_hora_fin')
     date_hierarchy = 'fecha_hora'
     inlines = [DetalleCitaInline]
     autocomplete_fields = ['cliente', 'empleado']
     
     fieldsets = (
         ('Información de la Cita', {
-            'fields': (('cliente', 'empleado'), 'fecha_hora', 'duracion_total', 'estado')
+            'fields': (('cliente', 'empleado'), 'fecha_hora', ('duracion_total', 'fecha_hora_fin'), 'estado')
         }),
         ('Detalles', {
             'fields': ('notas', 'fecha_creacion')
         }),
     )
     
+    def get_queryset(self, request):
+        # Cliente y empleado en el mismo JOIN y el id de la venta asociada anotado,
+        # así el changelist no consulta por fila.
+        return super().get_queryset(request).select_related('cliente', 'empleado').annotate(
+            venta_asociada_id=models.F('venta__venta_id')
+        )
+    
     def cliente_nombre(self, obj):
         if obj.cliente:
             return f"{obj.cliente.nombre} {obj.cliente.apellido}"
@@ -100,14 +235,14 @@ class CitaAdmin(admin.ModelAdmin):
     def acciones(self, obj):
         btns = []
         if obj.estado == 'completada':
-        # Verificar si tiene venta asociada
-            try:
-                venta = Venta.objects.get(cita=obj)
+        # Verificar si tiene venta asociada (anotado en get_queryset)
+            venta_id = getattr(obj, 'venta_asociada_id', None)
+            if venta_id:
                 btns.append(
-                f'<a class="button" href="{reverse("admin:barberia_app_venta_change", args=[venta.pk])}">'
+                f'<a class="button" href="{reverse("admin:barberia_app_venta_change", args=[venta_id])}">'
                 f'<i class="fas fa-eye"></i> Ver Venta</a>'
             )
-            except Venta.DoesNotExist:
+            else:
             # Construir la URL directamente
                 btns.append(
                 f'<a class="button" href="/admin/barberia_app/cita/{obj.pk}/crear-venta/">'
@@ -117,19 +252,35 @@ class CitaAdmin(admin.ModelAdmin):
         return format_html('&nbsp;'.join(btns)) if btns else '-'
     acciones.short_description = 'Acciones'
     
-    actions = ['marcar_como_completada', 'marcar_como_cancelada', 'marcar_como_no_asistio']
+    actions = ['marcar_como_completada', 'marcar_como_cancelada', 'marcar_como_no_asistio', 'generar_ventas']
     
     def marcar_como_completada(self, request, queryset):
-        queryset.update(estado='completada')
+        nuevas = list(queryset.exclude(estado='completada').values_list('pk', flat=True))
+        auditoria.actualizar(queryset, estado='completada')
+        # Visitas de los clientes en un UPDATE por conjuntos (update() no dispara signals)
+        visitas_clientes.citas_completadas(nuevas)
+        dashboard.invalidar_modelo(Cita)
     marcar_como_completada.short_description = "Marcar como completadas"
     
+    def _descompletar(self, queryset, estado):
+        # Las citas que dejan de estar completadas restan visitas: se recalculan sus clientes
+        clientes = set(queryset.filter(estado='completada', cliente__isnull=False).values_list('cliente_id', flat=True))
+        auditoria.actualizar(queryset, estado=estado)
+        visitas_clientes.recalcular(clientes)
+        dashboard.invalidar_modelo(Cita)
+    
     def marcar_como_cancelada(self, request, queryset):
-        queryset.update(estado='cancelada')
+        self._descompletar(queryset, 'cancelada')
     marcar_como_cancelada.short_description = "Marcar como canceladas"
     
     def marcar_como_no_asistio(self, request, queryset):
-        queryset.update(estado='no_asistio')
+        self._descompletar(queryset, 'no_asistio')
     marcar_como_no_asistio.short_description = "Marcar como no asistió"
+    
+    def generar_ventas(self, request, queryset):
+        creadas = generacion_ventas.generar_ventas_en_lote(queryset)
+        self.message_user(request, f"Se generaron {creadas} ventas a partir de las citas completadas seleccionadas.")
+    generar_ventas.short_description = "Generar ventas de las citas completadas"
 
 # Horario Empleado Inline
 class HorarioEmpleadoInline(admin.TabularInline):
@@ -161,19 +312,23 @@ class EmpleadoAdmin(admin.ModelAdmin):
     actions = ['marcar_como_activo', 'marcar_como_inactivo', 'marcar_como_vacaciones']
     
     def marcar_como_activo(self, request, queryset):
-        queryset.update(estado='activo')
+        auditoria.actualizar(queryset, estado='activo')
+        dashboard.invalidar_modelo(Empleado)
     marcar_como_activo.short_description = "Marcar como activos"
     
     def marcar_como_inactivo(self, request, queryset):
-        queryset.update(estado='inactivo')
+        auditoria.actualizar(queryset, estado='inactivo')
+        dashboard.invalidar_modelo(Empleado)
     marcar_como_inactivo.short_description = "Marcar como inactivos"
     
     def marcar_como_vacaciones(self, request, queryset):
-        queryset.update(estado='vacaciones')
+        auditoria.actualizar(queryset, estado='vacaciones')
+        dashboard.invalidar_modelo(Empleado)
     marcar_como_vacaciones.short_description = "Marcar en vacaciones"
 
 # Servicio Admin
-class ServicioAdmin(admin.ModelAdmin):
+class ServicioAdmin(ImportarCatalogoMixin, admin.ModelAdmin):
+    catalogo_importacion = 'servicios'
     list_display = ('nombre', 'categoria', 'duracion_minutos', 'precio', 'activo')
     list_filter = ('categoria', 'activo')
     search_fields = ('nombre', 'descripcion', 'categoria')
@@ -193,16 +348,20 @@ class ServicioAdmin(admin.ModelAdmin):
     
     actions = ['marcar_como_activo', 'marcar_como_inactivo']
     
+    # queryset.update() no dispara signals: el catálogo en memoria se invalida aquí
     def marcar_como_activo(self, request, queryset):
-        queryset.update(activo=True)
+        auditoria.actualizar(queryset, activo=True)
+        catalogo.invalidar()
     marcar_como_activo.short_description = "Marcar como activos"
     
     def marcar_como_inactivo(self, request, queryset):
-        queryset.update(activo=False)
+        auditoria.actualizar(queryset, activo=False)
+        catalogo.invalidar()
     marcar_como_inactivo.short_description = "Marcar como inactivos"
 
 # Producto Admin
-class ProductoAdmin(admin.ModelAdmin):
+class ProductoAdmin(ImportarCatalogoMixin, admin.ModelAdmin):
+    catalogo_importacion = 'productos'
     list_display = ('nombre', 'marca', 'categoria', 'precio_venta', 'stock_actual', 'estado_stock', 'activo')
     list_filter = ('categoria', 'marca', 'para_venta', 'activo')
     search_fields = ('nombre', 'descripcion', 'marca', 'categoria')
@@ -249,6 +408,7 @@ class VentaAdmin(admin.ModelAdmin):
     date_hierarchy = 'fecha_hora'
     inlines = [DetalleVentaInline]
     autocomplete_fields = ['cliente', 'empleado', 'cita']
+    list_select_related = ('cliente', 'empleado')
     
     fieldsets = (
         ('Información de la Venta', {
@@ -272,16 +432,39 @@ class VentaAdmin(admin.ModelAdmin):
         return f"{obj.empleado.nombre} {obj.empleado.apellido}"
     empleado_nombre.short_description = 'Empleado'
     
-    actions = ['marcar_como_anulada', 'marcar_como_reembolsada']
+    actions = ['marcar_como_anulada', 'marcar_como_reembolsada', 'exportar_csv', 'exportar_jsonl', 'exportar_detalles_csv']
     
     def marcar_como_anulada(self, request, queryset):
-        queryset.update(estado='anulada')
+        self._cambiar_estado(queryset, 'anulada')
     marcar_como_anulada.short_description = "Marcar como anuladas"
     
     def marcar_como_reembolsada(self, request, queryset):
-        queryset.update(estado='reembolsada')
+        self._cambiar_estado(queryset, 'reembolsada')
     marcar_como_reembolsada.short_description = "Marcar como reembolsadas"
     
+    # Las exportaciones se envían en streaming (ver exportacion.py)
+    def exportar_csv(self, request, queryset):
+        return exportacion.respuesta('ventas', queryset, 'csv')
+    exportar_csv.short_description = "Exportar ventas seleccionadas (CSV)"
+    
+    def exportar_jsonl(self, request, queryset):
+        return exportacion.respuesta('ventas', queryset, 'jsonl')
+    exportar_jsonl.short_description = "Exportar ventas seleccionadas (JSONL)"
+    
+    def exportar_detalles_csv(self, request, queryset):
+        detalles = DetalleVenta.objects.filter(venta__in=queryset.values('pk'))
+        return exportacion.respuesta('detalle_ventas', detalles, 'csv')
+    exportar_detalles_csv.short_description = "Exportar líneas de las ventas seleccionadas (CSV)"
+    
+    def _cambiar_estado(self, queryset, estado):
+        # queryset.update() no dispara signals: se reconstruyen los días afectados del
+        # resumen y se recalculan los clientes de las ventas
+        filas = list(queryset.values_list('fecha_hora', 'cliente_id'))
+        auditoria.actualizar(queryset, estado=estado)
+        resumen_ventas.reconstruir_dias({fecha_local(fecha) for fecha, _ in filas})
+        visitas_clientes.recalcular({cliente_id for _, cliente_id in filas if cliente_id})
+        dashboard.invalidar_modelo(Venta)
+    
     def save_model(self, request, obj, form, change):
         # Calcular totales antes de guardar
         if not change:  # Solo si es nuevo
@@ -296,6 +479,7 @@ class MovimientoInventarioAdmin(admin.ModelAdmin):
     search_fields = ('producto__nombre', 'motivo', 'documento_referencia')
     date_hierarchy = 'fecha_hora'
     autocomplete_fields = ['producto', 'empleado', 'venta']
+    list_select_related = ('producto', 'empleado')
     
     fieldsets = (
         ('Información del Movimiento', {
@@ -313,18 +497,29 @@ class MovimientoInventarioAdmin(admin.ModelAdmin):
     empleado_nombre.short_description = 'Empleado'
     
     def referencia(self, obj):
-        if obj.venta:
-            return f"Venta #{obj.venta.venta_id}"
+        if obj.venta_id:
+            return f"Venta #{obj.venta_id}"
         if obj.documento_referencia:
             return obj.documento_referencia
         return obj.motivo or "-"
     referencia.short_description = 'Referencia'
+    
+    actions = ['exportar_csv', 'exportar_jsonl']
+    
+    def exportar_csv(self, request, queryset):
+        return exportacion.respuesta('movimientos', queryset, 'csv')
+    exportar_csv.short_description = "Exportar movimientos seleccionados (CSV)"
+    
+    def exportar_jsonl(self, request, queryset):
+        return exportacion.respuesta('movimientos', queryset, 'jsonl')
+    exportar_jsonl.short_description = "Exportar movimientos seleccionados (JSONL)"
 
 # HorarioEmpleado Admin
 class HorarioEmpleadoAdmin(admin.ModelAdmin):
     list_display = ('empleado_nombre', 'dia_semana_nombre', 'hora_inicio', 'hora_fin', 'es_descanso')
     list_filter = ('dia_semana', 'es_descanso', 'empleado')
     autocomplete_fields = ['empleado']
+    list_select_related = ('empleado',)
     
     def empleado_nombre(self, obj):
         return f"{obj.empleado.nombre} {obj.empleado.apellido}"
@@ -335,11 +530,13 @@ class HorarioEmpleadoAdmin(admin.ModelAdmin):
     dia_semana_nombre.short_description = 'Día'
 
 # Auditoria Admin
-class AuditoriaAdmin(admin.ModelAdmin):
+class AuditoriaAdmin(replicas.LecturaEnReplicaAdminMixin, admin.ModelAdmin):
     list_display = ('log_id', 'tabla_afectada', 'operacion', 'registro_id', 'fecha_hora', 'usuario_db')
     list_filter = ('tabla_afectada', 'operacion', 'fecha_hora')
     search_fields = ('tabla_afectada', 'registro_id', 'usuario_db', 'usuario_app')
     date_hierarchy = 'fecha_hora'
+    # Evita el COUNT(*) completo de la tabla en cada página del changelist
+    show_full_result_count = False
     readonly_fields = ('log_id', 'tabla_afectada', 'operacion', 'registro_id', 
                      'datos_antiguos', 'datos_nuevos', 'usuario_db', 
                      'usuario_app', 'fecha_hora', 'ip_origen')
@@ -353,6 +550,97 @@ class AuditoriaAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False
 
+# Métricas volcadas por instrumentacion.py (solo lectura)
+class MetricaVistaAdmin(replicas.LecturaEnReplicaAdminMixin, admin.ModelAdmin):
+    list_display = ('vista', 'desde', 'hasta', 'peticiones', 'errores', 'duracion_media_ms', 'duracion_max_ms', 'consultas', 'sql_ms')
+    list_filter = ('desde',)
+    search_fields = ('vista',)
+    date_hierarchy = 'desde'
+    show_full_result_count = False
+    
+    def duracion_media_ms(self, obj):
+        return round(obj.duracion_total_ms / obj.peticiones, 1) if obj.peticiones else None
+    duracion_media_ms.short_description = 'Duración media (ms)'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+# Meses de comisiones cerrados desde la página 'Comisiones' o con cerrar_comisiones (solo lectura)
+class PeriodoComisionAdmin(replicas.LecturaEnReplicaAdminMixin, admin.ModelAdmin):
+    list_display = ('mes', 'empleado', 'porcentaje_comision', 'ventas', 'ingresos_servicios', 'ingresos_productos',
+                    'descuentos', 'reembolsos', 'anulaciones', 'comision', 'cerrado_en')
+    list_filter = ('mes', 'empleado')
+    list_select_related = ('empleado',)
+    date_hierarchy = 'mes'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+# Segmentos RFM calculados por calcular_segmentos_clientes (solo lectura)
+class SegmentoClienteAdmin(replicas.LecturaEnReplicaAdminMixin, admin.ModelAdmin):
+    list_display = ('cliente', 'segmento', 'puntuacion_r', 'puntuacion_f', 'puntuacion_m',
+                    'recencia_dias', 'frecuencia', 'monetario', 'calculado_en')
+    list_filter = ('segmento', 'puntuacion_r', 'puntuacion_f', 'puntuacion_m')
+    list_select_related = ('cliente',)
+    ordering = ('-monetario',)
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+class UrgenciaReposicionFilter(admin.SimpleListFilter):
+    title = 'urgencia'
+    parameter_name = 'urgencia'
+    
+    def lookups(self, request, model_admin):
+        return (
+            ('sin_stock', 'Sin stock'),
+            ('en_plazo', 'Se agota antes de recibir un pedido'),
+            ('reponer', 'Con pedido sugerido'),
+        )
+    
+    def queryset(self, request, queryset):
+        if self.value() == 'sin_stock':
+            return queryset.filter(producto__stock_actual__lte=0)
+        if self.value() == 'en_plazo':
+            return queryset.filter(dias_hasta_agotar__lte=reposicion.configuracion()['PLAZO_ENTREGA_DIAS'])
+        if self.value() == 'reponer':
+            return queryset.filter(cantidad_sugerida__gt=0)
+        return queryset
+
+# Pronósticos calculados por pronosticar_reposicion (solo lectura)
+class PronosticoReposicionAdmin(replicas.LecturaEnReplicaAdminMixin, admin.ModelAdmin):
+    list_display = ('producto', 'stock_actual', 'stock', 'consumo_diario', 'dias_hasta_agotar', 'fecha_agotamiento',
+                    'punto_pedido', 'cantidad_sugerida', 'calculado_en')
+    list_filter = (UrgenciaReposicionFilter, 'producto__categoria')
+    search_fields = ('producto__nombre', 'producto__marca')
+    list_select_related = ('producto',)
+    # Primero los que se agotan antes; los que no se agotan al final
+    ordering = (F('dias_hasta_agotar').asc(nulls_last=True), '-cantidad_sugerida')
+    
+    def stock_actual(self, obj):
+        return obj.producto.stock_actual
+    stock_actual.short_description = 'Stock actual'
+    stock_actual.admin_order_field = 'producto__stock_actual'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
 # Registrar los modelos con sus clases Admin
 admin.site.register(Cliente, ClienteAdmin)
 admin.site.register(Empleado, EmpleadoAdmin)
@@ -363,6 +651,10 @@ admin.site.register(Venta, VentaAdmin)
 admin.site.register(MovimientoInventario, MovimientoInventarioAdmin)
 admin.site.register(HorarioEmpleado, HorarioEmpleadoAdmin)
 admin.site.register(Auditoria, AuditoriaAdmin)
+admin.site.register(MetricaVista, MetricaVistaAdmin)
+admin.site.register(PeriodoComision, PeriodoComisionAdmin)
+admin.site.register(SegmentoCliente, SegmentoClienteAdmin)
+admin.site.register(PronosticoReposicion, PronosticoReposicionAdmin)
 
 # Personalización del Admin
 admin.site.site_header = "Administración de Barbería"
@@ -373,10 +665,13 @@ admin.site.index_title = "Bienvenido al Sistema de Gestión"
 
 from django.contrib.admin.views.decorators import staff_member_required
 from django.utils.decorators import method_decorator
-from django.views.generic import TemplateView
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.generic import TemplateView, View
 from django.db.models import Count, Sum, Q
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 # Importaciones adicionales
 from django.contrib import admin
@@ -390,71 +685,27 @@ class DashboardView(TemplateView):
     def dispatch(self, request, *args, **kwargs):
         # Establecer el admin_site antes de cualquier procesamiento
         self.admin_site = barberia_admin_site
-        return super().dispatch(request, *args, **kwargs)
+        # Solo lectura: los widgets se calculan desde la réplica si está configurada
+        with replicas.lectura(request.method == 'GET'):
+            return replicas.renderizar(super().dispatch(request, *args, **kwargs))
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        today = timezone.now().date()
-        
-        
-        # Citas del día
-        context['citas_hoy'] = Cita.objects.filter(
-            fecha_hora__date=today
-        ).order_by('fecha_hora')
-        
-        # Empleados disponibles hoy
-        context['empleados_disponibles'] = Empleado.objects.filter(
-            estado='activo'
-        )
-        
-        # Productos con bajo stock
-        context['productos_bajo_stock'] = Producto.objects.filter(
-        stock_actual__lte=models.F('stock_minimo'),
-        activo=True
-        )
-        
-        # Ventas del día
-        context['ventas_hoy'] = Venta.objects.filter(
-            fecha_hora__date=today, 
-            estado='completada'
-        )
-        
-        # Total ventas hoy
-        context['total_ventas_hoy'] = context['ventas_hoy'].aggregate(
-            total=Sum('total')
-        )['total'] or 0
         
-        # Ventas de la semana
-        semana_pasada = today - timedelta(days=7)
-        context['ventas_semana'] = Venta.objects.filter(
-            fecha_hora__date__gte=semana_pasada,
-            fecha_hora__date__lte=today,
-            estado='completada'
-        )
-        
-        # Total ventas semana
-        context['total_ventas_semana'] = context['ventas_semana'].aggregate(
-            total=Sum('total')
-        )['total'] or 0
-        
-        # Servicios más solicitados
-        context['servicios_populares'] = DetalleVenta.objects.filter(
-            tipo='servicio',
-            venta__estado='completada'
-        ).values('servicio__nombre').annotate(
-            total=Count('servicio')
-        ).order_by('-total')[:5]
-        
-        # Productos más vendidos
-        context['productos_populares'] = DetalleVenta.objects.filter(
-            tipo='producto',
-            venta__estado='completada'
-        ).values('producto__nombre').annotate(
-            total=Count('producto')
-        ).order_by('-total')[:5]
-        
-        # Actividad reciente
-        context['actividad_reciente'] = Auditoria.objects.all().order_by('-fecha_hora')[:10]
+        # Cada widget se lee de su propia entrada de caché (ver dashboard.py)
+        widgets = dashboard.widgets()
+        context.update(widgets)
+        context['ventas_hoy'] = widgets['ventas']['hoy']
+        context['ventas_semana'] = widgets['ventas']['semana']
+        context['total_ventas_hoy'] = context['ventas_hoy']['total']
+        context['total_ventas_semana'] = context['ventas_semana']['total']
+        context['servicios_populares'] = widgets['populares']['servicios']
+        context['productos_populares'] = widgets['populares']['productos']
+        context['estadisticas_cache'] = dashboard.estadisticas()
+        # Gráficos de tendencia que el usuario puede ver (ver GraficosView)
+        context['graficos'] = [
+            serie for serie, (_, _, permiso) in graficos.SERIES.items() if self.request.user.has_perm(permiso)
+        ]
         
         context.update({
             'site_title': self.admin_site.site_title,
@@ -467,6 +718,127 @@ class DashboardView(TemplateView):
 
         return context
 
+# Página de rendimiento: latencia y SQL por vista medidos por InstrumentacionMiddleware
+class RendimientoView(TemplateView):
+    template_name = 'admin/rendimiento.html'
+    
+    @method_decorator(staff_member_required)
+    def dispatch(self, request, *args, **kwargs):
+        # Mismo permiso que el enlace del menú (JAZZMIN_SETTINGS) y la lista de métricas
+        if not request.user.has_perm('barberia_app.view_metricavista'):
+            raise PermissionDenied
+        self.admin_site = barberia_admin_site
+        return super().dispatch(request, *args, **kwargs)
+    
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_superuser:
+            raise PermissionDenied
+        if 'volcar' in request.POST:
+            instrumentacion.registro.volcar()
+            messages.success(request, 'Métricas pendientes volcadas a la tabla.')
+        else:
+            instrumentacion.registro.reiniciar()
+            messages.success(request, 'Mediciones en memoria reiniciadas.')
+        return redirect(request.path)
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        config = instrumentacion.configuracion()
+        sentencias = instrumentacion.sentencias_lentas()
+        # EXPLAIN ejecuta la sentencia con sus parámetros reales: solo superusuarios
+        explain = config['EXPLAIN'] and self.request.user.is_superuser
+        explicar = self.request.GET.get('explain')
+        for sentencia in sentencias:
+            if explain and sentencia['id'] == explicar:
+                sentencia['plan'] = instrumentacion.explicar(sentencia['normalizada'])
+        context.update(self.admin_site.each_context(self.request))
+        context.update({
+            'title': 'Rendimiento',
+            'configuracion': config,
+            'explain': explain,
+            'desde': instrumentacion.registro.desde,
+            'limites_histograma': instrumentacion.LIMITES_HISTOGRAMA,
+            'vistas': instrumentacion.resumen_vistas(),
+            'sentencias': sentencias,
+        })
+        return context
+
+# Informe de comisiones por empleado y mes (ver comisiones.py)
+class ComisionesView(TemplateView):
+    template_name = 'admin/comisiones.html'
+    
+    @method_decorator(staff_member_required)
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.has_perm('barberia_app.view_periodocomision'):
+            raise PermissionDenied
+        self.admin_site = barberia_admin_site
+        with replicas.lectura(request.method == 'GET'):
+            return replicas.renderizar(super().dispatch(request, *args, **kwargs))
+    
+    def post(self, request, *args, **kwargs):
+        if not request.user.has_perm('barberia_app.add_periodocomision'):
+            raise PermissionDenied
+        try:
+            mes = datetime.strptime(request.POST.get('cerrar', ''), '%Y-%m').date()
+            empleados = comisiones.cerrar(mes)
+        except ValueError as exc:
+            messages.error(request, f'No se pudo cerrar el mes: {exc}')
+        else:
+            messages.success(request, f'Mes {mes:%Y-%m} cerrado: {empleados} empleados.')
+        return redirect(request.get_full_path())
+    
+    def _mes(self, parametro, defecto):
+        try:
+            return datetime.strptime(self.request.GET.get(parametro, ''), '%Y-%m').date()
+        except ValueError:
+            return defecto
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        actual = comisiones.mes_de(timezone.localdate())
+        hasta = self._mes('hasta', actual)
+        # Por defecto, los doce meses que terminan en 'hasta'
+        desde = self._mes('desde', comisiones.siguiente_mes(hasta.replace(year=hasta.year - 1)))
+        if desde > hasta:
+            desde = hasta
+        context.update(self.admin_site.each_context(self.request))
+        context.update({
+            'title': 'Comisiones',
+            'desde': desde,
+            'hasta': hasta,
+            'puede_cerrar': self.request.user.has_perm('barberia_app.add_periodocomision'),
+            **comisiones.informe(desde, hasta),
+        })
+        return context
+
+# Series de los gráficos del dashboard en JSON por columnas (ver graficos.py)
+class GraficosView(View):
+    
+    @method_decorator(staff_member_required)
+    def dispatch(self, request, *args, **kwargs):
+        return super().dispatch(request, *args, **kwargs)
+    
+    def get(self, request, serie):
+        if serie not in graficos.SERIES:
+            return JsonResponse({'error': f'Serie desconocida: {serie}'}, status=404)
+        if not request.user.has_perm(graficos.SERIES[serie][2]):
+            raise PermissionDenied
+        try:
+            desde, hasta, agrupacion = graficos.parametros(request.GET)
+        except ValueError as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        with replicas.lectura():
+            contenido, etag, cambio = graficos.respuesta(serie, desde, hasta, agrupacion)
+        ultima_modificacion = int(cambio)
+        # Con If-None-Match / If-Modified-Since que coinciden se responde 304 sin cuerpo
+        no_modificada = get_conditional_response(request, etag=etag, last_modified=ultima_modificacion)
+        response = no_modificada or HttpResponse(contenido, content_type='application/json')
+        response.headers['ETag'] = etag
+        response.headers['Last-Modified'] = http_date(ultima_modificacion)
+        # El navegador guarda la respuesta pero la revalida en cada uso
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
 # Asegúrate de que esta parte esté en la clase BarberiaAdminSite
 class BarberiaAdminSite(admin.AdminSite):
     site_header = "Administración de Barbería"
@@ -484,6 +856,10 @@ class BarberiaAdminSite(admin.AdminSite):
         # Esta función se llamará desde get_urls
         return [
             path('', self.admin_view(DashboardView.as_view()), name='index'),
+            path('rendimiento/', self.admin_view(RendimientoView.as_view()), name='rendimiento'),
+            path('comisiones/', self.admin_view(ComisionesView.as_view()), name='comisiones'),
+            # cacheable: sin never_cache, para que el navegador guarde la serie y la revalide con el ETag
+            path('graficos/<slug:serie>/', self.admin_view(GraficosView.as_view(), cacheable=True), name='graficos'),
         ]
     
     def get_app_list(self, request):
@@ -503,6 +879,10 @@ barberia_admin_site.register(Venta, VentaAdmin)
 barberia_admin_site.register(MovimientoInventario, MovimientoInventarioAdmin)
 barberia_admin_site.register(HorarioEmpleado, HorarioEmpleadoAdmin)
 barberia_admin_site.register(Auditoria, AuditoriaAdmin)
+barberia_admin_site.register(MetricaVista, MetricaVistaAdmin)
+barberia_admin_site.register(PeriodoComision, PeriodoComisionAdmin)
+barberia_admin_site.register(SegmentoCliente, SegmentoClienteAdmin)
+barberia_admin_site.register(PronosticoReposicion, PronosticoReposicionAdmin)
 
 # Importante: También registra los modelos de auth
 from django.contrib.auth.models import User, Group
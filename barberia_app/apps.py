@@ -6,4 +6,6 @@ class BarberiaAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'barberia_app' # Este debe ser el nombre de tu aplicación
 
-   
\ No newline at end of file
+    def ready(self):
+        # Conecta los receivers de signals.py y registra los checks de checks.py
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,191 @@
+import gzip
+import hashlib
+import json
+import os
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Min
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+
+from . import auditoria, dashboard, fechas
+from .models import Auditoria
+
+
+# Retención de la tabla auditoria por meses.
+# Los meses anteriores al horizonte de retención se vuelcan a archivos JSONL
+# comprimidos (uno por mes, o varias partes si llegan filas tardías) y luego se
+# borran de la tabla. manifest.json guarda por archivo el mes, el número de filas,
+# el rango de log_id y de fechas y el sha256, y permite leer un rango archivado
+# sin restaurarlo en la tabla.
+
+CAMPOS = (
+    'log_id', 'tabla_afectada', 'operacion', 'registro_id', 'datos_antiguos', 'datos_nuevos',
+    'usuario_db', 'usuario_app', 'fecha_hora', 'ip_origen',
+)
+LOTE = 5000
+MANIFIESTO = 'manifest.json'
+
+
+def directorio_por_defecto():
+    return Path(auditoria.configuracion()['DIRECTORIO_ARCHIVO'] or Path(settings.BASE_DIR) / 'archivo_auditoria')
+
+
+def _primer_dia(fecha):
+    return fecha.replace(day=1)
+
+
+def _sumar_meses(fecha, meses):
+    total = fecha.year * 12 + fecha.month - 1 + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def limite_retencion(meses=None, hoy=None):
+    # Primer día (local) del mes más antiguo que se conserva en la tabla.
+    meses = auditoria.configuracion()['RETENCION_MESES'] if meses is None else meses
+    return _sumar_meses(_primer_dia(hoy or fechas.hoy()), -meses)
+
+
+def leer_manifiesto(directorio):
+    ruta = Path(directorio) / MANIFIESTO
+    if not ruta.exists():
+        return {'archivos': []}
+    with open(ruta, encoding='utf-8') as archivo:
+        return json.load(archivo)
+
+
+def _guardar_manifiesto(directorio, manifiesto):
+    ruta = Path(directorio) / MANIFIESTO
+    temporal = ruta.with_suffix('.tmp')
+    with open(temporal, 'w', encoding='utf-8') as archivo:
+        json.dump(manifiesto, archivo, indent=2, ensure_ascii=False)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+
+
+def _borrar_hasta(consulta, log_id_max):
+    # Borrado por tramos de log_id para no cargar el mes entero en memoria. Se
+    # borran los ids leídos y no su rango: con varios procesos escribiendo la
+    # auditoría, los log_id de meses distintos se intercalan y en el rango habría
+    # filas de otros meses aún sin archivar.
+    borradas = 0
+    while True:
+        ids = list(consulta.filter(log_id__lte=log_id_max).order_by('log_id').values_list('log_id', flat=True)[:LOTE])
+        if not ids:
+            return borradas
+        with transaction.atomic():
+            borradas += Auditoria.objects.filter(log_id__in=ids).delete()[0]
+
+
+def archivar_mes(mes, directorio):
+    # mes: date con el primer día del mes. Devuelve la entrada del manifiesto o None.
+    directorio = Path(directorio)
+    directorio.mkdir(parents=True, exist_ok=True)
+    del_mes = Auditoria.objects.entre(mes, _sumar_meses(mes, 1) - timedelta(days=1))
+
+    manifiesto = leer_manifiesto(directorio)
+    previas = [entrada for entrada in manifiesto['archivos'] if entrada['mes'] == mes.strftime('%Y-%m')]
+    ya_archivado = max((entrada['log_id_max'] for entrada in previas), default=0)
+    if ya_archivado:
+        # Completa un borrado interrumpido de una ejecución anterior
+        _borrar_hasta(del_mes, ya_archivado)
+
+    nombre = f"auditoria-{mes:%Y-%m}" + (f".parte{len(previas) + 1}" if previas else '') + '.jsonl.gz'
+    ruta = directorio / nombre
+    temporal = ruta.with_name(ruta.name + '.tmp')
+    resumen = {'filas': 0, 'log_id_min': None, 'log_id_max': None, 'fecha_min': None, 'fecha_max': None}
+    ultimo = ya_archivado
+    with gzip.open(temporal, 'wt', encoding='utf-8') as salida:
+        while True:
+            filas = list(del_mes.filter(log_id__gt=ultimo).order_by('log_id').values(*CAMPOS)[:LOTE])
+            if not filas:
+                break
+            for fila in filas:
+                salida.write(json.dumps(fila, cls=DjangoJSONEncoder, ensure_ascii=False))
+                salida.write('\n')
+                if resumen['fecha_min'] is None or fila['fecha_hora'] < resumen['fecha_min']:
+                    resumen['fecha_min'] = fila['fecha_hora']
+                if resumen['fecha_max'] is None or fila['fecha_hora'] > resumen['fecha_max']:
+                    resumen['fecha_max'] = fila['fecha_hora']
+            resumen['filas'] += len(filas)
+            resumen['log_id_min'] = resumen['log_id_min'] or filas[0]['log_id']
+            resumen['log_id_max'] = ultimo = filas[-1]['log_id']
+
+    if not resumen['filas']:
+        temporal.unlink()
+        return None
+
+    sha256 = hashlib.sha256()
+    with open(temporal, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(1 << 20), b''):
+            sha256.update(bloque)
+    os.replace(temporal, ruta)
+
+    entrada = {
+        'archivo': nombre,
+        'mes': mes.strftime('%Y-%m'),
+        'filas': resumen['filas'],
+        'log_id_min': resumen['log_id_min'],
+        'log_id_max': resumen['log_id_max'],
+        'fecha_min': resumen['fecha_min'].isoformat(),
+        'fecha_max': resumen['fecha_max'].isoformat(),
+        'sha256': sha256.hexdigest(),
+        'creado_en': timezone.now().isoformat(),
+    }
+    manifiesto['archivos'].append(entrada)
+    _guardar_manifiesto(directorio, manifiesto)
+
+    # Solo se borra lo que ya quedó archivado y registrado en el manifiesto
+    _borrar_hasta(del_mes, resumen['log_id_max'])
+    return entrada
+
+
+def archivar(meses=None, directorio=None, hoy=None):
+    # Archiva todos los meses anteriores al horizonte de retención.
+    directorio = directorio or directorio_por_defecto()
+    limite = limite_retencion(meses, hoy)
+    primera = Auditoria.objects.filter(fecha_hora__lt=fechas.inicio_del_dia(limite)).aggregate(
+        primera=Min('fecha_hora')
+    )['primera']
+    if primera is None:
+        return []
+
+    archivadas = []
+    mes = _primer_dia(fechas.fecha_local(primera))
+    while mes < limite:
+        entrada = archivar_mes(mes, directorio)
+        if entrada:
+            archivadas.append(entrada)
+        mes = _sumar_meses(mes, 1)
+    if archivadas:
+        dashboard.invalidar_modelo(Auditoria)
+    return archivadas
+
+
+def leer(desde, hasta, directorio=None, tabla=None, registro_id=None, operacion=None):
+    # Itera las filas archivadas entre dos fechas locales (inclusive) sin
+    # restaurarlas en la tabla. Solo abre los archivos cuyo rango se solapa.
+    directorio = Path(directorio or directorio_por_defecto())
+    inicio, fin = fechas.rango_utc(desde, hasta)
+    for entrada in sorted(leer_manifiesto(directorio)['archivos'], key=lambda entrada: entrada['log_id_min']):
+        if (parse_datetime(entrada['fecha_max']) < inicio
+                or parse_datetime(entrada['fecha_min']) >= fin):
+            continue
+        with gzip.open(directorio / entrada['archivo'], 'rt', encoding='utf-8') as archivo:
+            for linea in archivo:
+                fila = json.loads(linea)
+                fecha_hora = parse_datetime(fila['fecha_hora'])
+                if fecha_hora < inicio or fecha_hora >= fin:
+                    continue
+                if tabla and fila['tabla_afectada'] != tabla:
+                    continue
+                if registro_id is not None and fila['registro_id'] != str(registro_id):
+                    continue
+                if operacion and fila['operacion'] != operacion:
+                    continue
+                yield fila
@@ -0,0 +1,295 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, connections, router, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+
+from .models import (
+    Auditoria, Cita, Cliente, DetalleCita, DetalleVenta, Empleado, HorarioEmpleado,
+    MovimientoInventario, OperacionAuditoria, Producto, Servicio, Venta,
+)
+
+
+# Auditoría a nivel de aplicación.
+# Los signals de los modelos auditados generan entradas de Auditoria que se
+# entregan al buffer solo cuando la transacción que las produjo se confirma
+# (transaction.on_commit), así un rollback no deja rastro. El buffer es una cola
+# en memoria que se vuelca con un único bulk_create cuando alcanza TAMANO_LOTE
+# entradas o cuando han pasado INTERVALO segundos desde el último volcado: un
+# hilo del proceso lo comprueba cada INTERVALO segundos aunque no lleguen
+# peticiones, AuditoriaMiddleware también lo vuelca al terminar la petición si
+# el intervalo ya venció, y al salir del proceso se vacía lo pendiente.
+# Las entradas se quitan de la cola solo después de guardarlas: si la BD falla
+# se registra el error (no llega a la petición que disparó el volcado) y se
+# reintentan en el siguiente. La cola nunca pasa de MAX_PENDIENTES entradas:
+# si sigue llena después de intentar volcarla se descartan las más antiguas.
+#
+# Configuración en settings.BARBERIA_AUDITORIA:
+#   ACTIVA, TAMANO_LOTE, MAX_PENDIENTES, INTERVALO (segundos).
+#   RETENCION_MESES y DIRECTORIO_ARCHIVO los usa archivo_auditoria.py.
+
+MODELOS_AUDITADOS = (
+    Cliente, Empleado, Servicio, Cita, DetalleCita, Producto,
+    Venta, DetalleVenta, MovimientoInventario, HorarioEmpleado,
+)
+
+CONFIGURACION_POR_DEFECTO = {
+    'ACTIVA': True,
+    'TAMANO_LOTE': 100,
+    'MAX_PENDIENTES': 1000,
+    'INTERVALO': 5,
+    'RETENCION_MESES': 6,
+    'DIRECTORIO_ARCHIVO': None,  # None = BASE_DIR / 'archivo_auditoria'
+}
+
+logger = logging.getLogger(__name__)
+
+# (usuario_app, ip_origen) de la petición en curso; lo fija AuditoriaMiddleware
+_contexto = ContextVar('barberia_auditoria_contexto', default=(None, None))
+_desactivada = ContextVar('barberia_auditoria_desactivada', default=False)
+
+
+def configuracion():
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'BARBERIA_AUDITORIA', {})}
+
+
+def activa():
+    return configuracion()['ACTIVA'] and not _desactivada.get()
+
+
+@contextmanager
+def desactivada():
+    token = _desactivada.set(True)
+    try:
+        yield
+    finally:
+        _desactivada.reset(token)
+
+
+def fijar_contexto(usuario_app, ip_origen):
+    return _contexto.set((usuario_app, ip_origen))
+
+
+def restablecer_contexto(token):
+    _contexto.reset(token)
+
+
+_NATIVOS = (str, int, float, bool, type(None))
+_codificador = DjangoJSONEncoder()
+
+
+def _a_json(datos):
+    # Decimal, fechas, UUID... a tipos JSON nativos sin pasar por json.dumps/loads
+    return {
+        campo: valor if isinstance(valor, _NATIVOS) else _codificador.default(valor)
+        for campo, valor in datos.items()
+    }
+
+
+def _valores(instancia):
+    diferidos = instancia.get_deferred_fields()
+    return {
+        campo.attname: getattr(instancia, campo.attname)
+        for campo in instancia._meta.concrete_fields
+        if campo.attname not in diferidos
+    }
+
+
+class BufferAuditoria:
+    # Solo un hilo escribe a la vez (_escritura) y solo quien escribe quita
+    # entradas del principio de la cola; los demás únicamente añaden al final.
+    def __init__(self):
+        self._pendientes = deque()
+        self._lock = threading.Lock()
+        self._escritura = threading.Lock()
+        self._ultimo_volcado = time.monotonic()
+        self._pid_temporizador = None
+        self.descartadas = 0
+
+    def __len__(self):
+        return len(self._pendientes)
+
+    def agregar(self, entrada):
+        config = configuracion()
+        self._iniciar_temporizador()
+        with self._lock:
+            self._pendientes.append(entrada)
+            pendientes = len(self._pendientes)
+        if pendientes >= config['MAX_PENDIENTES']:
+            # Cota dura: se espera al volcado en curso y, si no se pudo guardar,
+            # se descartan las entradas más antiguas
+            with self._escritura:
+                if len(self._pendientes) >= config['MAX_PENDIENTES']:
+                    self._escribir()
+                self._recortar(config['MAX_PENDIENTES'])
+        elif pendientes >= config['TAMANO_LOTE'] or time.monotonic() - self._ultimo_volcado >= config['INTERVALO']:
+            self.vaciar()
+
+    def intervalo_vencido(self):
+        return bool(self._pendientes) and time.monotonic() - self._ultimo_volcado >= configuracion()['INTERVALO']
+
+    def vaciar(self, esperar=False):
+        # Devuelve el número de entradas guardadas. Si otro hilo está volcando y no
+        # se pide esperar, no hace nada: lo pendiente lo guarda ese volcado o el siguiente.
+        if not self._escritura.acquire(blocking=esperar):
+            return 0
+        try:
+            return self._escribir()
+        finally:
+            self._escritura.release()
+
+    def _escribir(self):
+        with self._lock:
+            lote = list(self._pendientes)
+        self._ultimo_volcado = time.monotonic()
+        if not lote:
+            return 0
+        try:
+            # Todo o nada: con varios lotes de inserción un fallo no deja la mitad guardada
+            with transaction.atomic(using=router.db_for_write(Auditoria)):
+                # Las instancias de Auditoria se construyen aquí, fuera del guardado auditado
+                Auditoria.objects.bulk_create(
+                    [Auditoria(**entrada) for entrada in lote],
+                    batch_size=configuracion()['TAMANO_LOTE'],
+                )
+        except Exception:
+            logger.exception('No se pudieron guardar %s entradas de auditoría; se reintentará', len(lote))
+            return 0
+        with self._lock:
+            for _ in lote:
+                self._pendientes.popleft()
+        # bulk_create no dispara signals: se invalida el widget de actividad a mano
+        from . import dashboard
+        dashboard.invalidar_modelo(Auditoria)
+        return len(lote)
+
+    def _recortar(self, maximo):
+        with self._lock:
+            sobrantes = len(self._pendientes) - maximo
+            for _ in range(max(sobrantes, 0)):
+                self._pendientes.popleft()
+        if sobrantes > 0:
+            self.descartadas += sobrantes
+            logger.error('Buffer de auditoría lleno: se descartaron %s entradas', sobrantes)
+
+    def _iniciar_temporizador(self):
+        # Un hilo por proceso: tras un fork (workers de gunicorn) el hilo del padre no existe
+        if self._pid_temporizador == os.getpid():
+            return
+        with self._lock:
+            if self._pid_temporizador == os.getpid():
+                return
+            self._pid_temporizador = os.getpid()
+        threading.Thread(target=self._volcar_periodicamente, name='auditoria-volcado', daemon=True).start()
+
+    def _volcar_periodicamente(self):
+        while True:
+            time.sleep(max(configuracion()['INTERVALO'], 0.1))
+            if self.intervalo_vencido():
+                self.vaciar()
+                close_old_connections()
+
+
+buffer = BufferAuditoria()
+atexit.register(buffer.vaciar, esperar=True)
+
+
+def _entrada(modelo, operacion, registro_id, antiguos=None, nuevos=None, usuario_db=None):
+    usuario_app, ip_origen = _contexto.get()
+    if usuario_db is None:
+        usuario_db = connections[router.db_for_write(modelo)].settings_dict.get('USER') or ''
+    return {
+        'tabla_afectada': modelo._meta.db_table,
+        'operacion': operacion,
+        'registro_id': str(registro_id),
+        'datos_antiguos': _a_json(antiguos) if antiguos is not None else None,
+        'datos_nuevos': _a_json(nuevos) if nuevos is not None else None,
+        'usuario_db': usuario_db,
+        'usuario_app': usuario_app,
+        'fecha_hora': timezone.now(),
+        'ip_origen': ip_origen,
+    }
+
+
+def registrar(modelo, operacion, registro_id, antiguos=None, nuevos=None):
+    entrada = _entrada(modelo, operacion, registro_id, antiguos, nuevos)
+    # La entrada llega al buffer solo si la transacción se confirma
+    transaction.on_commit(lambda: buffer.agregar(entrada), using=router.db_for_write(modelo))
+
+
+def registrar_insercion_masiva(modelo, instancias):
+    # Para objetos creados con bulk_create (que no dispara signals); deben tener pk.
+    if not activa():
+        return
+    for instancia in instancias:
+        registrar(modelo, OperacionAuditoria.INSERT, instancia.pk, nuevos=_valores(instancia))
+
+
+def actualizar(queryset, **cambios):
+    # queryset.update() que deja una entrada UPDATE por fila con los valores anteriores.
+    if not activa():
+        return queryset.update(**cambios)
+    modelo = queryset.model
+    campos = [modelo._meta.get_field(nombre).attname for nombre in cambios]
+    anteriores = list(queryset.values(modelo._meta.pk.attname, *campos))
+    filas = queryset.update(**cambios)
+    nuevos = {modelo._meta.get_field(nombre).attname: valor for nombre, valor in cambios.items()}
+    for fila in anteriores:
+        registro_id = fila.pop(modelo._meta.pk.attname)
+        if fila != nuevos:
+            registrar(modelo, OperacionAuditoria.UPDATE, registro_id, antiguos=fila, nuevos=nuevos)
+    return filas
+
+
+# Receivers (conectados desde signals.py)
+
+def leer_valores_originales(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    # Valores guardados justo antes del UPDATE, leídos por pk al guardar: cargar
+    # instancias no cuesta nada y solo cada guardado paga una consulta. Con
+    # update_fields solo se leen (y se comparan) esas columnas.
+    if raw or not activa() or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is None:
+        campos = list(_valores(instance))
+    else:
+        campos = [sender._meta.get_field(nombre).attname for nombre in update_fields]
+    instance._auditoria_original = (
+        sender._base_manager.using(using).filter(pk=instance.pk).values(*campos).first() or {}
+    )
+
+
+def auditar_guardado(sender, instance, created, raw=False, **kwargs):
+    originales = instance.__dict__.pop('_auditoria_original', None) or {}
+    if raw or not activa():
+        return
+    actuales = _valores(instance)
+    if created:
+        registrar(sender, OperacionAuditoria.INSERT, instance.pk, nuevos=actuales)
+    else:
+        antiguos = {campo: valor for campo, valor in originales.items() if actuales.get(campo) != valor}
+        if antiguos:
+            nuevos = {campo: actuales[campo] for campo in antiguos}
+            registrar(sender, OperacionAuditoria.UPDATE, instance.pk, antiguos=antiguos, nuevos=nuevos)
+
+
+def auditar_borrado(sender, instance, **kwargs):
+    if not activa():
+        return
+    registrar(sender, OperacionAuditoria.DELETE, instance.pk, antiguos=_valores(instance))
+
+
+def conectar():
+    for modelo in MODELOS_AUDITADOS:
+        uid = modelo.__name__
+        pre_save.connect(leer_valores_originales, sender=modelo, dispatch_uid=f'auditoria_pre_save_{uid}')
+        post_save.connect(auditar_guardado, sender=modelo, dispatch_uid=f'auditoria_save_{uid}')
+        post_delete.connect(auditar_borrado, sender=modelo, dispatch_uid=f'auditoria_delete_{uid}')
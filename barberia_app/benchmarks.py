@@ -0,0 +1,719 @@
+import asyncio
+import contextvars
+import csv
+import io
+import itertools
+import json
+import os
+import random
+import resource
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as hora, timedelta
+from http.cookies import SimpleCookie
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, transaction
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    auditoria, busqueda_clientes, catalogo, comisiones, dashboard, disponibilidad, exportacion, fechas, graficos, importacion,
+    reposicion, segmentos_clientes,
+)
+from .admin import barberia_admin_site
+from .datos_sinteticos import APELLIDOS, NOMBRES
+from .models import (
+    Auditoria, Cita, Cliente, Empleado, MovimientoInventario, PeriodoComision, Producto, PronosticoReposicion,
+    Servicio, TipoMovimientoInventario, Venta,
+)
+
+
+# Benchmarks ejecutables con: python manage.py benchmark [nombre ...]
+# Cada función devuelve un dict serializable a JSON con sus mediciones.
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def resumen_tiempos(tiempos):
+    ordenados = sorted(tiempos)
+    return {
+        'repeticiones': len(ordenados),
+        'min_ms': round(ordenados[0], 3),
+        'p50_ms': round(statistics.median(ordenados), 3),
+        'p95_ms': round(ordenados[min(int(len(ordenados) * 0.95), len(ordenados) - 1)], 3),
+        'p99_ms': round(ordenados[min(int(len(ordenados) * 0.99), len(ordenados) - 1)], 3),
+        'max_ms': round(ordenados[-1], 3),
+    }
+
+
+def bench_disponibilidad(barberos=20, dias=14, citas_por_dia=12, repeticiones=200):
+    # Datos sintéticos en memoria: mide el motor (compilación + búsqueda), no la BD.
+    azar = random.Random(42)
+    horarios = []
+    for empleado_id in range(1, barberos + 1):
+        for dia_semana in range(1, 7):
+            horarios.append((empleado_id, dia_semana, hora(9), hora(19), False))
+            horarios.append((empleado_id, dia_semana, hora(13), hora(14), True))
+        horarios.append((empleado_id, 7, hora(0), hora(23, 59, 59), True))
+
+    desde = datetime(2025, 6, 2).date()
+    citas = []
+    for empleado_id in range(1, barberos + 1):
+        for desplazamiento in range(dias):
+            dia = datetime.combine(desde + timedelta(days=desplazamiento), hora(9))
+            for _ in range(citas_por_dia):
+                inicio = dia + timedelta(minutes=azar.randrange(0, 600, 15))
+                citas.append((empleado_id, inicio, azar.choice((30, 45, 60))))
+
+    def busqueda(cantidad):
+        agenda = disponibilidad.Agenda(
+            disponibilidad.compilar_plantillas(horarios),
+            disponibilidad.compilar_ocupacion(citas),
+        )
+        return agenda.buscar(desde, dias, 60, cantidad=cantidad)
+
+    return {
+        'barberos': barberos,
+        'dias': dias,
+        'citas': len(citas),
+        'primeros_10': resumen_tiempos(medir(lambda: busqueda(10), repeticiones)),
+        'rango_completo': resumen_tiempos(medir(lambda: busqueda(10 ** 9), repeticiones)),
+    }
+
+
+def bench_auditoria(guardados=500, rondas=3):
+    # Compara guardados tipo admin (save dentro de transaction.atomic) con y sin
+    # auditoría. La medición auditada incluye el volcado final del buffer.
+    clientes = [
+        Cliente(nombre=f'Bench{n}', apellido='Auditoria', telefono=f'B{n:09d}')
+        for n in range(guardados)
+    ]
+    with auditoria.desactivada():
+        Cliente.objects.bulk_create(clientes)
+    clientes = list(Cliente.objects.filter(apellido='Auditoria', telefono__startswith='B'))
+    ultimo_log = Auditoria.objects.order_by('-log_id').values_list('log_id', flat=True).first() or 0
+
+    def guardar_todos(sufijo):
+        inicio = time.perf_counter()
+        for cliente in clientes:
+            with transaction.atomic():
+                cliente.preferencias = f'{sufijo}-{cliente.pk}'
+                cliente.save()
+        auditoria.buffer.vaciar()
+        return (time.perf_counter() - inicio) * 1000
+
+    # Rondas alternadas; se toma el mejor tiempo de cada variante para reducir ruido
+    sin_auditoria = con_auditoria = float('inf')
+    try:
+        for ronda in range(rondas):
+            with auditoria.desactivada():
+                sin_auditoria = min(sin_auditoria, guardar_todos(f'sin{ronda}'))
+            con_auditoria = min(con_auditoria, guardar_todos(f'con{ronda}'))
+    finally:
+        with auditoria.desactivada():
+            Cliente.objects.filter(pk__in=[cliente.pk for cliente in clientes]).delete()
+        Auditoria.objects.filter(log_id__gt=ultimo_log, tabla_afectada=Cliente._meta.db_table).delete()
+
+    return {
+        'guardados': guardados,
+        'sin_auditoria_ms': round(sin_auditoria, 1),
+        'con_auditoria_ms': round(con_auditoria, 1),
+        'sobrecosto_pct': round((con_auditoria - sin_auditoria) / sin_auditoria * 100, 2),
+    }
+
+
+def rss_mb():
+    # RSS actual del proceso (Linux); si no hay /proc se usa el pico de getrusage
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_exportacion(filas=1_000_000, formato='csv'):
+    # Inserta 'filas' ventas sintéticas dentro de una transacción que se revierte
+    # al final y mide la exportación completa en streaming: filas/s y RSS.
+    with transaction.atomic():
+        empleado = Empleado.objects.create(
+            nombre='Bench', apellido='Exportacion', telefono='E000000000',
+            puesto='Barbero', fecha_contratacion=date(2024, 1, 1),
+        )
+        cliente = Cliente.objects.create(nombre='Bench', apellido='Exportacion', telefono='E000000001')
+        inicio_datos = timezone.now() - timedelta(days=365)
+        for desde in range(0, filas, 10000):
+            Venta.objects.bulk_create([
+                Venta(
+                    cliente=cliente, empleado=empleado, subtotal=25, total=25, metodo_pago='efectivo',
+                    fecha_hora=inicio_datos + timedelta(seconds=n * 30),
+                )
+                for n in range(desde, min(desde + 10000, filas))
+            ])
+
+        consulta = exportacion.consulta('ventas').filter(empleado=empleado)
+        rss_inicial = rss_pico = rss_mb()
+        lineas = bytes_escritos = 0
+        inicio = time.perf_counter()
+        for bloque in exportacion.GENERADORES[formato]('ventas', consulta):
+            lineas += bloque.count('\n')
+            bytes_escritos += len(bloque.encode('utf-8'))
+            rss_pico = max(rss_pico, rss_mb())
+        segundos = time.perf_counter() - inicio
+        transaction.set_rollback(True)
+
+    return {
+        'filas': filas,
+        'formato': formato,
+        'lineas': lineas,
+        'megabytes': round(bytes_escritos / 2 ** 20, 1),
+        'segundos': round(segundos, 2),
+        'filas_por_segundo': round(filas / segundos),
+        'rss_inicial_mb': round(rss_inicial, 1),
+        'rss_pico_mb': round(rss_pico, 1),
+    }
+
+
+def bench_busqueda_clientes(clientes=500_000, repeticiones=20):
+    # Crea 'clientes' clientes sintéticos y su índice dentro de una transacción que
+    # se revierte, y mide búsquedas tipo autocompletado (20 resultados).
+    azar = random.Random(7)
+    telefonos = azar.sample(range(10 ** 8), clientes)
+    with transaction.atomic():
+        ultimo = Cliente.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        for desde in range(0, clientes, 10000):
+            Cliente.objects.bulk_create([
+                Cliente(
+                    nombre=f'{azar.choice(NOMBRES)} {azar.choice(NOMBRES)}' if n % 4 == 0 else azar.choice(NOMBRES),
+                    apellido=f'{azar.choice(APELLIDOS)} {azar.choice(APELLIDOS)}',
+                    telefono=f'9{telefonos[n]:08d}',
+                    email=f'cliente{n}@correo.com' if n % 2 else None,
+                )
+                for n in range(desde, min(desde + 10000, clientes))
+            ])
+        inicio = time.perf_counter()
+        busqueda_clientes.indexar_por_tramos(Cliente.objects.filter(pk__gt=ultimo), reemplazar=False)
+        indexado = time.perf_counter() - inicio
+
+        consultas = {
+            'una_letra': 'm',
+            'prefijo_comun': 'ma',
+            'nombre_apellido': 'jose garcia',
+            'prefijo_raro': 'nune',
+            'interior': 'driguez',
+            'telefono_inicio': '98765',
+            'telefono_final': '4567',
+            'email': 'cliente12345@',
+            'sin_resultados': 'zzz',
+        }
+        resultados = {
+            nombre: resumen_tiempos(medir(lambda texto=texto: busqueda_clientes.buscar(texto, 20), repeticiones))
+            for nombre, texto in consultas.items()
+        }
+        transaction.set_rollback(True)
+
+    return {
+        'clientes': clientes,
+        'indexado_s': round(indexado, 1),
+        'consultas': resultados,
+    }
+
+
+def medir_peticiones(navegador, urls, repeticiones, antes=None, cabeceras=None):
+    # Tiempo de respuesta completo (incluido el contenido en streaming) y consultas SQL
+    # por petición. urls: una URL que se repite o un iterable con una URL por repetición.
+    # cabeceras: dict de cabeceras HTTP (por ejemplo If-None-Match) para cada petición.
+    urls = itertools.repeat(urls) if isinstance(urls, str) else iter(urls)
+    tiempos, consultas = [], []
+    for url in itertools.islice(urls, repeticiones):
+        if antes:
+            antes()
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            respuesta = navegador.get(url, headers=cabeceras)
+            if respuesta.streaming:
+                b''.join(respuesta.streaming_content)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        if respuesta.status_code >= 400:
+            raise RuntimeError(f'{url} respondió {respuesta.status_code}')
+        consultas.append(len(capturadas))
+    return {**resumen_tiempos(tiempos), 'consultas': max(consultas), 'estado': respuesta.status_code}
+
+
+def bench_vistas(repeticiones=20):
+    # Mide las vistas del admin y de la API sobre los datos existentes (generados
+    # con 'manage.py seed_barberia'): dashboard, cada changelist, búsquedas,
+    # crear venta desde cita, exportaciones y disponibilidad. Todo corre dentro de
+    # una transacción que se revierte (usuario de prueba, sesión y ventas creadas).
+    if not Cita.objects.exists():
+        return {'omitido': "No hay citas: genere datos con 'manage.py seed_barberia'"}
+    hoy = timezone.localdate()
+    mes = f'desde={hoy - timedelta(days=30)}&hasta={hoy}'
+    servicios = ','.join(str(pk) for pk in Servicio.objects.filter(activo=True).order_by('pk').values_list('pk', flat=True)[:2])
+
+    with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+        usuario = User.objects.create_superuser('benchmark-vistas', 'benchmark@example.com', None)
+        navegador = Client()
+        navegador.force_login(usuario)
+        medir_url = lambda url, antes=None: medir_peticiones(navegador, url, repeticiones, antes)
+
+        resultados = {
+            'dashboard': medir_url(reverse('barberia_admin:index')),
+            'dashboard_sin_cache': medir_url(
+                reverse('barberia_admin:index'), antes=lambda: dashboard.invalidar(dashboard.WIDGETS)
+            ),
+        }
+        for modelo in barberia_admin_site._registry:
+            if modelo._meta.app_label == 'barberia_app':
+                resultados[f'changelist_{modelo._meta.model_name}'] = medir_url(
+                    reverse(f'barberia_admin:barberia_app_{modelo._meta.model_name}_changelist')
+                )
+        resultados['changelist_cliente_busqueda'] = medir_url(
+            reverse('barberia_admin:barberia_app_cliente_changelist') + '?q=maria+garcia'
+        )
+        resultados['autocompletado_cliente'] = medir_url(
+            reverse('barberia_admin:autocomplete')
+            + '?app_label=barberia_app&model_name=cita&field_name=cliente&term=mar'
+        )
+        resultados['changelist_venta_busqueda'] = medir_url(
+            reverse('barberia_admin:barberia_app_venta_changelist') + '?q=garcia'
+        )
+        for nombre in exportacion.EXPORTACIONES:
+            resultados[f'exportar_{nombre}_30_dias'] = medir_url(reverse('exportar', args=[nombre]) + f'?{mes}')
+        resultados['disponibilidad'] = medir_url(reverse('disponibilidad') + f'?servicios={servicios}')
+
+        # Cada cita solo puede facturarse una vez: una cita distinta por repetición
+        pendientes = list(
+            Cita.objects.filter(venta__isnull=True).order_by('-pk').values_list('pk', flat=True)[:repeticiones]
+        )
+        if pendientes:
+            resultados['crear_venta_desde_cita'] = medir_url(
+                reverse('barberia_admin:crear_venta', args=[cita_id]) for cita_id in pendientes
+            )
+        transaction.set_rollback(True)
+
+    return {
+        'repeticiones': repeticiones,
+        'motor': connection.vendor,
+        'filas': {modelo._meta.db_table: modelo.objects.count() for modelo in (Cliente, Cita, Venta)},
+        'vistas': resultados,
+    }
+
+
+def bench_comisiones(repeticiones=20):
+    # Informe de comisiones de los últimos doce meses sobre los datos existentes
+    # (por ejemplo 'manage.py seed_barberia --empleados 50'): con todos los meses
+    # abiertos (calculados) y con los terminados ya cerrados. Los cierres se revierten.
+    if not Venta.objects.exists():
+        return {'omitido': "No hay ventas: genere datos con 'manage.py seed_barberia'"}
+    hasta = comisiones.mes_de(timezone.localdate())
+    desde = comisiones.siguiente_mes(hasta.replace(year=hasta.year - 1))
+    resultados = {}
+    with transaction.atomic():
+        PeriodoComision.objects.filter(mes__gte=desde).delete()
+        with CaptureQueriesContext(connection) as capturadas:
+            resultados['abiertos'] = resumen_tiempos(medir(lambda: comisiones.informe(desde, hasta), repeticiones))
+        resultados['abiertos']['consultas'] = len(capturadas) // repeticiones
+        inicio = time.perf_counter()
+        for mes in comisiones.meses(desde, hasta)[:-1]:
+            comisiones.cerrar(mes)
+        resultados['cierre_11_meses_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+        with CaptureQueriesContext(connection) as capturadas:
+            resultados['cerrados'] = resumen_tiempos(medir(lambda: comisiones.informe(desde, hasta), repeticiones))
+        resultados['cerrados']['consultas'] = len(capturadas) // repeticiones
+        transaction.set_rollback(True)
+    return {
+        'empleados': Empleado.objects.count(),
+        'meses': len(comisiones.meses(desde, hasta)),
+        'ventas': Venta.objects.filter(fecha_hora__gte=fechas.inicio_del_dia(desde)).count(),
+        **resultados,
+    }
+
+
+def bench_segmentos(clientes=1_000_000):
+    # Crea 'clientes' clientes sintéticos con sus columnas de visitas ya mantenidas
+    # (equivalentes a ~10 ventas por cliente) dentro de una transacción que se
+    # revierte, y mide la segmentación RFM completa: tiempo y RSS.
+    azar = random.Random(11)
+    ahora = timezone.now()
+    telefonos = azar.sample(range(10 ** 8), clientes)
+    with transaction.atomic():
+        for desde in range(0, clientes, 10000):
+            lote = []
+            for n in range(desde, min(desde + 10000, clientes)):
+                visitas = 0 if azar.random() < 0.1 else int(azar.expovariate(1 / 10)) + 1
+                lote.append(Cliente(
+                    nombre=azar.choice(NOMBRES), apellido=azar.choice(APELLIDOS), telefono=f'8{telefonos[n]:08d}',
+                    visitas=visitas,
+                    gasto_total=round(visitas * azar.uniform(10, 60), 2),
+                    ultima_visita=ahora - timedelta(days=azar.randrange(730)) if visitas else None,
+                ))
+            Cliente.objects.bulk_create(lote)
+        rss_inicial = rss_mb()
+        inicio = time.perf_counter()
+        resultado = segmentos_clientes.calcular()
+        segundos = time.perf_counter() - inicio
+        rss_final = rss_mb()
+        transaction.set_rollback(True)
+
+    return {
+        'clientes': resultado['clientes'],
+        'segundos': round(segundos, 1),
+        'clientes_por_segundo': round(resultado['clientes'] / segundos),
+        'rss_inicial_mb': round(rss_inicial, 1),
+        'rss_final_mb': round(rss_final, 1),
+        'segmentos': resultado['segmentos'],
+    }
+
+
+def bench_reposicion(productos=5000, anios=3, unidades_por_dia=0.4):
+    # Crea 'productos' productos con 'anios' años de salidas por venta y uso
+    # interno (de media 'unidades_por_dia' por producto, con más consumo el fin
+    # de semana) dentro de una transacción que se revierte, y mide el pronóstico
+    # de reposición completo. Compara los factores por día de la semana
+    # estimados con los usados al generar.
+    azar = random.Random(17)
+    hoy = fechas.hoy()
+    dias = anios * 365
+    semana = [0.8, 0.8, 0.9, 1.0, 1.2, 1.8, 0.5]  # lunes a domingo
+    semana = [factor * 7 / sum(semana) for factor in semana]
+    with transaction.atomic():
+        Producto.objects.bulk_create([
+            Producto(
+                nombre=f'Producto reposición {n}', categoria=azar.choice(('Ceras', 'Aceites', 'Champús')),
+                precio_venta=10, precio_costo=5, stock_actual=azar.randrange(0, 200), stock_minimo=5,
+            )
+            for n in range(productos)
+        ], batch_size=1000)
+        ids = list(Producto.objects.filter(nombre__startswith='Producto reposición ').values_list('pk', flat=True))
+        movimientos = 0
+        for id_inicio in range(0, len(ids), 250):
+            lote = []
+            for producto_id in ids[id_inicio:id_inicio + 250]:
+                tasa = azar.expovariate(1 / unidades_por_dia)
+                for atras in range(dias, 0, -1):
+                    fecha = hoy - timedelta(days=atras)
+                    # Unidades del día con la media esperada: parte entera más una con la probabilidad del resto
+                    esperado = tasa * semana[fecha.weekday()]
+                    unidades = int(esperado) + (azar.random() < esperado % 1)
+                    if unidades:
+                        lote.append(MovimientoInventario(
+                            producto_id=producto_id,
+                            tipo_movimiento=TipoMovimientoInventario.SALIDA_VENTA if azar.random() < 0.8
+                            else TipoMovimientoInventario.SALIDA_USO_INTERNO,
+                            cantidad=-unidades, fecha_hora=fechas.inicio_del_dia(fecha) + timedelta(hours=azar.uniform(9, 20)),
+                        ))
+            MovimientoInventario.objects.bulk_create(lote, batch_size=5000)
+            movimientos += len(lote)
+        rss_inicial = rss_mb()
+        # El registro de consultas está lleno tras las inserciones: se vacía para poder contarlas
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            resultado = reposicion.calcular()
+            segundos = time.perf_counter() - inicio
+        rss_final = rss_mb()
+        estimados = list(
+            PronosticoReposicion.objects.filter(producto_id__in=ids, consumo_diario__gte=0.2)
+            .values_list('factores_semana', flat=True)
+        )
+        transaction.set_rollback(True)
+
+    return {
+        'productos': resultado['productos'],
+        'movimientos': movimientos,
+        'segundos': round(segundos, 2),
+        'consultas': len(capturadas),
+        'rss_inicial_mb': round(rss_inicial, 1),
+        'rss_final_mb': round(rss_final, 1),
+        'factores_generados': [round(factor, 3) for factor in semana],
+        'factores_estimados_media': [
+            round(statistics.fmean(factores[dia] for factores in estimados), 3) for dia in range(7)
+        ] if estimados else [],
+        'resultado': resultado,
+    }
+
+
+def bench_graficos(repeticiones=20):
+    # Series de un año por día, semana y mes de la API de gráficos sobre los datos
+    # existentes: sin caché (cada petición la calcula), con caché y revalidación
+    # con el ETag (304). Incluye el tamaño de cada respuesta.
+    if not Venta.objects.exists():
+        return {'omitido': "No hay ventas: genere datos con 'manage.py seed_barberia'"}
+    resultados = {}
+    with transaction.atomic(), override_settings(ALLOWED_HOSTS=['testserver']):
+        usuario = User.objects.create_superuser('benchmark-graficos', 'benchmark@example.com', None)
+        navegador = Client()
+        navegador.force_login(usuario)
+        for serie in graficos.SERIES:
+            for agrupacion in graficos.AGRUPACIONES:
+                url = reverse('barberia_admin:graficos', args=[serie]) + f'?agrupacion={agrupacion}'
+                # Un cambio registrado en el modelo de la serie invalida la respuesta guardada
+                invalidar = lambda modelo=graficos.SERIES[serie][1][0]: dashboard.registrar_cambio(modelo)
+                respuesta = navegador.get(url)
+                resultados[f'{serie}_{agrupacion}'] = {
+                    'bytes': len(respuesta.content),
+                    'periodos': len(json.loads(respuesta.content)['periodos']),
+                    'sin_cache': medir_peticiones(navegador, url, repeticiones, antes=invalidar),
+                    'con_cache': medir_peticiones(navegador, url, repeticiones),
+                    'revalidacion': medir_peticiones(
+                        navegador, url, repeticiones, cabeceras={'If-None-Match': respuesta.headers['ETag']}
+                    ),
+                }
+        transaction.set_rollback(True)
+    return {
+        'repeticiones': repeticiones,
+        'motor': connection.vendor,
+        'filas': {modelo._meta.db_table: modelo.objects.count() for modelo in (Cita, Venta)},
+        'series': resultados,
+    }
+
+
+# Prueba de carga del widget de reservas servido por la aplicación WSGI con un
+# número fijo de workers, como un gunicorn con workers síncronos. Corre en este
+# proceso sin red: cada cliente es una corrutina que hace sus peticiones una
+# detrás de otra y espera un worker libre del pool. 'latencia_bd_ms' añade esa
+# espera a cada consulta para emular una BD remota (ida y vuelta por red).
+
+def _peticion_wsgi(aplicacion, metodo, ruta, consulta, cuerpo, cabeceras):
+    entorno = {
+        'REQUEST_METHOD': metodo, 'PATH_INFO': ruta, 'QUERY_STRING': consulta, 'SCRIPT_NAME': '',
+        'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'REMOTE_ADDR': '127.0.0.1',
+        'CONTENT_LENGTH': str(len(cuerpo)), 'wsgi.input': BytesIO(cuerpo), 'wsgi.url_scheme': 'http',
+        'wsgi.errors': BytesIO(), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+    }
+    for clave, valor in cabeceras.items():
+        if clave == 'Content-Type':
+            entorno['CONTENT_TYPE'] = valor
+        else:
+            entorno['HTTP_' + clave.upper().replace('-', '_')] = valor
+    respuesta = {}
+
+    def iniciar(estado, cabeceras_respuesta, exc_info=None):
+        respuesta['estado'] = int(estado.split()[0])
+        respuesta['cabeceras'] = cabeceras_respuesta
+
+    contenido = aplicacion(entorno, iniciar)
+    try:
+        respuesta['cuerpo'] = b''.join(contenido)
+    finally:
+        if hasattr(contenido, 'close'):
+            contenido.close()
+    return respuesta
+
+
+async def _cliente_reservas(numero, peticion, servicios, sondeos, fraccion_reservas, azar, latencias, estados):
+    # Un visitante del widget: carga el catálogo (y la cookie CSRF), consulta la
+    # disponibilidad 'sondeos' veces y a veces reserva uno de los huecos ofrecidos
+    async def pedir(tipo, metodo, ruta, consulta='', cuerpo=b'', cabeceras=None):
+        inicio = time.perf_counter()
+        respuesta = await peticion(metodo, ruta, consulta, cuerpo, cabeceras or {})
+        latencias[tipo].append((time.perf_counter() - inicio) * 1000)
+        estados[respuesta['estado']] = estados.get(respuesta['estado'], 0) + 1
+        return respuesta
+
+    respuesta = await pedir('servicios', 'GET', '/api/reservas/servicios/')
+    cookies = SimpleCookie()
+    for clave, valor in respuesta['cabeceras']:
+        if clave.lower() == 'set-cookie':
+            cookies.load(valor)
+    token = cookies['csrftoken'].value if 'csrftoken' in cookies else ''
+    elegidos = ','.join(str(servicio_id) for servicio_id in azar.sample(servicios, min(2, len(servicios))))
+    huecos = []
+    for _ in range(sondeos):
+        respuesta = await pedir(
+            'disponibilidad', 'GET', '/api/reservas/disponibilidad/', urlencode({'servicios': elegidos, 'n': 5}),
+        )
+        if respuesta['estado'] == 200:
+            huecos = json.loads(respuesta['cuerpo'])['huecos']
+    if huecos and azar.random() < fraccion_reservas:
+        hueco = azar.choice(huecos)
+        cuerpo = json.dumps({
+            'servicios': [int(servicio_id) for servicio_id in elegidos.split(',')],
+            'empleado': hueco['empleado_id'],
+            'inicio': hueco['inicio'],
+            'cliente': {'nombre': 'Carga', 'apellido': str(numero), 'telefono': f'carga-{numero:06d}'},
+        }).encode()
+        await pedir('reserva', 'POST', '/api/reservas/', cuerpo=cuerpo, cabeceras={
+            'Content-Type': 'application/json', 'X-CSRFToken': token, 'Cookie': f'csrftoken={token}',
+        })
+
+
+def _carga(peticion, servicios, clientes, sondeos, fraccion_reservas):
+    latencias = {'servicios': [], 'disponibilidad': [], 'reserva': []}
+    estados = {}
+
+    async def principal():
+        azar = random.Random(42)
+        await asyncio.gather(*(
+            _cliente_reservas(numero, peticion, servicios, sondeos, fraccion_reservas, azar, latencias, estados)
+            for numero in range(clientes)
+        ))
+
+    inicio = time.perf_counter()
+    # En un contexto vacío, como las peticiones de un servidor: si no, todas
+    # heredarían las conexiones a la BD ya abiertas en este hilo
+    contextvars.Context().run(asyncio.run, principal())
+    duracion = time.perf_counter() - inicio
+    # Las reservas de la prueba se borran para que la siguiente variante parta de la misma agenda
+    creadas = Cita.objects.filter(cliente__telefono__startswith='carga-')
+    reservadas = creadas.count()
+    creadas.delete()
+    Cliente.objects.filter(telefono__startswith='carga-').delete()
+    total = sum(len(tiempos) for tiempos in latencias.values())
+    return {
+        'peticiones': total,
+        'segundos': round(duracion, 3),
+        'peticiones_por_segundo': round(total / duracion, 1),
+        'estados': {str(estado): cantidad for estado, cantidad in sorted(estados.items())},
+        'reservas_creadas': reservadas,
+        'todas': resumen_tiempos([tiempo for tiempos in latencias.values() for tiempo in tiempos]),
+        **{tipo: resumen_tiempos(tiempos) for tipo, tiempos in latencias.items() if tiempos},
+    }
+
+
+def _esperar_bd(latencia_bd_ms):
+    def envoltorio(execute, sql, params, many, context):
+        time.sleep(latencia_bd_ms / 1000)
+        return execute(sql, params, many, context)
+
+    def al_conectar(sender, connection, **kwargs):
+        # La conexión se abre dentro del execute_wrapper del middleware de
+        # instrumentación, que al salir hace pop(): el envoltorio va al principio
+        # de la lista para no quitarle su sitio. El DatabaseWrapper se reutiliza
+        # al reconectar, así que se añade una sola vez.
+        if envoltorio not in connection.execute_wrappers:
+            connection.execute_wrappers.insert(0, envoltorio)
+
+    return al_conectar
+
+
+def bench_reservas(clientes=500, sondeos=4, fraccion_reservas=0.1, workers_wsgi=4, latencia_bd_ms=1):
+    # 'clientes' visitantes simultáneos del widget de reservas sobre los datos
+    # existentes con 'workers_wsgi' workers. La latencia incluye la espera por
+    # un worker libre.
+    servicios = list(Servicio.objects.filter(activo=True).values_list('pk', flat=True))
+    if not servicios or not Empleado.objects.exists():
+        return {'omitido': "No hay servicios ni empleados: genere datos con 'manage.py seed_barberia'"}
+    # Cada petición abre su propia conexión, así que la espera se instala al crearla
+    al_conectar = _esperar_bd(latencia_bd_ms)
+    if latencia_bd_ms:
+        connection_created.connect(al_conectar)
+    with override_settings(ALLOWED_HOSTS=['testserver']):
+        aplicacion = get_wsgi_application()
+        with ThreadPoolExecutor(max_workers=workers_wsgi) as workers:
+            async def peticion_wsgi(*argumentos):
+                return await asyncio.get_running_loop().run_in_executor(
+                    workers, _peticion_wsgi, aplicacion, *argumentos
+                )
+
+            resultado = _carga(peticion_wsgi, servicios, clientes, sondeos, fraccion_reservas)
+    connection_created.disconnect(al_conectar)
+    return {
+        'clientes': clientes,
+        'sondeos_por_cliente': sondeos,
+        'fraccion_reservas': fraccion_reservas,
+        'workers_wsgi': workers_wsgi,
+        'latencia_bd_ms': latencia_bd_ms,
+        'motor': connection.vendor,
+        'wsgi_sync': resultado,
+    }
+
+
+def bench_catalogo(repeticiones=1000):
+    # Lectura del catálogo de servicios y productos activos sobre los datos
+    # existentes: la copia en memoria vigente (una lectura del sello en la caché
+    # compartida, sin consultas), la recarga tras un cambio de sello y las
+    # consultas que reemplaza. 'cache' indica el backend medido.
+    if not Servicio.objects.exists():
+        return {'omitido': "No hay servicios: genere datos con 'manage.py seed_barberia'"}
+
+    def consultar():
+        list(Servicio.objects.filter(activo=True).values(*catalogo.CAMPOS_SERVICIO))
+        list(Producto.objects.filter(activo=True).values(*catalogo.CAMPOS_PRODUCTO))
+
+    def recargar():
+        catalogo.invalidar()
+        catalogo.obtener()
+
+    catalogo.obtener()
+    with CaptureQueriesContext(connection) as consultas:
+        catalogo.obtener()
+    return {
+        'repeticiones': repeticiones,
+        'motor': connection.vendor,
+        'cache': settings.CACHES[catalogo.configuracion()['CACHE']]['BACKEND'].rsplit('.', 1)[1],
+        'servicios': len(catalogo.servicios()),
+        'productos': len(catalogo.productos()),
+        'consultas_copia_vigente': len(consultas),
+        'copia_vigente': resumen_tiempos(medir(catalogo.obtener, repeticiones)),
+        'recarga': resumen_tiempos(medir(recargar, repeticiones)),
+        'consultas': resumen_tiempos(medir(consultar, repeticiones)),
+    }
+
+
+def bench_importacion(filas=100_000):
+    # Importa un CSV de 'filas' clientes generado en memoria dentro de una
+    # transacción que se revierte: primero todas las filas son nuevas y después
+    # se vuelve a importar el mismo archivo (todas actualizaciones).
+    azar = random.Random(11)
+    telefonos = azar.sample(range(10 ** 8), filas)
+    archivo = io.StringIO()
+    escritor = csv.writer(archivo)
+    escritor.writerow(['nombre', 'apellido', 'telefono', 'email', 'preferencias'])
+    for n in range(filas):
+        escritor.writerow([
+            azar.choice(NOMBRES), f'{azar.choice(APELLIDOS)} {azar.choice(APELLIDOS)}', f'8{telefonos[n]:08d}',
+            f'importado{n}@correo.com' if n % 2 else '', 'Degradado' if n % 5 == 0 else '',
+        ])
+
+    def importar():
+        archivo.seek(0)
+        inicio = time.perf_counter()
+        resultado = importacion.importar('clientes', importacion.filas_csv(archivo))
+        return resultado, time.perf_counter() - inicio
+
+    with transaction.atomic():
+        creacion, segundos_creacion = importar()
+        actualizacion, segundos_actualizacion = importar()
+        transaction.set_rollback(True)
+
+    return {
+        'filas': filas,
+        'motor': connection.vendor,
+        'lote': importacion.LOTE,
+        'creacion': {**creacion, 'segundos': round(segundos_creacion, 2),
+                     'filas_por_segundo': round(filas / segundos_creacion)},
+        'actualizacion': {**actualizacion, 'segundos': round(segundos_actualizacion, 2),
+                          'filas_por_segundo': round(filas / segundos_actualizacion)},
+    }
+
+
+BENCHMARKS = {
+    'disponibilidad': bench_disponibilidad,
+    'auditoria': bench_auditoria,
+    'exportacion': bench_exportacion,
+    'busqueda_clientes': bench_busqueda_clientes,
+    'vistas': bench_vistas,
+    'comisiones': bench_comisiones,
+    'segmentos': bench_segmentos,
+    'reposicion': bench_reposicion,
+    'graficos': bench_graficos,
+    'reservas': bench_reservas,
+    'catalogo': bench_catalogo,
+    'importacion': bench_importacion,
+}
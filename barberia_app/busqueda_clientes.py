@@ -0,0 +1,200 @@
+import re
+import unicodedata
+
+from django.db import connection, transaction
+from django.db.models import Count, Exists, OuterRef, Q
+
+from .models import Cliente, TerminoCliente, TrigramaTermino
+
+
+# Búsqueda de clientes para recepción (buscador del admin y autocompletado).
+# En lugar de icontains sobre clientes, cada cliente tiene en
+# busqueda_clientes_terminos sus términos normalizados: palabras del nombre y
+# apellido en minúsculas y sin tildes, el email y sus palabras y los sufijos de
+# los dígitos del teléfono. Un texto buscado se parte en términos y cada
+# uno debe coincidir (AND, como el buscador del admin):
+#   - por prefijo: LIKE 'término%' sobre idx_termino_cliente;
+#   - en medio de una palabra (3+ letras): los trigramas del vocabulario
+#     (busqueda_clientes_trigramas) dan las palabras que lo contienen y estas se
+#     buscan de forma exacta en el mismo índice.
+# Un término poco frecuente lleva la consulta (sus clientes salen del índice por
+# prefijo); los frecuentes se comprueban cliente a cliente con idx_cliente_termino,
+# que con el LIMIT del autocompletado se detiene tras los primeros resultados.
+# El índice se mantiene desde signals.py al guardar un cliente y desde la
+# importación masiva; 'manage.py reindexar_busqueda_clientes' lo reconstruye.
+
+CAMPOS = ('cliente_id', 'nombre', 'apellido', 'telefono', 'email')
+LARGO_MAXIMO = 100
+LOTE = 5000
+MAX_TERMINOS_INTERIORES = 500
+UMBRAL_SELECTIVO = 2000
+
+_SEPARADORES = re.compile(r'[^0-9a-z]+')
+_TELEFONO = re.compile(r'[\d\s()+.\-]+')
+
+
+def plegar(texto):
+    # Minúsculas y sin tildes: 'Núñez' -> 'nunez'
+    texto = unicodedata.normalize('NFKD', str(texto or '')).lower()
+    return ''.join(caracter for caracter in texto if not unicodedata.combining(caracter))
+
+
+def digitos(texto):
+    return ''.join(caracter for caracter in str(texto or '') if caracter.isdigit())
+
+
+def _palabras(texto):
+    return [palabra for palabra in _SEPARADORES.split(texto) if palabra]
+
+
+def terminos_cliente(nombre, apellido, telefono, email):
+    terminos = set(_palabras(plegar(nombre))) | set(_palabras(plegar(apellido)))
+    email = plegar(email).strip()
+    if email:
+        terminos.add(email)
+        terminos.update(_palabras(email.split('@')[0]))
+    # Todos los sufijos de 4+ dígitos del teléfono: buscar por prefijo sobre ellos
+    # encuentra cualquier tramo del número (con o sin código de país, últimos 4...)
+    numero = digitos(telefono)
+    terminos.update(numero[inicio:] for inicio in range(max(len(numero) - 3, 1)))
+    return {termino[:LARGO_MAXIMO] for termino in terminos}
+
+
+def trigramas(termino):
+    return {termino[inicio:inicio + 3] for inicio in range(len(termino) - 2)}
+
+
+def indexar(clientes, reemplazar=True):
+    # clientes: iterable de tuplas con CAMPOS. Reemplaza sus términos en el índice
+    # (reemplazar=False si se sabe que aún no tienen, como en la reconstrucción).
+    ids, terminos, vocabulario = [], [], set()
+    for cliente_id, nombre, apellido, telefono, email in clientes:
+        ids.append(cliente_id)
+        for termino in terminos_cliente(nombre, apellido, telefono, email):
+            terminos.append((cliente_id, termino))
+            # Solo las palabras de letras entran al vocabulario de trigramas
+            if termino.isalpha():
+                vocabulario.add(termino)
+    if not ids:
+        return 0
+
+    with transaction.atomic():
+        if reemplazar:
+            TerminoCliente.objects.filter(cliente_id__in=ids).delete()
+        # Son ~10 filas por cliente: executemany evita construir una instancia por fila
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {TerminoCliente._meta.db_table} (cliente_id, termino) VALUES (%s, %s)', terminos
+            )
+        conocidos = set(
+            TrigramaTermino.objects.filter(termino__in=vocabulario).values_list('termino', flat=True).distinct()
+        )
+        TrigramaTermino.objects.bulk_create(
+            [
+                TrigramaTermino(trigrama=trigrama, termino=termino)
+                for termino in vocabulario - conocidos
+                for trigrama in trigramas(termino)
+            ],
+            batch_size=LOTE,
+            ignore_conflicts=True,
+        )
+    return len(ids)
+
+
+def indexar_cliente(cliente):
+    indexar([tuple(getattr(cliente, campo) for campo in CAMPOS)])
+
+
+def indexar_por_tramos(clientes, lote=LOTE, reemplazar=True):
+    # clientes: queryset de Cliente; se indexa por tramos de cliente_id.
+    total = 0
+    ultimo = 0
+    while True:
+        filas = list(clientes.filter(pk__gt=ultimo).order_by('pk').values_list(*CAMPOS)[:lote])
+        if not filas:
+            return total
+        total += indexar(filas, reemplazar=reemplazar)
+        ultimo = filas[-1][0]
+
+
+def reindexar(lote=LOTE):
+    # Reconstrucción completa
+    with transaction.atomic():
+        TerminoCliente.objects.all().delete()
+        TrigramaTermino.objects.all().delete()
+    return indexar_por_tramos(Cliente.objects.all(), lote, reemplazar=False)
+
+
+def terminos_busqueda(texto):
+    texto = plegar(texto).strip()
+    if not texto:
+        return []
+    if '@' in texto:
+        return [texto.replace(' ', '')[:LARGO_MAXIMO]]
+    if _TELEFONO.fullmatch(texto) and digitos(texto):
+        return [digitos(texto)[:LARGO_MAXIMO]]
+    return [palabra[:LARGO_MAXIMO] for palabra in _palabras(texto)]
+
+
+def _prefijo(termino):
+    # LIKE 'abc%' con prefijo fijo. No un rango calculado a mano
+    # [término, siguiente carácter): con utf8mb4_0900_ai_ci '{' y ':' ordenan antes
+    # que las letras y los dígitos, y los términos acabados en 'z' o '9' no
+    # encontraban nada.
+    return Q(termino__startswith=termino)
+
+
+def _terminos_interiores(termino):
+    # Palabras del vocabulario que contienen 'termino' sin empezar por él
+    buscados = trigramas(termino)
+    candidatos = (
+        TrigramaTermino.objects.filter(trigrama__in=buscados)
+        .values('termino')
+        .annotate(coincidencias=Count('trigrama'))
+        .filter(coincidencias=len(buscados))
+        .values_list('termino', flat=True)[:MAX_TERMINOS_INTERIORES]
+    )
+    return [candidato for candidato in candidatos if termino in candidato and not candidato.startswith(termino)]
+
+
+def _condicion(termino):
+    # Filas del índice que satisfacen 'termino': por prefijo o, si tiene 3+ letras,
+    # palabras que lo contienen
+    condicion = _prefijo(termino)
+    if len(termino) >= 3 and termino.isalpha():
+        interiores = _terminos_interiores(termino)
+        if interiores:
+            condicion |= Q(termino__in=interiores)
+    return condicion
+
+
+def filtrar(queryset, texto, con_limite=True):
+    # con_limite=False cuando se van a leer o contar todos los resultados (listado
+    # del admin): ahí conviene que cada término salga del índice por rango.
+    condiciones = [_condicion(termino) for termino in terminos_busqueda(texto)]
+    if not condiciones:
+        return queryset
+    if not con_limite:
+        for condicion in condiciones:
+            queryset = queryset.filter(pk__in=TerminoCliente.objects.filter(condicion).values('cliente_id'))
+        return queryset
+    # Cuántas filas del índice aporta cada término, contando como mucho hasta el umbral
+    estimadas = [TerminoCliente.objects.filter(condicion)[:UMBRAL_SELECTIVO].count() for condicion in condiciones]
+    orden = sorted(range(len(condiciones)), key=estimadas.__getitem__)
+    if estimadas[orden[0]] < UMBRAL_SELECTIVO:
+        # Término selectivo: sus pocos clientes salen del índice por rango y el
+        # resto de términos se comprueba solo sobre ellos
+        queryset = queryset.filter(
+            pk__in=TerminoCliente.objects.filter(condiciones[orden.pop(0)]).values('cliente_id')
+        )
+    # Términos frecuentes: se recorren los clientes en el orden pedido y se comprueba
+    # cada término con idx_cliente_termino; con LIMIT la búsqueda para enseguida
+    for posicion in orden:
+        queryset = queryset.filter(
+            Exists(TerminoCliente.objects.filter(condiciones[posicion], cliente_id=OuterRef('pk')))
+        )
+    return queryset
+
+
+def buscar(texto, limite=20):
+    return list(filtrar(Cliente.objects.order_by('-pk'), texto)[:limite])
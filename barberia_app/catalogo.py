@@ -0,0 +1,118 @@
+import threading
+import uuid
+from collections import namedtuple
+from time import monotonic
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from . import replicas
+from .models import Producto, Servicio
+
+
+# Catálogo de servicios y productos activos en memoria del proceso.
+# Reservas, disponibilidad y cobros leen los mismos pocos servicios y precios
+# en cada petición: cada proceso guarda su copia junto con el sello de versión
+# con que la leyó. El sello vive en la caché compartida y cambia con cada
+# modificación de Servicio o Producto (signals.py, acciones del admin e
+# importación). Cada lectura compara el sello compartido con el de la copia
+# (un GET a Redis, sin consultas a la base de datos) y recarga si no coinciden,
+# así una edición se ve desde la siguiente petición de cualquier worker.
+# El sello se cambia al confirmar la transacción: antes, otro proceso podría
+# recargar los datos viejos con el sello nuevo y quedárselos. Por lo mismo la
+# recarga lee siempre del primario, nunca de la réplica.
+# El stock no forma parte del catálogo: cambia con cada venta y se consulta aparte.
+#
+# Configuración en settings.BARBERIA_CATALOGO:
+#   CACHE: alias de CACHES donde vive el sello. Debe ser compartido por todos los
+#       workers y en memoria (Redis o Memcached): con LocMemCache cada proceso
+#       tendría su propio sello y no vería las ediciones hechas en otro
+#       ('manage.py check --deploy' lo rechaza, ver checks.py).
+#   MAX_EDAD: segundos máximos que se usa una copia aunque el sello no cambie;
+#       acota lo que dura un cambio que no renovó el sello (un update() sin
+#       invalidar(), un sello desalojado de la caché).
+
+CONFIGURACION_POR_DEFECTO = {
+    'CACHE': 'default',
+    'MAX_EDAD': 300,
+}
+
+CLAVE_SELLO = 'barberia:catalogo:sello'
+
+CAMPOS_SERVICIO = ('servicio_id', 'nombre', 'descripcion', 'categoria', 'duracion_minutos', 'precio')
+CAMPOS_PRODUCTO = ('producto_id', 'nombre', 'marca', 'categoria', 'unidad_medida', 'precio_venta', 'para_venta')
+
+Catalogo = namedtuple('Catalogo', ['sello', 'leido', 'servicios', 'productos'])
+
+_copia = None
+_lock = threading.Lock()
+
+
+def configuracion():
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'BARBERIA_CATALOGO', {})}
+
+
+def _cache():
+    return caches[configuracion()['CACHE']]
+
+
+def sello():
+    cache = _cache()
+    valor = cache.get(CLAVE_SELLO)
+    if valor is None:
+        # Caché vacía o clave desalojada: un sello nuevo obliga a todos a recargar
+        cache.add(CLAVE_SELLO, uuid.uuid4().hex, timeout=None)
+        valor = cache.get(CLAVE_SELLO)
+    return valor
+
+
+def _vigente(copia, valor):
+    return copia is not None and copia.sello == valor and monotonic() - copia.leido < configuracion()['MAX_EDAD']
+
+
+def _leer(valor):
+    # servicios y productos: {pk: fila}, en el orden en que se muestran
+    with replicas.lectura(False):
+        servicios = Servicio.objects.filter(activo=True).order_by('categoria', 'nombre').values(*CAMPOS_SERVICIO)
+        productos = Producto.objects.filter(activo=True).order_by('categoria', 'nombre').values(*CAMPOS_PRODUCTO)
+        return Catalogo(
+            valor,
+            monotonic(),
+            {fila['servicio_id']: fila for fila in servicios},
+            {fila['producto_id']: fila for fila in productos},
+        )
+
+
+def obtener():
+    # Las filas son compartidas entre peticiones: no se modifican
+    global _copia
+    valor = sello()
+    copia = _copia
+    if _vigente(copia, valor):
+        return copia
+    if transaction.get_connection().in_atomic_block:
+        # Dentro de una transacción la lectura puede ver cambios sin confirmar:
+        # se usa en esta petición pero no se guarda
+        return _leer(valor)
+    with _lock:
+        # Otro hilo pudo recargarla mientras se esperaba el lock
+        if not _vigente(_copia, valor):
+            _copia = _leer(valor)
+        return _copia
+
+
+def servicios():
+    return obtener().servicios
+
+
+def productos():
+    return obtener().productos
+
+
+def _renovar_sello():
+    _cache().set(CLAVE_SELLO, uuid.uuid4().hex, timeout=None)
+
+
+def invalidar(using=None):
+    transaction.on_commit(_renovar_sello, using=using)
@@ -0,0 +1,83 @@
+import re
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core import checks
+
+from . import catalogo, dashboard
+
+
+# Las consultas por día local deben usar los managers de models.RangoFechasQuerySet
+# (del_dia, de_la_semana, entre). Un lookup __date sobre un DateTimeField aplica
+# DATE(CONVERT_TZ(...)) a cada fila: no usa el índice de la columna y, en MySQL
+# sin las tablas de zonas horarias cargadas, CONVERT_TZ devuelve NULL y la
+# consulta no encuentra nada. Este check avisa de los que aparezcan en el código.
+
+# Sin \b al final: '_' es carácter de palabra y \b no vería fecha_hora__date__gte
+LOOKUP_DATE = re.compile(r'\w__date(?![A-Za-z0-9])')
+EXTENSIONES = ('.py', '.html')
+
+
+def _archivos():
+    app = Path(apps.get_app_config('barberia_app').path)
+    for ruta in app.rglob('*'):
+        if ruta.suffix in EXTENSIONES and 'migrations' not in ruta.parts and ruta != Path(__file__):
+            yield ruta
+    for plantillas in settings.TEMPLATES:
+        for directorio in plantillas.get('DIRS', []):
+            yield from (ruta for ruta in Path(directorio).rglob('*.html'))
+
+
+@checks.register()
+def lookups_date(app_configs, **kwargs):
+    avisos = []
+    for ruta in _archivos():
+        try:
+            lineas = ruta.read_text(encoding='utf-8').splitlines()
+        except (OSError, UnicodeDecodeError):
+            continue
+        for numero, linea in enumerate(lineas, 1):
+            codigo = linea.split('#', 1)[0] if ruta.suffix == '.py' else linea
+            if LOOKUP_DATE.search(codigo):
+                avisos.append(checks.Warning(
+                    f'Lookup __date en {ruta}:{numero}',
+                    hint='Filtre por días locales con Modelo.objects.del_dia(), de_la_semana() o entre() '
+                         '(rangos UTC semiabiertos sobre la columna indexada).',
+                    obj=linea.strip(),
+                    id='barberia_app.W001',
+                ))
+    return avisos
+
+
+# El sello del catálogo en memoria (catalogo.py) y los widgets y marcas de cambio
+# del dashboard (dashboard.py, también usados por graficos.py) deben vivir en una
+# caché compartida por todos los workers: con una caché por proceso (o ninguna)
+# las ediciones hechas en un worker no llegan a los demás hasta que vence
+# MAX_EDAD o el TIMEOUT de los widgets.
+CACHES_POR_PROCESO = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def cache_catalogo(app_configs, **kwargs):
+    errores = []
+    for ajuste, alias, uso in (
+        ('BARBERIA_CATALOGO', catalogo.configuracion()['CACHE'], 'El sello del catálogo'),
+        ('BARBERIA_DASHBOARD_CACHE', dashboard.configuracion()['CACHE'], 'El dashboard'),
+    ):
+        backend = settings.CACHES.get(alias, {}).get('BACKEND')
+        if backend is None:
+            errores.append(checks.Error(
+                f"{ajuste}['CACHE'] = '{alias}' no está en CACHES.",
+                id='barberia_app.E001',
+            ))
+        elif backend in CACHES_POR_PROCESO:
+            errores.append(checks.Error(
+                f"{uso} usa la caché '{alias}' ({backend.rsplit('.', 1)[1]}), que no se comparte entre workers.",
+                hint=f"Apunte {ajuste}['CACHE'] a un alias con Redis o Memcached (BARBERIA_REDIS_URL).",
+                id='barberia_app.E002',
+            ))
+    return errores
@@ -0,0 +1,163 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DateField, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from . import fechas
+from .models import DetalleVenta, Empleado, EstadoEmpleado, EstadoVenta, PeriodoComision, TipoDetalleVenta, Venta
+
+
+# Comisiones por empleado y mes (el periodo de pago).
+# Base comisionable: líneas de las ventas completadas (servicios y productos)
+# menos los descuentos de esas ventas; comisión = base * porcentaje_comision / 100.
+# Las ventas reembolsadas y anuladas no comisionan y se informan aparte.
+# Todo sale de dos consultas agrupadas por empleado y mes (ventas por estado y
+# líneas por tipo), sin recorrer ventas en Python. Al cerrar un mes sus
+# importes se guardan en periodos_comision y el informe ya no lo recalcula.
+
+CAMPOS_CANTIDAD = ('ventas', 'reembolsos', 'anulaciones')
+CAMPOS_IMPORTE = ('ingresos_servicios', 'ingresos_productos', 'descuentos', 'importe_reembolsos', 'importe_anulaciones')
+CAMPOS = CAMPOS_CANTIDAD + CAMPOS_IMPORTE + ('comision',)
+
+CENTIMO = Decimal('0.01')
+
+
+def mes_de(fecha):
+    return fecha.replace(day=1)
+
+
+def siguiente_mes(mes):
+    return (mes.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def meses(desde, hasta):
+    mes, resultado = mes_de(desde), []
+    while mes <= hasta:
+        resultado.append(mes)
+        mes = siguiente_mes(mes)
+    return resultado
+
+
+def _vacio():
+    return {
+        **{campo: 0 for campo in CAMPOS_CANTIDAD},
+        **{campo: Decimal(0) for campo in CAMPOS_IMPORTE},
+    }
+
+
+def comision(datos, porcentaje):
+    base = datos['ingresos_servicios'] + datos['ingresos_productos'] - datos['descuentos']
+    return (base * porcentaje / 100).quantize(CENTIMO)
+
+
+def calcular(desde, hasta):
+    # {(empleado_id, mes): importes} de los meses desde..hasta (primeros de mes), sin la comisión
+    inicio, fin = fechas.rango_utc(desde, siguiente_mes(hasta) - timedelta(days=1))
+    zona = timezone.get_current_timezone()
+    resultado = {}
+
+    ventas = (
+        Venta.objects.filter(fecha_hora__gte=inicio, fecha_hora__lt=fin)
+        .annotate(mes=TruncMonth('fecha_hora', output_field=DateField(), tzinfo=zona))
+        .values('empleado_id', 'mes', 'estado')
+        .annotate(cantidad=Count('venta_id'), importe=Sum('total'), suma_descuentos=Sum('descuentos'))
+        .order_by()
+    )
+    for fila in ventas:
+        datos = resultado.setdefault((fila['empleado_id'], fila['mes']), _vacio())
+        if fila['estado'] == EstadoVenta.COMPLETADA:
+            datos['ventas'] += fila['cantidad']
+            datos['descuentos'] += fila['suma_descuentos'] or 0
+        elif fila['estado'] == EstadoVenta.REEMBOLSADA:
+            datos['reembolsos'] += fila['cantidad']
+            datos['importe_reembolsos'] += fila['importe'] or 0
+        elif fila['estado'] == EstadoVenta.ANULADA:
+            datos['anulaciones'] += fila['cantidad']
+            datos['importe_anulaciones'] += fila['importe'] or 0
+
+    lineas = (
+        DetalleVenta.objects.filter(
+            venta__fecha_hora__gte=inicio, venta__fecha_hora__lt=fin, venta__estado=EstadoVenta.COMPLETADA,
+        )
+        .annotate(mes=TruncMonth('venta__fecha_hora', output_field=DateField(), tzinfo=zona))
+        .values('venta__empleado_id', 'mes')
+        .annotate(
+            servicios=Sum('subtotal_linea', filter=Q(tipo=TipoDetalleVenta.SERVICIO)),
+            productos=Sum('subtotal_linea', filter=Q(tipo=TipoDetalleVenta.PRODUCTO)),
+        )
+        .order_by()
+    )
+    for fila in lineas:
+        datos = resultado.setdefault((fila['venta__empleado_id'], fila['mes']), _vacio())
+        datos['ingresos_servicios'] += fila['servicios'] or 0
+        datos['ingresos_productos'] += fila['productos'] or 0
+    return resultado
+
+
+def cerrar(mes):
+    # Guarda las comisiones de un mes terminado; una fila por empleado contratado en el mes
+    mes = mes_de(mes)
+    if siguiente_mes(mes) > fechas.hoy():
+        raise ValueError(f'El mes {mes:%Y-%m} aún no ha terminado.')
+    calculado = calcular(mes, mes)
+    empleados = Empleado.objects.filter(
+        Q(fecha_contratacion__lt=siguiente_mes(mes)) | Q(pk__in={empleado_id for empleado_id, _ in calculado})
+    ).values_list('empleado_id', 'porcentaje_comision')
+    ahora = timezone.now()
+    periodos = []
+    for empleado_id, porcentaje in empleados:
+        datos = calculado.get((empleado_id, mes)) or _vacio()
+        periodos.append(PeriodoComision(
+            mes=mes, empleado_id=empleado_id, porcentaje_comision=porcentaje,
+            comision=comision(datos, porcentaje), cerrado_en=ahora, **datos,
+        ))
+    with transaction.atomic():
+        if PeriodoComision.objects.filter(mes=mes).exists():
+            raise ValueError(f'El mes {mes:%Y-%m} ya está cerrado.')
+        PeriodoComision.objects.bulk_create(periodos)
+    return len(periodos)
+
+
+def informe(desde, hasta):
+    # Comisiones de los meses desde..hasta por empleado. Los meses cerrados se
+    # leen de periodos_comision; los abiertos se calculan con calcular().
+    lista_meses = meses(desde, hasta)
+    cerrados = {}
+    for periodo in PeriodoComision.objects.filter(mes__gte=lista_meses[0], mes__lte=lista_meses[-1]).values(
+        'empleado_id', 'mes', 'porcentaje_comision', *CAMPOS
+    ):
+        cerrados[(periodo['empleado_id'], periodo['mes'])] = periodo
+    meses_cerrados = {mes for _, mes in cerrados}
+    abiertos = [mes for mes in lista_meses if mes not in meses_cerrados]
+    calculado = calcular(abiertos[0], abiertos[-1]) if abiertos else {}
+
+    filas = []
+    empleados = Empleado.objects.order_by('nombre', 'apellido').values(
+        'empleado_id', 'nombre', 'apellido', 'estado', 'porcentaje_comision'
+    )
+    for empleado in empleados:
+        total = {**_vacio(), 'comision': Decimal(0)}
+        por_mes = []
+        for mes in lista_meses:
+            clave = (empleado['empleado_id'], mes)
+            if mes in meses_cerrados:
+                datos = cerrados.get(clave) or {**_vacio(), 'comision': Decimal(0)}
+            else:
+                datos = calculado.get(clave) or _vacio()
+                datos = {**datos, 'comision': comision(datos, empleado['porcentaje_comision'])}
+            por_mes.append(datos)
+            for campo in CAMPOS:
+                total[campo] += datos[campo]
+        if empleado['estado'] != EstadoEmpleado.ACTIVO and not any(total[campo] for campo in CAMPOS):
+            continue
+        filas.append({**empleado, 'meses': por_mes, 'total': total})
+    return {
+        'meses': [
+            {'mes': mes, 'cerrado': mes in meses_cerrados, 'cerrable': siguiente_mes(mes) <= fechas.hoy()}
+            for mes in lista_meses
+        ],
+        'empleados': filas,
+    }
@@ -0,0 +1,232 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, models, transaction
+from django.db.models import Count
+
+from . import fechas, replicas, resumen_ventas
+from .models import (
+    Auditoria, Cita, DetalleVenta, Empleado, EstadoEmpleado, EstadoVenta,
+    Producto, Servicio, TipoDetalleVenta, Venta,
+)
+
+
+# Widgets del dashboard con caché independiente por widget.
+# Cada widget sale de una sola consulta (los más vendidos, de una por tipo):
+# las cifras que comparten tabla (ventas de hoy y de la semana) se calculan
+# juntas con agregación condicional.
+# Cada widget se guarda bajo su propia clave (incluye la fecha local, así el
+# cambio de día no sirve datos de ayer) y los receivers de signals.py borran,
+# al confirmar la transacción, solo las claves de los widgets que dependen del
+# modelo modificado.
+# invalidar_modelo también guarda el momento del cambio de cada modelo, que
+# usan los gráficos (graficos.py) para su caché y sus cabeceras condicionales,
+# y que decide si un widget se recalcula en el primario o en la réplica
+# (replicas.lectura_tras_cambio).
+#
+# Configuración en settings.BARBERIA_DASHBOARD_CACHE:
+#   CACHE: alias de CACHES para los widgets, los contadores y las marcas de
+#       cambio. Debe ser compartido por todos los workers (Redis o Memcached):
+#       con LocMemCache la invalidación de un worker no llega a los demás
+#       ('manage.py check --deploy' lo rechaza, ver checks.py).
+#   TIMEOUT: segundos que un widget se considera fresco.
+#   STALE_WHILE_REVALIDATE: si es True, un widget vencido o invalidado se
+#       sirve igualmente y se recalcula en segundo plano.
+#   STALE_TTL: segundos extra que se conserva un valor vencido en ese modo.
+
+CONFIGURACION_POR_DEFECTO = {
+    'CACHE': 'default',
+    'TIMEOUT': 60,
+    'STALE_WHILE_REVALIDATE': False,
+    'STALE_TTL': 300,
+}
+
+PREFIJO = 'barberia:dashboard'
+
+
+def configuracion():
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'BARBERIA_DASHBOARD_CACHE', {})}
+
+
+def _cache():
+    return caches[configuracion()['CACHE']]
+
+
+def _citas_hoy(hoy):
+    # Rango semiabierto del día local sobre idx_cita_fecha_hora (sin DATE() sobre la columna)
+    return list(
+        Cita.objects.del_dia(hoy)
+        .select_related('cliente', 'empleado')
+        .order_by('fecha_hora')
+    )
+
+
+def _empleados_disponibles(hoy):
+    return list(Empleado.objects.filter(estado=EstadoEmpleado.ACTIVO))
+
+
+def _productos_bajo_stock(hoy):
+    return list(Producto.objects.filter(stock_actual__lte=models.F('stock_minimo'), activo=True))
+
+
+def _ventas(hoy):
+    # Hoy y los últimos siete días en una sola consulta sobre el resumen diario
+    return resumen_ventas.totales_tramos({'hoy': (hoy, hoy), 'semana': (hoy - timedelta(days=7), hoy)})
+
+
+def _populares(hoy, limite=5):
+    # Servicios y productos más vendidos: una consulta agrupada con LIMIT por tipo,
+    # así la BD solo devuelve los 'limite' primeros de cada uno
+    lineas = DetalleVenta.objects.filter(venta__estado=EstadoVenta.COMPLETADA)
+    return {
+        clave: list(
+            lineas.filter(tipo=tipo, **{f'{campo}__isnull': False})
+            .values('tipo', 'servicio__nombre', 'producto__nombre')
+            .annotate(total=Count('pk'))
+            .order_by('-total')[:limite]
+        )
+        for clave, tipo, campo in (
+            ('servicios', TipoDetalleVenta.SERVICIO, 'servicio'),
+            ('productos', TipoDetalleVenta.PRODUCTO, 'producto'),
+        )
+    }
+
+
+def _actividad_reciente(hoy):
+    return list(Auditoria.objects.order_by('-fecha_hora')[:10])
+
+
+# nombre del widget -> (función que lo calcula, modelos de los que depende)
+WIDGETS = {
+    'citas_hoy': (_citas_hoy, (Cita, Empleado)),
+    'empleados_disponibles': (_empleados_disponibles, (Empleado,)),
+    'productos_bajo_stock': (_productos_bajo_stock, (Producto,)),
+    'ventas': (_ventas, (Venta,)),
+    'populares': (_populares, (Venta, DetalleVenta, Producto, Servicio)),
+    'actividad_reciente': (_actividad_reciente, (Auditoria,)),
+}
+
+MODELOS_OBSERVADOS = tuple({modelo for _, modelos in WIDGETS.values() for modelo in modelos})
+
+
+def _clave(nombre, hoy):
+    return f'{PREFIJO}:{hoy.isoformat()}:{nombre}'
+
+
+def _contar(nombre, tipo):
+    clave = f'{PREFIJO}:stats:{nombre}:{tipo}'
+    cache = _cache()
+    try:
+        cache.incr(clave)
+    except ValueError:
+        if not cache.add(clave, 1, timeout=None):
+            cache.incr(clave)
+
+
+def _guardar(nombre, hoy, valor):
+    config = configuracion()
+    entrada = {'valor': valor, 'expira': time.time() + config['TIMEOUT']}
+    duracion = config['TIMEOUT'] + (config['STALE_TTL'] if config['STALE_WHILE_REVALIDATE'] else 0)
+    _cache().set(_clave(nombre, hoy), entrada, timeout=duracion)
+    return valor
+
+
+def _calcular(nombre, hoy):
+    # El valor queda en caché para todos: justo después de un cambio se calcula en el primario
+    funcion, modelos = WIDGETS[nombre]
+    with replicas.lectura_tras_cambio(ultimo_cambio(modelos)):
+        return funcion(hoy)
+
+
+def _revalidar(nombre, hoy, bloqueo):
+    try:
+        _guardar(nombre, hoy, _calcular(nombre, hoy))
+    finally:
+        _cache().delete(bloqueo)
+        close_old_connections()
+
+
+def obtener(nombre, hoy=None):
+    hoy = hoy or fechas.hoy()
+    cache = _cache()
+    entrada = cache.get(_clave(nombre, hoy))
+    if entrada is not None:
+        if entrada['expira'] > time.time():
+            _contar(nombre, 'hits')
+            return entrada['valor']
+        if configuracion()['STALE_WHILE_REVALIDATE']:
+            _contar(nombre, 'stale')
+            bloqueo = f'{_clave(nombre, hoy)}:revalidando'
+            if cache.add(bloqueo, 1, timeout=30):
+                threading.Thread(target=_revalidar, args=(nombre, hoy, bloqueo), daemon=True).start()
+            return entrada['valor']
+    _contar(nombre, 'misses')
+    return _guardar(nombre, hoy, _calcular(nombre, hoy))
+
+
+def widgets(hoy=None):
+    hoy = hoy or fechas.hoy()
+    return {nombre: obtener(nombre, hoy) for nombre in WIDGETS}
+
+
+def invalidar(nombres, hoy=None):
+    hoy = hoy or fechas.hoy()
+    claves = [_clave(nombre, hoy) for nombre in nombres]
+    cache = _cache()
+    if not configuracion()['STALE_WHILE_REVALIDATE']:
+        cache.delete_many(claves)
+        return
+    # En modo stale-while-revalidate se marca la entrada como vencida en lugar de borrarla
+    ttl = configuracion()['STALE_TTL']
+    for clave, entrada in cache.get_many(claves).items():
+        entrada['expira'] = 0
+        cache.set(clave, entrada, timeout=ttl)
+
+
+def _clave_cambio(modelo):
+    return f'{PREFIJO}:cambio:{modelo._meta.label_lower}'
+
+
+def registrar_cambio(modelo):
+    _cache().set(_clave_cambio(modelo), time.time(), timeout=None)
+    invalidar([nombre for nombre, (_, modelos) in WIDGETS.items() if modelo in modelos])
+
+
+def invalidar_modelo(modelo, using=None):
+    # Al confirmar la transacción: si se invalidara antes, otra petición podría
+    # recalcular el widget con los datos aún sin confirmar y guardarlos durante
+    # todo el TIMEOUT. Fuera de una transacción se invalida en el momento.
+    transaction.on_commit(lambda: registrar_cambio(modelo), using=using)
+
+
+def ultimo_cambio(modelos):
+    # Momento (timestamp) del último registrar_cambio de cualquiera de esos
+    # modelos. Si la caché no lo tiene se toma el momento actual.
+    claves = [_clave_cambio(modelo) for modelo in modelos]
+    cache = _cache()
+    valores = cache.get_many(claves)
+    for clave in set(claves) - set(valores):
+        ahora = time.time()
+        cache.add(clave, ahora, timeout=None)
+        valores[clave] = cache.get(clave, ahora)
+    return max(valores.values())
+
+
+def estadisticas():
+    claves = {
+        f'{PREFIJO}:stats:{nombre}:{tipo}': (nombre, tipo)
+        for nombre in WIDGETS
+        for tipo in ('hits', 'misses', 'stale')
+    }
+    valores = _cache().get_many(list(claves))
+    resultado = {nombre: {'hits': 0, 'misses': 0, 'stale': 0} for nombre in WIDGETS}
+    for clave, valor in valores.items():
+        nombre, tipo = claves[clave]
+        resultado[nombre][tipo] = valor
+    for contadores in resultado.values():
+        total = contadores['hits'] + contadores['misses'] + contadores['stale']
+        contadores['hit_rate'] = round((contadores['hits'] + contadores['stale']) / total, 3) if total else None
+    return resultado
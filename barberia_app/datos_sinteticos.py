@@ -0,0 +1,335 @@
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import busqueda_clientes, catalogo, dashboard, fechas, inventario, resumen_ventas, visitas_clientes
+from .models import (
+    Cita, Cliente, DetalleCita, DetalleVenta, Empleado, EstadoCita, EstadoVenta,
+    HorarioEmpleado, MetodoPagoVenta, MovimientoInventario, Producto, Servicio,
+    TipoDetalleVenta, TipoMovimientoInventario, Venta,
+)
+
+
+# Datos sintéticos para desarrollo y benchmarks (manage.py seed_barberia).
+# Con la misma semilla y la misma fecha final se generan exactamente los mismos
+# datos: todo sale de un random.Random(semilla) y las claves primarias se asignan
+# aquí (empezando tras la mayor existente), así las líneas de cita, venta y
+# movimiento pueden apuntar a su cabecera sin releerla y funciona igual en MySQL,
+# donde bulk_create no devuelve las claves. Las filas se insertan con bulk_create
+# por tramos de 'lote'; como bulk_create no dispara signals, al terminar se
+# reconstruyen el resumen diario de ventas, el índice de búsqueda de clientes,
+# el stock de los productos y el snapshot de stock de ayer.
+
+LOTE = 5000
+
+NOMBRES = (
+    'José', 'María', 'Juan', 'Luis', 'Carlos', 'Jorge', 'Miguel', 'Ángel', 'Andrés', 'Raúl',
+    'Sebastián', 'Martín', 'Diego', 'Álvaro', 'Fernando', 'Ricardo', 'Óscar', 'Iván', 'Joaquín', 'Rubén',
+    'Pedro', 'Pablo', 'Javier', 'Daniel', 'Alejandro', 'Mateo', 'Tomás', 'Nicolás', 'Hugo', 'Gonzalo',
+)
+APELLIDOS = (
+    'García', 'Rodríguez', 'González', 'Fernández', 'López', 'Martínez', 'Sánchez', 'Pérez', 'Gómez', 'Martín',
+    'Jiménez', 'Ruiz', 'Hernández', 'Díaz', 'Moreno', 'Muñoz', 'Álvarez', 'Romero', 'Alonso', 'Gutiérrez',
+    'Navarro', 'Torres', 'Domínguez', 'Vázquez', 'Ramos', 'Gil', 'Ramírez', 'Serrano', 'Blanco', 'Suárez',
+    'Molina', 'Morales', 'Ortega', 'Delgado', 'Castro', 'Ortiz', 'Rubio', 'Marín', 'Sanz', 'Núñez',
+    'Iglesias', 'Medina', 'Garrido', 'Cortés', 'Castillo', 'Santos', 'Lozano', 'Guerrero', 'Cano', 'Prieto',
+)
+
+# (nombre, categoría, minutos, precio)
+SERVICIOS = (
+    ('Corte clásico', 'Cortes', 30, '15.00'),
+    ('Degradado', 'Cortes', 45, '18.00'),
+    ('Corte infantil', 'Cortes', 30, '12.00'),
+    ('Corte a tijera', 'Cortes', 45, '20.00'),
+    ('Arreglo de barba', 'Barba', 15, '8.00'),
+    ('Perfilado de barba', 'Barba', 30, '12.00'),
+    ('Afeitado con navaja', 'Afeitado', 30, '14.00'),
+    ('Afeitado con toalla caliente', 'Afeitado', 45, '18.00'),
+    ('Lavado y peinado', 'Tratamientos', 15, '6.00'),
+    ('Tratamiento capilar', 'Tratamientos', 30, '22.00'),
+    ('Tinte de barba', 'Tratamientos', 30, '16.00'),
+    ('Cejas', 'Tratamientos', 15, '5.00'),
+)
+
+# (categoría, producto, marcas, precio de venta base)
+PRODUCTOS = (
+    ('Ceras', 'Cera', ('Reuzel', 'Layrite', 'Suavecito'), 14),
+    ('Pomadas', 'Pomada', ('Reuzel', 'Uppercut', 'Layrite'), 16),
+    ('Aceites para barba', 'Aceite para barba', ('Proraso', 'Beardbrand', 'Captain Fawcett'), 18),
+    ('Bálsamos para barba', 'Bálsamo para barba', ('Proraso', 'Beardbrand'), 15),
+    ('Aftershaves', 'Aftershave', ('Proraso', 'Floïd', 'Barbasol'), 12),
+    ('Champús para hombre', 'Champú', ('American Crew', 'Reuzel', 'Proraso'), 11),
+)
+
+# Pesos de cada método de pago y de cada estado final de una cita pasada
+METODOS_PAGO = (
+    (MetodoPagoVenta.EFECTIVO, 35), (MetodoPagoVenta.TARJETA_DEBITO, 30),
+    (MetodoPagoVenta.TARJETA_CREDITO, 25), (MetodoPagoVenta.TRANSFERENCIA, 8), (MetodoPagoVenta.OTRO, 2),
+)
+ESTADOS_PASADOS = ((EstadoCita.COMPLETADA, 86), (EstadoCita.CANCELADA, 8), (EstadoCita.NO_ASISTIO, 6))
+ESTADOS_FUTUROS = ((EstadoCita.PENDIENTE, 40), (EstadoCita.CONFIRMADA, 60))
+
+APERTURA = time(9)
+CIERRE = time(20)
+DIAS_FUTUROS = 14
+
+
+def _elegir(azar, pesos):
+    return azar.choices([valor for valor, _ in pesos], weights=[peso for _, peso in pesos])[0]
+
+
+def _siguiente_pk(modelo):
+    return (modelo.objects.order_by('-pk').values_list('pk', flat=True).first() or 0) + 1
+
+
+class _Insertador:
+    # Acumula instancias por modelo y las inserta con bulk_create cada 'lote' filas.
+    # Las cabeceras se vacían antes que sus líneas para respetar las claves foráneas.
+    ORDEN = (Cita, DetalleCita, Venta, DetalleVenta, MovimientoInventario)
+
+    def __init__(self, lote):
+        self.lote = lote
+        self.pendientes = {modelo: [] for modelo in self.ORDEN}
+        self.insertadas = {modelo: 0 for modelo in self.ORDEN}
+
+    def agregar(self, instancia):
+        self.pendientes[type(instancia)].append(instancia)
+        if len(self.pendientes[type(instancia)]) >= self.lote:
+            self.vaciar()
+
+    def vaciar(self):
+        for modelo in self.ORDEN:
+            if self.pendientes[modelo]:
+                modelo.objects.bulk_create(self.pendientes[modelo], batch_size=self.lote)
+                self.insertadas[modelo] += len(self.pendientes[modelo])
+                self.pendientes[modelo] = []
+
+
+def _catalogo(azar):
+    servicios = [
+        Servicio(nombre=nombre, categoria=categoria, duracion_minutos=minutos, precio=Decimal(precio))
+        for nombre, categoria, minutos, precio in SERVICIOS
+    ]
+    Servicio.objects.bulk_create(servicios, ignore_conflicts=True)
+    productos = []
+    for categoria, producto, marcas, precio_base in PRODUCTOS:
+        for marca in marcas:
+            for variante in ('', ' XL'):
+                precio = Decimal(precio_base + (6 if variante else 0) + azar.randint(0, 4))
+                productos.append(Producto(
+                    nombre=f'{producto} {marca}{variante}', categoria=categoria, marca=marca,
+                    precio_venta=precio, precio_costo=(precio * Decimal('0.45')).quantize(Decimal('0.01')),
+                    stock_actual=0, stock_minimo=azar.choice((5, 8, 10)),
+                ))
+    Producto.objects.bulk_create(productos, ignore_conflicts=True)
+    return (
+        list(Servicio.objects.filter(nombre__in=[fila[0] for fila in SERVICIOS]).order_by('pk')
+             .values_list('pk', 'precio', 'duracion_minutos')),
+        list(Producto.objects.filter(nombre__in=[producto.nombre for producto in productos]).order_by('pk')
+             .values_list('pk', 'precio_venta', 'stock_minimo')),
+    )
+
+
+def _clientes(azar, cantidad, desde, corte, lote):
+    primero = _siguiente_pk(Cliente)
+    telefonos = azar.sample(range(10 ** 8), cantidad)
+    inicio_registro = fechas.inicio_del_dia(desde)
+    segundos = max(int((corte - inicio_registro).total_seconds()), 1)
+    for tramo in range(0, cantidad, lote):
+        Cliente.objects.bulk_create([
+            Cliente(
+                pk=primero + n,
+                nombre=f'{azar.choice(NOMBRES)} {azar.choice(NOMBRES)}' if n % 5 == 0 else azar.choice(NOMBRES),
+                apellido=f'{azar.choice(APELLIDOS)} {azar.choice(APELLIDOS)}',
+                telefono=f'6{telefonos[n]:08d}',
+                email=f'cliente{primero + n}@correo.com' if azar.random() < 0.6 else None,
+                fecha_registro=inicio_registro + timedelta(seconds=azar.randrange(segundos)),
+            )
+            for n in range(tramo, min(tramo + lote, cantidad))
+        ])
+    return primero
+
+
+def _empleados(azar, cantidad, desde):
+    primero = _siguiente_pk(Empleado)
+    telefonos = azar.sample(range(10 ** 8), cantidad)
+    Empleado.objects.bulk_create([
+        Empleado(
+            pk=primero + n,
+            nombre=azar.choice(NOMBRES),
+            apellido=azar.choice(APELLIDOS),
+            telefono=f'7{telefonos[n]:08d}',
+            puesto='Barbero Principal' if n == 0 else 'Barbero',
+            fecha_contratacion=desde - timedelta(days=azar.randint(0, 365)),
+            porcentaje_comision=Decimal(azar.choice(('10.00', '12.50', '15.00'))),
+        )
+        for n in range(cantidad)
+    ])
+    # Lunes a sábado de APERTURA a CIERRE con una hora de comida; domingo libre
+    horarios = []
+    for empleado_id in range(primero, primero + cantidad):
+        comida = time(azar.choice((13, 14)))
+        for dia_semana in range(1, 7):
+            horarios.append(HorarioEmpleado(
+                empleado_id=empleado_id, dia_semana=dia_semana, hora_inicio=APERTURA, hora_fin=CIERRE,
+            ))
+            horarios.append(HorarioEmpleado(
+                empleado_id=empleado_id, dia_semana=dia_semana, hora_inicio=comida,
+                hora_fin=time(comida.hour + 1), es_descanso=True,
+            ))
+        horarios.append(HorarioEmpleado(
+            empleado_id=empleado_id, dia_semana=7, hora_inicio=time.min, hora_fin=time(23, 59, 59), es_descanso=True,
+        ))
+    HorarioEmpleado.objects.bulk_create(horarios)
+    return list(range(primero, primero + cantidad))
+
+
+def generar(clientes=5000, empleados=8, anios=2, citas_por_dia=40, ventas_mostrador_por_dia=4,
+            semilla=42, hasta=None, lote=LOTE):
+    # Genera 'anios' años de actividad que terminan en 'hasta' (por defecto hoy)
+    # más DIAS_FUTUROS días de citas pendientes. Devuelve el número de filas por tabla.
+    azar = random.Random(semilla)
+    hasta = hasta or fechas.hoy()
+    desde = hasta - timedelta(days=365 * anios)
+    # Lo anterior al corte ya ocurrió; con una fecha final pasada el corte no depende de la hora actual
+    corte = timezone.now() if hasta >= fechas.hoy() else fechas.inicio_del_dia(hasta + timedelta(days=1))
+    insertador = _Insertador(lote)
+
+    with transaction.atomic():
+        servicios, productos = _catalogo(azar)
+        primer_cliente = _clientes(azar, clientes, desde, corte, lote)
+        empleado_ids = _empleados(azar, empleados, desde)
+        siguiente = {modelo: _siguiente_pk(modelo) for modelo in (Cita, Venta)}
+        stock = {producto_id: 0 for producto_id, _, _ in productos}
+        precios = {producto_id: precio for producto_id, precio, _ in productos}
+        minimos = {producto_id: minimo for producto_id, _, minimo in productos}
+        # Los clientes habituales concentran las visitas: índice sesgado hacia los primeros
+        cliente_al_azar = lambda: primer_cliente + int(clientes * azar.random() ** 2)
+
+        def reponer(producto_id, fecha_hora, empleado_id):
+            cantidad = minimos[producto_id] * 4 - stock[producto_id]
+            stock[producto_id] += cantidad
+            insertador.agregar(MovimientoInventario(
+                producto_id=producto_id, tipo_movimiento=TipoMovimientoInventario.ENTRADA, cantidad=cantidad,
+                fecha_hora=fecha_hora, empleado_id=empleado_id, motivo='Reposición',
+                documento_referencia=f'ALB-{fecha_hora:%Y%m%d}-{producto_id}',
+            ))
+
+        def venta(fecha_hora, cliente_id, empleado_id, cita_id, lineas_servicio):
+            venta_id = siguiente[Venta]
+            siguiente[Venta] += 1
+            estado = EstadoVenta.COMPLETADA if azar.random() < 0.97 else azar.choice(
+                (EstadoVenta.ANULADA, EstadoVenta.REEMBOLSADA)
+            )
+            lineas = [
+                DetalleVenta(
+                    venta_id=venta_id, tipo=TipoDetalleVenta.SERVICIO, servicio_id=servicio_id, cantidad=1,
+                    precio_unitario=precio, descuento_aplicado=0, subtotal_linea=precio,
+                )
+                for servicio_id, precio in lineas_servicio
+            ]
+            if not lineas_servicio or azar.random() < 0.25:
+                for producto_id, _, _ in azar.sample(productos, azar.choice((1, 1, 2))):
+                    cantidad = azar.choice((1, 1, 1, 2))
+                    if stock[producto_id] < cantidad:
+                        reponer(producto_id, fecha_hora - timedelta(hours=1), empleado_id)
+                    stock[producto_id] -= cantidad
+                    lineas.append(DetalleVenta(
+                        venta_id=venta_id, tipo=TipoDetalleVenta.PRODUCTO, producto_id=producto_id,
+                        cantidad=cantidad, precio_unitario=precios[producto_id], descuento_aplicado=0,
+                        subtotal_linea=precios[producto_id] * cantidad,
+                    ))
+                    insertador.agregar(MovimientoInventario(
+                        producto_id=producto_id, tipo_movimiento=TipoMovimientoInventario.SALIDA_VENTA,
+                        cantidad=cantidad, fecha_hora=fecha_hora, empleado_id=empleado_id, venta_id=venta_id,
+                        motivo='Venta',
+                    ))
+            subtotal = sum((linea.subtotal_linea for linea in lineas), Decimal(0))
+            descuentos = Decimal(0) if azar.random() < 0.9 else (subtotal * Decimal('0.10')).quantize(Decimal('0.01'))
+            insertador.agregar(Venta(
+                pk=venta_id, cliente_id=cliente_id, empleado_id=empleado_id, cita_id=cita_id,
+                fecha_hora=fecha_hora, subtotal=subtotal, impuestos=0, descuentos=descuentos,
+                total=subtotal - descuentos, metodo_pago=_elegir(azar, METODOS_PAGO), estado=estado,
+            ))
+            for linea in lineas:
+                insertador.agregar(linea)
+
+        for producto_id, _, _ in productos:
+            reponer(producto_id, fechas.inicio_del_dia(desde) + timedelta(hours=8), empleado_ids[0])
+
+        dia = desde
+        while dia <= hasta + timedelta(days=DIAS_FUTUROS):
+            if dia.isoweekday() != 7:
+                apertura = timezone.make_aware(datetime.combine(dia, APERTURA))
+                # Más trabajo los viernes y sábados
+                cantidad = int(citas_por_dia * (1.3 if dia.isoweekday() >= 5 else 0.9) * azar.uniform(0.8, 1.1))
+                libre = dict.fromkeys(empleado_ids, apertura)
+                for _ in range(cantidad):
+                    empleado_id = azar.choice(empleado_ids)
+                    elegidos = azar.sample(servicios, azar.choice((1, 1, 1, 2, 2, 3)))
+                    minutos = sum(duracion for _, _, duracion in elegidos)
+                    inicio = libre[empleado_id] + timedelta(minutes=azar.choice((0, 0, 15, 30)))
+                    if inicio.time() < APERTURA or inicio + timedelta(minutes=minutos) > timezone.make_aware(
+                        datetime.combine(dia, CIERRE)
+                    ):
+                        continue
+                    libre[empleado_id] = inicio + timedelta(minutes=minutos)
+                    cita_id = siguiente[Cita]
+                    siguiente[Cita] += 1
+                    cliente_id = cliente_al_azar()
+                    estado = _elegir(azar, ESTADOS_PASADOS if inicio < corte else ESTADOS_FUTUROS)
+                    insertador.agregar(Cita(
+                        pk=cita_id, cliente_id=cliente_id, empleado_id=empleado_id, fecha_hora=inicio,
+                        duracion_total=minutos, estado=estado,
+                        fecha_creacion=inicio - timedelta(days=azar.randint(0, 10), minutes=azar.randint(0, 600)),
+                    ))
+                    for servicio_id, precio, duracion in elegidos:
+                        insertador.agregar(DetalleCita(
+                            cita_id=cita_id, servicio_id=servicio_id, precio_aplicado=precio,
+                            duracion_minutos=duracion,
+                        ))
+                    if estado == EstadoCita.COMPLETADA:
+                        venta(libre[empleado_id], cliente_id, empleado_id, cita_id,
+                              [(servicio_id, precio) for servicio_id, precio, _ in elegidos])
+                if dia <= hasta:
+                    for _ in range(ventas_mostrador_por_dia):
+                        momento = apertura + timedelta(minutes=azar.randrange(0, 600))
+                        if momento < corte:
+                            venta(momento, cliente_al_azar() if azar.random() < 0.5 else None,
+                                  azar.choice(empleado_ids), None, [])
+            dia += timedelta(days=1)
+        insertador.vaciar()
+
+        Producto.objects.bulk_update(
+            [Producto(pk=producto_id, stock_actual=cantidad) for producto_id, cantidad in stock.items()],
+            ['stock_actual'],
+        )
+        _reiniciar_secuencias()
+
+    busqueda_clientes.indexar_por_tramos(Cliente.objects.filter(pk__gte=primer_cliente), lote, reemplazar=False)
+    resumen_ventas.reconstruir(desde, hasta)
+    visitas_clientes.reconstruir()
+    inventario.tomar_snapshot()
+    for modelo in dashboard.MODELOS_OBSERVADOS:
+        dashboard.invalidar_modelo(modelo)
+    catalogo.invalidar()
+
+    resultado = {'clientes': clientes, 'empleados': empleados, 'servicios': len(servicios), 'productos': len(productos)}
+    resultado.update({modelo._meta.db_table: cantidad for modelo, cantidad in insertador.insertadas.items()})
+    return resultado
+
+
+def _reiniciar_secuencias():
+    # Tras insertar claves explícitas, las secuencias (PostgreSQL, Oracle) deben
+    # continuar desde la mayor; en MySQL y SQLite no hace falta y no hay sentencias.
+    sentencias = connection.ops.sequence_reset_sql(
+        no_style(), [Cliente, Empleado, Servicio, Producto, HorarioEmpleado, *_Insertador.ORDEN]
+    )
+    if sentencias:
+        with connection.cursor() as cursor:
+            for sentencia in sentencias:
+                cursor.execute(sentencia)
@@ -0,0 +1,224 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from functools import lru_cache
+
+from django.utils import timezone
+
+from . import catalogo, fechas
+from .models import DURACION_MAXIMA_CITA, ESTADOS_OCUPADOS, Cita, Empleado, EstadoEmpleado, HorarioEmpleado
+
+
+# Motor de disponibilidad.
+# Cada día de un empleado se representa como un mapa de bits (un int de Python)
+# con un bit por bloque de RESOLUCION minutos: bit encendido = bloque libre.
+# La plantilla semanal (HorarioEmpleado) se compila una vez por empleado y día
+# de la semana; las citas del rango se restan como intervalos ocupados.
+
+RESOLUCION = 5  # minutos por bit
+BLOQUES_DIA = 24 * 60 // RESOLUCION
+DIA_COMPLETO = (1 << BLOQUES_DIA) - 1
+PASO_POR_DEFECTO = 15  # los huecos ofrecidos empiezan en múltiplos de este valor
+
+
+def _minutos(hora):
+    return hora.hour * 60 + hora.minute + (1 if hora.second else 0)
+
+
+def _mascara(inicio_bloque, fin_bloque):
+    inicio_bloque = max(inicio_bloque, 0)
+    fin_bloque = min(fin_bloque, BLOQUES_DIA)
+    if fin_bloque <= inicio_bloque:
+        return 0
+    return ((1 << (fin_bloque - inicio_bloque)) - 1) << inicio_bloque
+
+
+def mascara_trabajo(inicio_min, fin_min):
+    # Solo cuentan los bloques completos dentro del turno
+    return _mascara(-(-inicio_min // RESOLUCION), fin_min // RESOLUCION)
+
+
+def mascara_ocupada(inicio_min, fin_min):
+    # Cualquier bloque tocado por la cita queda ocupado
+    return _mascara(inicio_min // RESOLUCION, -(-fin_min // RESOLUCION))
+
+
+def compilar_plantillas(horarios):
+    # horarios: iterable de (empleado_id, dia_semana, hora_inicio, hora_fin, es_descanso).
+    # Devuelve {empleado_id: [mapa lunes, ..., mapa domingo]}.
+    trabajo = {}
+    descansos = {}
+    for empleado_id, dia_semana, hora_inicio, hora_fin, es_descanso in horarios:
+        inicio, fin = _minutos(hora_inicio), _minutos(hora_fin)
+        destino = descansos if es_descanso else trabajo
+        dias = destino.setdefault(empleado_id, [0] * 7)
+        if es_descanso:
+            # Un descanso 00:00-23:59:59 bloquea el día completo
+            dias[dia_semana - 1] |= DIA_COMPLETO if fin >= 24 * 60 - 1 and inicio == 0 else mascara_ocupada(inicio, fin)
+        else:
+            dias[dia_semana - 1] |= mascara_trabajo(inicio, fin)
+
+    plantillas = {}
+    for empleado_id, dias in trabajo.items():
+        bloqueos = descansos.get(empleado_id, [0] * 7)
+        plantillas[empleado_id] = [dias[i] & ~bloqueos[i] for i in range(7)]
+    return plantillas
+
+
+def compilar_ocupacion(citas):
+    # citas: iterable de (empleado_id, inicio local, duracion en minutos).
+    # Devuelve {(empleado_id, fecha): mapa de bloques ocupados}.
+    # Las citas que cruzan la medianoche se reparten entre ambos días.
+    ocupacion = {}
+    actual = ocupacion.get
+    for empleado_id, inicio, duracion in citas:
+        fecha = inicio.date()
+        desde = inicio.hour * 60 + inicio.minute
+        hasta = desde + (duracion if duracion and duracion > 0 else 1)
+        while True:
+            primero = desde // RESOLUCION
+            ultimo = -(-min(hasta, 24 * 60) // RESOLUCION)
+            clave = (empleado_id, fecha)
+            ocupacion[clave] = actual(clave, 0) | (((1 << (ultimo - primero)) - 1) << primero)
+            if hasta <= 24 * 60:
+                break
+            desde, hasta = 0, hasta - 24 * 60
+            fecha += timedelta(days=1)
+    return ocupacion
+
+
+def _inicios_validos(libre, bloques):
+    # Bits i tales que los bloques i..i+bloques-1 están todos libres.
+    # Se combinan desplazamientos que se duplican: O(log bloques) operaciones.
+    candidatos = libre
+    cubiertos = 1
+    while cubiertos < bloques:
+        salto = min(cubiertos, bloques - cubiertos)
+        candidatos &= candidatos >> salto
+        cubiertos += salto
+    return candidatos
+
+
+@lru_cache(maxsize=None)
+def _mascara_paso(paso):
+    bloques = max(paso // RESOLUCION, 1)
+    mascara = 0
+    for bloque in range(0, BLOQUES_DIA, bloques):
+        mascara |= 1 << bloque
+    return mascara
+
+
+class Agenda:
+    def __init__(self, plantillas, ocupacion):
+        self.plantillas = plantillas
+        self.ocupacion = ocupacion
+
+    def libre(self, empleado_id, fecha):
+        plantilla = self.plantillas.get(empleado_id)
+        if not plantilla:
+            return 0
+        return plantilla[fecha.isoweekday() - 1] & ~self.ocupacion.get((empleado_id, fecha), 0)
+
+    def buscar(self, desde, dias, duracion, cantidad=10, empleados=None, paso=PASO_POR_DEFECTO, ahora=None):
+        # Devuelve hasta 'cantidad' tuplas (fecha, minuto de inicio, empleado_id)
+        # ordenadas por hora y, a igual hora, por empleado.
+        bloques = max(-(-duracion // RESOLUCION), 1)
+        alineados = _mascara_paso(paso)
+        empleados = sorted(self.plantillas if empleados is None else empleados)
+        huecos = []
+        for desplazamiento in range(dias):
+            fecha = desde + timedelta(days=desplazamiento)
+            limite = 0
+            if ahora is not None and fecha == ahora.date():
+                limite = mascara_ocupada(0, ahora.hour * 60 + ahora.minute)
+            del_dia = []
+            for empleado_id in empleados:
+                inicios = _inicios_validos(self.libre(empleado_id, fecha) & ~limite, bloques) & alineados
+                while inicios:
+                    bajo = inicios & -inicios
+                    del_dia.append((bajo.bit_length() - 1, empleado_id))
+                    inicios ^= bajo
+            del_dia.sort()
+            for bloque, empleado_id in del_dia[:cantidad - len(huecos)]:
+                huecos.append((fecha, bloque * RESOLUCION, empleado_id))
+            if len(huecos) >= cantidad:
+                break
+        return huecos
+
+
+def _sumar_duraciones(servicio_ids, servicios):
+    faltantes = set(servicio_ids) - set(servicios)
+    if faltantes:
+        raise ValueError(f"Servicios inexistentes o inactivos: {sorted(faltantes)}")
+    return sum(servicios[servicio_id]['duracion_minutos'] for servicio_id in set(servicio_ids))
+
+
+def duracion_servicios(servicio_ids):
+    # Duraciones del catálogo en memoria (catalogo.py), sin consulta
+    return _sumar_duraciones(servicio_ids, catalogo.servicios())
+
+
+def consultas_agenda(desde, dias, empleado_ids=None):
+    # (horarios, citas) de los empleados activos. Ambas filtran a los empleados
+    # con una subconsulta, sin una consulta previa de empleados.
+    empleados = Empleado.objects.filter(estado=EstadoEmpleado.ACTIVO)
+    if empleado_ids is not None:
+        empleados = empleados.filter(pk__in=empleado_ids)
+    empleados = empleados.values('empleado_id')
+
+    horarios = HorarioEmpleado.objects.filter(empleado_id__in=empleados).values_list(
+        'empleado_id', 'dia_semana', 'hora_inicio', 'hora_fin', 'es_descanso'
+    )
+    # Citas que se solapan con el rango, incluidas las que empiezan el día anterior
+    # y cruzan la medianoche (rango acotado sobre idx_cita_empleado_rango)
+    inicio, fin = fechas.rango_utc(desde, desde + timedelta(days=dias - 1))
+    citas = Cita.objects.filter(
+        empleado_id__in=empleados,
+        fecha_hora__gt=inicio - DURACION_MAXIMA_CITA,
+        fecha_hora__lt=fin,
+        fecha_hora_fin__gt=inicio,
+        estado__in=ESTADOS_OCUPADOS,
+    ).values_list('empleado_id', 'fecha_hora', 'duracion_total')
+    return horarios, citas
+
+
+def _agenda(horarios, citas):
+    # La zona se lee una vez: cada get_current_timezone() pasa por el Local de
+    # asgiref y por cita costaba más que el propio cálculo
+    zona = timezone.get_current_timezone()
+    return Agenda(
+        compilar_plantillas(horarios),
+        compilar_ocupacion(
+            (empleado_id, fecha_hora.astimezone(zona), duracion)
+            for empleado_id, fecha_hora, duracion in citas
+        ),
+    )
+
+
+def cargar_agenda(desde, dias, empleado_ids=None):
+    return _agenda(*consultas_agenda(desde, dias, empleado_ids))
+
+
+def _huecos(agenda, desde, dias, duracion, cantidad, paso):
+    huecos = agenda.buscar(desde, dias, duracion, cantidad=cantidad, paso=paso, ahora=timezone.localtime())
+    resultado = []
+    for fecha, minuto, hueco_empleado in huecos:
+        local = datetime.combine(fecha, time.min) + timedelta(minutes=minuto)
+        # Los mapas de bits van en hora de reloj: el día del cambio de hora de
+        # primavera no se ofrecen las horas que no existen, y el fin se calcula
+        # en UTC para que la cita dure lo mismo aunque cruce el cambio
+        inicio = timezone.make_aware(local).astimezone(dt_timezone.utc)
+        if timezone.localtime(inicio).replace(tzinfo=None) != local:
+            continue
+        resultado.append({
+            'inicio': inicio,
+            'fin': inicio + timedelta(minutes=duracion),
+            'empleado_id': hueco_empleado,
+        })
+    return resultado
+
+
+def buscar_huecos(servicio_ids, desde=None, dias=14, cantidad=10, empleado_id=None, paso=PASO_POR_DEFECTO):
+    desde = desde or fechas.hoy()
+    duracion = duracion_servicios(servicio_ids)
+    agenda = cargar_agenda(desde, dias, None if empleado_id is None else [empleado_id])
+    return duracion, _huecos(agenda, desde, dias, duracion, cantidad, paso)
+
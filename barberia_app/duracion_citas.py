@@ -0,0 +1,82 @@
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Cita, DetalleCita
+
+
+# Mantenimiento de Cita.duracion_total (suma de duracion_minutos de sus líneas),
+# el trabajo del procedimiento sp_actualizar_duracion_cita.
+# Cada alta, cambio o baja de un DetalleCita marca su cita (y la anterior si la
+# línea pasa a otra cita). Dentro de una transacción las citas marcadas se
+# recalculan una sola vez al confirmarla, con
+# un único UPDATE agregado: el admin guarda la cita y todas sus líneas en una
+# transacción, así cinco líneas no provocan cinco recálculos. Fuera de una
+# transacción se recalcula en el momento.
+
+LOTE = 1000
+
+# {alias: ids de citas marcadas} del contexto actual
+_pendientes = ContextVar('barberia_duraciones_pendientes', default=None)
+
+
+def _duracion_calculada():
+    lineas = (
+        DetalleCita.objects.filter(cita_id=OuterRef('pk'))
+        .order_by()
+        .values('cita_id')
+        .annotate(total=Sum('duracion_minutos'))
+        .values('total')
+    )
+    return Coalesce(Subquery(lineas, output_field=IntegerField()), 0)
+
+
+def recalcular(cita_ids, using=DEFAULT_DB_ALIAS):
+    cita_ids = sorted(cita_ids)
+    actualizadas = 0
+    for inicio in range(0, len(cita_ids), LOTE):
+        actualizadas += Cita.objects.using(using).filter(
+            pk__in=cita_ids[inicio:inicio + LOTE]
+        ).update(duracion_total=_duracion_calculada())
+    return actualizadas
+
+
+def _marcadas(using):
+    pendientes = _pendientes.get()
+    if pendientes is None:
+        pendientes = {}
+        _pendientes.set(pendientes)
+    return pendientes.setdefault(using, set())
+
+
+def recalcular_pendientes(using=DEFAULT_DB_ALIAS):
+    marcadas = _marcadas(using)
+    cita_ids = set(marcadas)
+    marcadas.clear()
+    return recalcular(cita_ids, using) if cita_ids else 0
+
+
+def marcar(cita_id, using=DEFAULT_DB_ALIAS):
+    if cita_id is None:
+        return
+    _marcadas(using).add(cita_id)
+    if connections[using].in_atomic_block:
+        # Un callback por marca: si se revierte un savepoint solo se pierde el suyo.
+        # El primero que se ejecuta recalcula todas las marcadas y el resto no hace nada.
+        transaction.on_commit(lambda: recalcular_pendientes(using), using=using)
+    else:
+        recalcular_pendientes(using)
+
+
+def corregir_tramo(desde_pk, hasta_pk):
+    # Citas con pk en [desde_pk, hasta_pk) cuya duracion_total no coincide con
+    # sus líneas; se leen con una consulta y se corrigen con un UPDATE
+    erroneas = list(
+        Cita.objects.filter(pk__gte=desde_pk, pk__lt=hasta_pk)
+        .annotate(calculada=Coalesce(Sum('detallecita__duracion_minutos'), 0))
+        .exclude(duracion_total=F('calculada'))
+        .values_list('pk', flat=True)
+    )
+    return recalcular(erroneas) if erroneas else 0
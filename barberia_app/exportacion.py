@@ -0,0 +1,160 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from . import fechas
+from .models import DetalleVenta, MovimientoInventario, Venta
+
+
+# Exportación en streaming de ventas, líneas de venta y movimientos.
+# Las filas se leen por tramos de clave primaria (WHERE pk > último ORDER BY pk
+# LIMIT LOTE) con values_list y los nombres de cliente, empleado y producto
+# salen del mismo JOIN; cada tramo se escribe y se entrega al
+# StreamingHttpResponse antes de leer el siguiente, así la memoria no depende
+# del número de filas exportadas.
+
+LOTE = 2000
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'jsonl': ('application/x-ndjson; charset=utf-8', 'jsonl'),
+}
+
+
+def _nombre(nombre, apellido):
+    return f'{nombre} {apellido}' if nombre else ''
+
+
+def _fila_venta(fila):
+    (venta_id, fecha_hora, cliente, cliente_apellido, empleado, empleado_apellido, cita_id,
+     subtotal, impuestos, descuentos, total, metodo_pago, estado) = fila
+    return (
+        venta_id, fecha_hora, _nombre(cliente, cliente_apellido), _nombre(empleado, empleado_apellido),
+        cita_id, subtotal, impuestos, descuentos, total, metodo_pago, estado,
+    )
+
+
+def _fila_detalle(fila):
+    (detalle_id, venta_id, fecha_hora, cliente, cliente_apellido, empleado, empleado_apellido,
+     tipo, producto, servicio, cantidad, precio_unitario, descuento, subtotal_linea) = fila
+    return (
+        detalle_id, venta_id, fecha_hora, _nombre(cliente, cliente_apellido),
+        _nombre(empleado, empleado_apellido), tipo, producto or servicio or '',
+        cantidad, precio_unitario, descuento, subtotal_linea,
+    )
+
+
+def _fila_movimiento(fila):
+    (movimiento_id, fecha_hora, producto, tipo, cantidad, empleado, empleado_apellido,
+     venta_id, motivo, documento) = fila
+    return (
+        movimiento_id, fecha_hora, producto, tipo, cantidad, _nombre(empleado, empleado_apellido),
+        venta_id, motivo, documento,
+    )
+
+
+# nombre: (modelo, campo de fecha para filtrar, campos de values_list (pk primero), encabezados, fila)
+EXPORTACIONES = {
+    'ventas': (
+        Venta, 'fecha_hora',
+        ('venta_id', 'fecha_hora', 'cliente__nombre', 'cliente__apellido', 'empleado__nombre',
+         'empleado__apellido', 'cita_id', 'subtotal', 'impuestos', 'descuentos', 'total',
+         'metodo_pago', 'estado'),
+        ('venta_id', 'fecha_hora', 'cliente', 'empleado', 'cita_id', 'subtotal', 'impuestos',
+         'descuentos', 'total', 'metodo_pago', 'estado'),
+        _fila_venta,
+    ),
+    'detalle_ventas': (
+        DetalleVenta, 'venta__fecha_hora',
+        ('detalle_venta_id', 'venta_id', 'venta__fecha_hora', 'venta__cliente__nombre',
+         'venta__cliente__apellido', 'venta__empleado__nombre', 'venta__empleado__apellido', 'tipo',
+         'producto__nombre', 'servicio__nombre', 'cantidad', 'precio_unitario', 'descuento_aplicado',
+         'subtotal_linea'),
+        ('detalle_venta_id', 'venta_id', 'fecha_hora', 'cliente', 'empleado', 'tipo', 'item',
+         'cantidad', 'precio_unitario', 'descuento_aplicado', 'subtotal_linea'),
+        _fila_detalle,
+    ),
+    'movimientos': (
+        MovimientoInventario, 'fecha_hora',
+        ('movimiento_id', 'fecha_hora', 'producto__nombre', 'tipo_movimiento', 'cantidad',
+         'empleado__nombre', 'empleado__apellido', 'venta_id', 'motivo', 'documento_referencia'),
+        ('movimiento_id', 'fecha_hora', 'producto', 'tipo_movimiento', 'cantidad', 'empleado',
+         'venta_id', 'motivo', 'documento_referencia'),
+        _fila_movimiento,
+    ),
+}
+
+
+def consulta(nombre, desde=None, hasta=None):
+    modelo, campo_fecha = EXPORTACIONES[nombre][:2]
+    filas = modelo.objects.all()
+    if desde:
+        filas = filas.filter(**{f'{campo_fecha}__gte': fechas.inicio_del_dia(desde)})
+    if hasta:
+        filas = filas.filter(**{f'{campo_fecha}__lt': fechas.inicio_del_dia(hasta + timedelta(days=1))})
+    return filas
+
+
+def tramos(nombre, queryset, lote=LOTE):
+    # Listas de filas ya convertidas, leídas por tramos de clave primaria.
+    campos, convertir = EXPORTACIONES[nombre][2], EXPORTACIONES[nombre][4]
+    consulta_base = queryset.order_by('pk').values_list(*campos)
+    ultimo = None
+    while True:
+        tramo = consulta_base.filter(pk__gt=ultimo) if ultimo is not None else consulta_base
+        filas = list(tramo[:lote])
+        if not filas:
+            return
+        ultimo = filas[-1][0]
+        yield [convertir(fila) for fila in filas]
+        if len(filas) < lote:
+            return
+
+
+def _valor(valor):
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    return valor
+
+
+def lineas_csv(nombre, queryset, lote=LOTE):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(EXPORTACIONES[nombre][3])
+    for filas in tramos(nombre, queryset, lote):
+        escritor.writerows([_valor(valor) for valor in fila] for fila in filas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Solo el encabezado: no hubo filas
+        yield buffer.getvalue()
+
+
+def lineas_jsonl(nombre, queryset, lote=LOTE):
+    encabezados = EXPORTACIONES[nombre][3]
+    for filas in tramos(nombre, queryset, lote):
+        yield ''.join(
+            json.dumps(dict(zip(encabezados, map(_valor, fila))), ensure_ascii=False) + '\n'
+            for fila in filas
+        )
+
+
+GENERADORES = {
+    'csv': lineas_csv,
+    'jsonl': lineas_jsonl,
+}
+
+
+def respuesta(nombre, queryset, formato='csv'):
+    tipo, extension = FORMATOS[formato]
+    response = StreamingHttpResponse(GENERADORES[formato](nombre, queryset), content_type=tipo)
+    response['Content-Disposition'] = f'attachment; filename="{nombre}-{fechas.hoy()}.{extension}"'
+    return response
@@ -0,0 +1,31 @@
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+
+# Utilidades de fechas en la hora local de la barbería.
+# Los DateTimeField se guardan en UTC; los reportes se agrupan por día local.
+# Para filtrar Cita, Venta, MovimientoInventario y Auditoria por días locales
+# están sus managers (models.RangoFechasQuerySet: del_dia, de_la_semana, entre).
+
+def hoy():
+    return timezone.localdate()
+
+
+def fecha_local(valor):
+    return timezone.localdate(valor)
+
+
+def inicio_de_semana(fecha):
+    # Lunes de la semana de 'fecha'
+    return fecha - timedelta(days=fecha.weekday())
+
+
+def inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def rango_utc(desde, hasta):
+    # Rango semiabierto [inicio de 'desde', inicio del día siguiente a 'hasta')
+    # para filtrar fecha_hora sin envolver la columna en una función.
+    return inicio_del_dia(desde), inicio_del_dia(hasta + timedelta(days=1))
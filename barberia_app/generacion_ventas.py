@@ -0,0 +1,136 @@
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import auditoria, dashboard, fechas, resumen_ventas, visitas_clientes
+from .models import (
+    Cita, DetalleCita, DetalleVenta, EstadoCita, EstadoVenta, MetodoPagoVenta,
+    TipoDetalleVenta, Venta,
+)
+
+
+# Generación de ventas a partir de citas.
+# Cada venta se crea con sus líneas dentro de una transacción; la fila de la
+# cita se bloquea con SELECT ... FOR UPDATE y la restricción única de
+# ventas.cita_id actúa como última barrera contra la doble facturación.
+
+def _lineas(venta_id, detalles):
+    return [
+        DetalleVenta(
+            venta_id=venta_id,
+            tipo=TipoDetalleVenta.SERVICIO,
+            servicio_id=servicio_id,
+            cantidad=1,
+            precio_unitario=precio,
+            descuento_aplicado=0,
+            subtotal_linea=precio,
+        )
+        for servicio_id, precio in detalles
+    ]
+
+
+def generar_venta_desde_cita(cita_id, metodo_pago=MetodoPagoVenta.EFECTIVO):
+    # Devuelve (venta, creada). Si la cita ya tiene venta se devuelve la existente.
+    try:
+        with transaction.atomic():
+            cita = Cita.objects.select_for_update().get(pk=cita_id)
+            existente = Venta.objects.filter(cita_id=cita.pk).first()
+            if existente:
+                return existente, False
+
+            detalles = list(
+                DetalleCita.objects.filter(cita_id=cita.pk).values_list('servicio_id', 'precio_aplicado')
+            )
+            subtotal = sum((precio for _, precio in detalles), 0)
+            venta = Venta.objects.create(
+                cliente_id=cita.cliente_id,
+                empleado_id=cita.empleado_id,
+                cita=cita,
+                fecha_hora=timezone.now(),
+                subtotal=subtotal,
+                impuestos=0,
+                descuentos=0,
+                total=subtotal,
+                metodo_pago=metodo_pago,
+                estado=EstadoVenta.COMPLETADA,
+            )
+            DetalleVenta.objects.bulk_create(_lineas(venta.pk, detalles))
+            # bulk_create no dispara signals: los más vendidos dependen de las líneas
+            dashboard.invalidar_modelo(DetalleVenta)
+            return venta, True
+    except IntegrityError:
+        # Otra petición creó la venta de esta cita al mismo tiempo
+        return Venta.objects.get(cita_id=cita_id), False
+
+
+def generar_ventas_en_lote(citas, metodo_pago=MetodoPagoVenta.EFECTIVO, batch_size=500, fecha_de_la_cita=False):
+    # Genera las ventas de las citas completadas sin venta del queryset 'citas'.
+    # Cada lote es una transacción: Venta y DetalleVenta se insertan con bulk_create.
+    # Devuelve el número de ventas creadas.
+    pendientes = list(
+        citas.filter(estado=EstadoCita.COMPLETADA, venta__isnull=True)
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+    creadas = 0
+    dias = set()
+    clientes = set()
+    for inicio in range(0, len(pendientes), batch_size):
+        lote = pendientes[inicio:inicio + batch_size]
+        with transaction.atomic():
+            bloqueadas = list(
+                Cita.objects.select_for_update()
+                .filter(pk__in=lote)
+                .values_list('pk', 'cliente_id', 'empleado_id', 'fecha_hora')
+            )
+            facturadas = set(Venta.objects.filter(cita_id__in=lote).values_list('cita_id', flat=True))
+            bloqueadas = [fila for fila in bloqueadas if fila[0] not in facturadas]
+            if not bloqueadas:
+                continue
+
+            detalles = {}
+            for cita_id, servicio_id, precio in DetalleCita.objects.filter(
+                cita_id__in=[fila[0] for fila in bloqueadas]
+            ).values_list('cita_id', 'servicio_id', 'precio_aplicado'):
+                detalles.setdefault(cita_id, []).append((servicio_id, precio))
+
+            ahora = timezone.now()
+            ventas = []
+            for cita_id, cliente_id, empleado_id, fecha_hora in bloqueadas:
+                subtotal = sum((precio for _, precio in detalles.get(cita_id, [])), 0)
+                fecha_venta = fecha_hora if fecha_de_la_cita else ahora
+                dias.add(fechas.fecha_local(fecha_venta))
+                if cliente_id:
+                    clientes.add(cliente_id)
+                ventas.append(Venta(
+                    cliente_id=cliente_id,
+                    empleado_id=empleado_id,
+                    cita_id=cita_id,
+                    fecha_hora=fecha_venta,
+                    subtotal=subtotal,
+                    impuestos=0,
+                    descuentos=0,
+                    total=subtotal,
+                    metodo_pago=metodo_pago,
+                    estado=EstadoVenta.COMPLETADA,
+                ))
+            Venta.objects.bulk_create(ventas, batch_size=batch_size)
+
+            # bulk_create no devuelve las claves en todos los motores (MySQL): se releen por cita
+            venta_por_cita = dict(
+                Venta.objects.filter(cita_id__in=[venta.cita_id for venta in ventas]).values_list('cita_id', 'venta_id')
+            )
+            lineas = []
+            for venta in ventas:
+                venta.pk = venta_por_cita[venta.cita_id]
+                lineas.extend(_lineas(venta.pk, detalles.get(venta.cita_id, [])))
+            DetalleVenta.objects.bulk_create(lineas, batch_size=batch_size)
+            auditoria.registrar_insercion_masiva(Venta, ventas)
+            creadas += len(ventas)
+
+    if creadas:
+        # bulk_create no dispara signals: se actualizan resumen, clientes y dashboard a mano
+        resumen_ventas.reconstruir_dias(dias)
+        visitas_clientes.recalcular(clientes)
+        dashboard.invalidar_modelo(Venta)
+        dashboard.invalidar_modelo(DetalleVenta)
+    return creadas
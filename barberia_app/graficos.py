@@ -0,0 +1,178 @@
+import hashlib
+import json
+from datetime import date, timedelta
+
+from django.core.cache import caches
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from . import comisiones, dashboard, fechas, replicas
+from .models import (
+    Cita, DetalleVenta, EstadoCita, EstadoVenta, ResumenVentaDiario, Servicio, TipoDetalleVenta, Venta,
+)
+
+
+# Series temporales del dashboard ya agrupadas en el servidor (ver dashboard_charts.js).
+# Cada serie devuelve JSON por columnas: la lista de periodos (inicio de cada
+# día, semana o mes, sin huecos) y una lista de valores por serie, alineada con
+# los periodos. Los ingresos salen de resumen_ventas_diario; las citas y los
+# servicios, de una consulta agrupada por periodo local.
+#
+# La respuesta serializada se guarda en caché bajo una clave que incluye el
+# último cambio de los modelos de los que depende (dashboard.invalidar_modelo lo
+# registra), así que un cambio deja de servirla enseguida y la caché solo la
+# acota el TIMEOUT del dashboard. El ETag es el hash del contenido: una petición
+# con If-None-Match recibe 304 si la serie no ha cambiado. Justo después de un
+# cambio la serie se calcula en el primario (replicas.lectura_tras_cambio).
+# Series y marcas de cambio van en la caché del dashboard (BARBERIA_DASHBOARD_CACHE),
+# compartida por los workers: el ETag y Last-Modified son los mismos en todos.
+
+AGRUPACIONES = {'dia': 'day', 'semana': 'week', 'mes': 'month'}
+MAXIMO_PERIODOS = 1100  # Unos tres años de serie diaria
+TOP_SERVICIOS = 5
+PREFIJO = 'barberia:graficos'
+
+
+def _cache():
+    return caches[dashboard.configuracion()['CACHE']]
+
+
+def inicio_periodo(fecha, agrupacion):
+    if agrupacion == 'semana':
+        return fecha - timedelta(days=fecha.weekday())
+    if agrupacion == 'mes':
+        return fecha.replace(day=1)
+    return fecha
+
+
+def periodos(desde, hasta, agrupacion):
+    resultado = []
+    actual = inicio_periodo(desde, agrupacion)
+    while actual <= hasta:
+        resultado.append(actual)
+        if agrupacion == 'mes':
+            actual = comisiones.siguiente_mes(actual)
+        else:
+            actual += timedelta(days=7 if agrupacion == 'semana' else 1)
+    return resultado
+
+
+def _periodo(campo, agrupacion):
+    # Inicio del periodo local de un DateTimeField como fecha
+    return Trunc(campo, AGRUPACIONES[agrupacion], output_field=DateField(), tzinfo=timezone.get_current_timezone())
+
+
+def _columna(valores, lista_periodos, convertir=int):
+    return [convertir(valores.get(periodo, 0)) for periodo in lista_periodos]
+
+
+def _importe(valor):
+    return round(float(valor), 2)
+
+
+def ingresos(desde, hasta, agrupacion):
+    lista = periodos(desde, hasta, agrupacion)
+    resumenes = ResumenVentaDiario.objects.filter(fecha__gte=lista[0], fecha__lte=hasta, estado=EstadoVenta.COMPLETADA)
+    if agrupacion == 'dia':
+        resumenes = resumenes.annotate(periodo=F('fecha'))
+    else:
+        resumenes = resumenes.annotate(periodo=Trunc('fecha', AGRUPACIONES[agrupacion], output_field=DateField()))
+    totales, ventas = {}, {}
+    for periodo, total, cantidad in (
+        resumenes.values('periodo').annotate(total=Sum('total'), cantidad=Sum('cantidad'))
+        .order_by().values_list('periodo', 'total', 'cantidad')
+    ):
+        totales[periodo], ventas[periodo] = total, cantidad
+    return lista, [
+        {'nombre': 'Ingresos', 'valores': _columna(totales, lista, _importe)},
+        {'nombre': 'Ventas', 'valores': _columna(ventas, lista)},
+    ]
+
+
+def citas(desde, hasta, agrupacion):
+    lista = periodos(desde, hasta, agrupacion)
+    por_estado = {}
+    for periodo, estado, cantidad in (
+        Cita.objects.entre(lista[0], hasta)
+        .annotate(periodo=_periodo('fecha_hora', agrupacion))
+        .values('periodo', 'estado').annotate(cantidad=Count('pk'))
+        .order_by().values_list('periodo', 'estado', 'cantidad')
+    ):
+        por_estado.setdefault(estado, {})[periodo] = cantidad
+    return lista, [
+        {'nombre': etiqueta, 'valores': _columna(por_estado.get(estado, {}), lista)}
+        for estado, etiqueta in EstadoCita.choices
+    ]
+
+
+def servicios(desde, hasta, agrupacion, limite=TOP_SERVICIOS):
+    # Los 'limite' servicios más vendidos del rango, con sus ventas por periodo
+    lista = periodos(desde, hasta, agrupacion)
+    inicio, fin = fechas.rango_utc(lista[0], hasta)
+    por_servicio = {}
+    for periodo, servicio_id, cantidad in (
+        DetalleVenta.objects.filter(
+            tipo=TipoDetalleVenta.SERVICIO, venta__estado=EstadoVenta.COMPLETADA,
+            venta__fecha_hora__gte=inicio, venta__fecha_hora__lt=fin,
+        )
+        .annotate(periodo=_periodo('venta__fecha_hora', agrupacion))
+        .values('periodo', 'servicio_id').annotate(cantidad=Count('pk'))
+        .order_by().values_list('periodo', 'servicio_id', 'cantidad')
+    ):
+        por_servicio.setdefault(servicio_id, {})[periodo] = cantidad
+    top = sorted(por_servicio, key=lambda servicio_id: -sum(por_servicio[servicio_id].values()))[:limite]
+    nombres = dict(Servicio.objects.filter(pk__in=top).values_list('servicio_id', 'nombre'))
+    return lista, [
+        {'nombre': nombres.get(servicio_id, str(servicio_id)), 'valores': _columna(por_servicio[servicio_id], lista)}
+        for servicio_id in top
+    ]
+
+
+# nombre -> (función, modelos de los que depende, permiso necesario)
+SERIES = {
+    'ingresos': (ingresos, (Venta,), 'barberia_app.view_venta'),
+    'citas': (citas, (Cita,), 'barberia_app.view_cita'),
+    'servicios': (servicios, (Venta, DetalleVenta, Servicio), 'barberia_app.view_venta'),
+}
+
+MODELOS = tuple({modelo for _, modelos, _ in SERIES.values() for modelo in modelos})
+
+
+def parametros(datos, hoy=None):
+    # (desde, hasta, agrupacion) validados; por defecto el último año por día.
+    # ValueError si no son válidos.
+    hoy = hoy or fechas.hoy()
+    agrupacion = datos.get('agrupacion') or 'dia'
+    if agrupacion not in AGRUPACIONES:
+        raise ValueError(f'agrupacion debe ser una de: {", ".join(AGRUPACIONES)}')
+    hasta = date.fromisoformat(datos['hasta']) if datos.get('hasta') else hoy
+    desde = date.fromisoformat(datos['desde']) if datos.get('desde') else hasta - timedelta(days=364)
+    if desde > hasta:
+        raise ValueError('desde es posterior a hasta')
+    if len(periodos(desde, hasta, agrupacion)) > MAXIMO_PERIODOS:
+        raise ValueError(f'El rango supera {MAXIMO_PERIODOS} periodos: use una agrupación mayor')
+    return desde, hasta, agrupacion
+
+
+def respuesta(serie, desde, hasta, agrupacion):
+    # (contenido JSON, etag, momento del último cambio de los datos)
+    funcion, modelos, _ = SERIES[serie]
+    cambio = dashboard.ultimo_cambio(modelos)
+    clave = f'{PREFIJO}:{serie}:{desde.isoformat()}:{hasta.isoformat()}:{agrupacion}:{cambio}'
+    cache = _cache()
+    guardada = cache.get(clave)
+    if guardada is None:
+        with replicas.lectura_tras_cambio(cambio):
+            lista, datos = funcion(desde, hasta, agrupacion)
+        contenido = json.dumps({
+            'serie': serie,
+            'agrupacion': agrupacion,
+            'desde': desde.isoformat(),
+            'hasta': hasta.isoformat(),
+            'periodos': [periodo.isoformat() for periodo in lista],
+            'series': datos,
+        }, separators=(',', ':'), ensure_ascii=False)
+        guardada = (contenido, '"%s"' % hashlib.md5(contenido.encode()).hexdigest())
+        cache.set(clave, guardada, timeout=dashboard.configuracion()['TIMEOUT'])
+    return guardada[0], guardada[1], cambio
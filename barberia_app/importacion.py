@@ -0,0 +1,189 @@
+import csv
+import io
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import busqueda_clientes, catalogo, dashboard, lotes
+from .models import Cliente, Producto, Servicio
+
+
+# Importación masiva de catálogos (clientes, productos y servicios) desde CSV o XLSX.
+# Las filas se leen en streaming y cada una se valida con los validadores del
+# modelo (full_clean sin la comprobación de unicidad, que haría una consulta por
+# fila). Las filas válidas se agrupan en lotes que se guardan de una vez
+# (lotes.insertar_o_actualizar), usando como clave la columna única del catálogo: las existentes se actualizan con las columnas del archivo y las
+# nuevas se insertan. Si la clave se repite en el archivo gana la última fila.
+# Las filas rechazadas se entregan a 'rechazos' con su número y el motivo.
+#
+# bulk_create no dispara signals: las filas importadas no generan entradas de
+# auditoría, el índice de búsqueda de clientes se actualiza por lote y el
+# dashboard y el catálogo en memoria se invalidan al terminar.
+
+LOTE = 1000
+
+# nombre: (modelo, columna única usada como clave)
+CATALOGOS = {
+    'clientes': (Cliente, 'telefono'),
+    'productos': (Producto, 'nombre'),
+    'servicios': (Servicio, 'nombre'),
+}
+
+# El stock de un producto existente solo cambia con movimientos (ver inventario.py)
+SOLO_AL_CREAR = {
+    'productos': ('stock_actual',),
+}
+
+# Columnas calculadas por la aplicación que no se aceptan en el archivo:
+# las métricas de visita del cliente las mantiene visitas_clientes.py
+MANTENIDAS = {
+    'clientes': ('ultima_visita', 'visitas', 'gasto_total'),
+}
+
+
+def columnas_validas(nombre):
+    modelo, _ = CATALOGOS[nombre]
+    return {
+        campo.name for campo in modelo._meta.concrete_fields
+        if campo.editable and not campo.primary_key and campo.name not in MANTENIDAS.get(nombre, ())
+    }
+
+
+def formato_de(nombre_archivo):
+    return 'xlsx' if nombre_archivo.lower().endswith('.xlsx') else 'csv'
+
+
+def filas_csv(archivo):
+    # archivo: texto o binario (UTF-8, con o sin BOM)
+    if not isinstance(archivo, io.TextIOBase):
+        archivo = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    yield from csv.reader(archivo)
+
+
+def filas_xlsx(archivo):
+    try:
+        import openpyxl
+    except ImportError:
+        raise ValueError('Para importar archivos XLSX hace falta instalar openpyxl.')
+    libro = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        yield from libro.active.iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+
+LECTORES = {
+    'csv': filas_csv,
+    'xlsx': filas_xlsx,
+}
+
+
+def _mensaje(error):
+    if hasattr(error, 'message_dict'):
+        return '; '.join(f"{campo}: {' '.join(mensajes)}" for campo, mensajes in error.message_dict.items())
+    return ' '.join(error.messages)
+
+
+def importar(nombre, filas, rechazos=None, lote=LOTE):
+    # filas: iterable de listas cuya primera fila son los encabezados (nombres de campo).
+    # rechazos: callable(numero_fila, fila, motivo) o None.
+    # Devuelve {'creados', 'actualizados', 'rechazados'}.
+    modelo, clave = CATALOGOS[nombre]
+    filas = iter(filas)
+    encabezados = [str(columna).strip() if columna is not None else '' for columna in next(filas, ())]
+    desconocidas = [columna for columna in encabezados if columna and columna not in columnas_validas(nombre)]
+    if desconocidas:
+        raise ValueError(f"Columnas desconocidas para {nombre}: {', '.join(desconocidas)}")
+    if clave not in encabezados:
+        raise ValueError(f"Falta la columna clave '{clave}'")
+
+    columnas = [columna for columna in encabezados if columna]
+    campos = {columna: modelo._meta.get_field(columna) for columna in columnas}
+    actualizables = [
+        columna for columna in columnas
+        if columna != clave and columna not in SOLO_AL_CREAR.get(nombre, ())
+    ]
+    resultado = {'creados': 0, 'actualizados': 0, 'rechazados': 0}
+
+    def rechazar(numero, fila, motivo):
+        resultado['rechazados'] += 1
+        if rechazos:
+            rechazos(numero, fila, motivo)
+
+    pendiente = {}  # valor de la clave: (instancia, número de fila, fila)
+    for numero, fila in enumerate(filas, start=2):
+        datos = {}
+        for columna, valor in zip(encabezados, fila):
+            if not columna:
+                continue
+            if isinstance(valor, str):
+                valor = valor.strip()
+            if valor == '' or valor is None:
+                # Celda vacía: NULL si el campo lo admite; si no, el valor por defecto del modelo
+                if campos[columna].null:
+                    datos[columna] = None
+                continue
+            datos[columna] = valor
+        if not any(valor is not None for valor in datos.values()):
+            continue
+
+        instancia = modelo(**datos)
+        try:
+            instancia.full_clean(validate_unique=False, validate_constraints=False)
+        except ValidationError as error:
+            rechazar(numero, fila, _mensaje(error))
+            continue
+
+        pendiente[getattr(instancia, clave)] = (instancia, numero, fila)
+        if len(pendiente) >= lote:
+            _guardar(modelo, clave, actualizables, pendiente, rechazar, resultado)
+            pendiente = {}
+    if pendiente:
+        _guardar(modelo, clave, actualizables, pendiente, rechazar, resultado)
+
+    if resultado['creados'] or resultado['actualizados']:
+        dashboard.invalidar_modelo(modelo)
+        if modelo is not Cliente:
+            catalogo.invalidar()
+    return resultado
+
+
+def _descartar_emails_ajenos(modelo, clave, pendiente, rechazar):
+    # El email también es único: se rechazan las filas cuyo email ya pertenece a
+    # otro registro (en la BD o en una fila anterior del mismo lote).
+    por_email = {}
+    for valor_clave, (instancia, numero, fila) in list(pendiente.items()):
+        if not instancia.email:
+            continue
+        if instancia.email in por_email:
+            rechazar(numero, fila, f"email: {instancia.email} repetido en el archivo")
+            del pendiente[valor_clave]
+        else:
+            por_email[instancia.email] = valor_clave
+    if not por_email:
+        return
+    for email, valor_clave in modelo.objects.filter(email__in=list(por_email)).values_list('email', clave):
+        nueva = por_email[email]
+        if valor_clave != nueva:
+            _, numero, fila = pendiente.pop(nueva)
+            rechazar(numero, fila, f"email: {email} pertenece a otro registro ({valor_clave})")
+
+
+def _guardar(modelo, clave, actualizables, pendiente, rechazar, resultado):
+    if any(campo.name == 'email' for campo in modelo._meta.concrete_fields):
+        _descartar_emails_ajenos(modelo, clave, pendiente, rechazar)
+    if not pendiente:
+        return
+    instancias = [instancia for instancia, _, _ in pendiente.values()]
+    with transaction.atomic():
+        existentes = modelo.objects.filter(**{f'{clave}__in': list(pendiente)}).count()
+        if actualizables:
+            lotes.insertar_o_actualizar(modelo, instancias, clave, actualizables)
+        else:
+            modelo.objects.bulk_create(instancias, ignore_conflicts=True)
+        if modelo is Cliente:
+            busqueda_clientes.indexar(
+                Cliente.objects.filter(**{f'{clave}__in': list(pendiente)}).values_list(*busqueda_clientes.CAMPOS)
+            )
+    resultado['actualizados'] += existentes
+    resultado['creados'] += len(instancias) - existentes
@@ -0,0 +1,244 @@
+import atexit
+import bisect
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .models import MetricaVista
+
+
+# Instrumentación de peticiones: latencia por vista, número de consultas SQL,
+# tiempo total en SQL y las sentencias más lentas (normalizadas).
+# Cada petición muestreada se mide con un execute_wrapper en cada conexión y
+# se guarda en un buffer circular en memoria (deque con maxlen), así el consumo
+# de memoria está acotado; la página 'Rendimiento' del admin lo resume. Si se
+# configura INTERVALO_VOLCADO, el middleware agrega lo pendiente por vista y lo
+# vuelca a la tabla metricas_vistas cada ese número de segundos.
+#
+# Configuración en settings.BARBERIA_INSTRUMENTACION:
+#   ACTIVA: mide peticiones.
+#   MUESTREO: fracción de peticiones medidas (0.0 a 1.0).
+#   CAPACIDAD: peticiones que conserva el buffer circular.
+#   SENTENCIAS: sentencias normalizadas distintas que se conservan (las más lentas).
+#   EXPLAIN: permite a los superusuarios ver el plan de las SELECT lentas desde la página del admin.
+#   INTERVALO_VOLCADO: segundos entre volcados a metricas_vistas; None no vuelca.
+# Los datos del buffer son por proceso: con varios workers cada uno tiene el suyo.
+
+CONFIGURACION_POR_DEFECTO = {
+    'ACTIVA': True,
+    'MUESTREO': 1.0,
+    'CAPACIDAD': 2000,
+    'SENTENCIAS': 200,
+    'EXPLAIN': False,
+    'INTERVALO_VOLCADO': None,
+}
+
+# Límites superiores (ms) de los tramos del histograma; el último tramo es "más de 5000"
+LIMITES_HISTOGRAMA = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_LISTAS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_FILAS = re.compile(r'\(\?, \.\.\.\)(?:\s*,\s*\(\?, \.\.\.\))+')
+_CADENAS = re.compile(r"'(?:[^']|'')*'")
+_NUMEROS = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+def configuracion():
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'BARBERIA_INSTRUMENTACION', {})}
+
+
+def normalizar(sql):
+    # Misma forma para la misma sentencia con otros valores: literales e IN (...) colapsados
+    sql = _NUMEROS.sub('?', _CADENAS.sub('?', sql)).replace('%s', '?')
+    return _FILAS.sub('(?, ...), ...', _LISTAS.sub('(?, ...)', sql))
+
+
+def tramo_histograma(duracion_ms):
+    return bisect.bisect_left(LIMITES_HISTOGRAMA, duracion_ms)
+
+
+class Medicion:
+    # execute_wrapper de una petición: cuenta consultas y tiempo y agrupa por SQL literal
+    def __init__(self):
+        self.consultas = 0
+        self.sql_ms = 0.0
+        self.sentencias = {}  # sql: [veces, total_ms, max_ms, params del más lento, alias]
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = (time.perf_counter() - inicio) * 1000
+            self.consultas += 1
+            self.sql_ms += duracion
+            datos = self.sentencias.get(sql)
+            if datos is None:
+                self.sentencias[sql] = [1, duracion, duracion, params, context['connection'].alias]
+            else:
+                datos[0] += 1
+                datos[1] += duracion
+                if duracion > datos[2]:
+                    datos[2] = duracion
+                    datos[3] = params
+
+    def medir(self):
+        # Instala el wrapper en todas las conexiones del hilo actual
+        pila = ExitStack()
+        for conexion in connections.all(initialized_only=False):
+            pila.enter_context(conexion.execute_wrapper(self))
+        return pila
+
+
+class RegistroRendimiento:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ultimo_volcado = time.monotonic()
+        self.reiniciar()
+
+    def reiniciar(self):
+        capacidad = configuracion()['CAPACIDAD']
+        with self._lock:
+            # (fecha, vista, método, estado, duración_ms, consultas, sql_ms)
+            self.peticiones = deque(maxlen=capacidad)
+            self._pendientes = deque(maxlen=capacidad)
+            self.sentencias = {}
+            self.desde = timezone.now()
+
+    def agregar(self, vista, metodo, estado, duracion_ms, medicion):
+        peticion = (timezone.now(), vista, metodo, estado, duracion_ms, medicion.consultas, medicion.sql_ms)
+        config = configuracion()
+        # Se normaliza fuera del lock: es lo más costoso y no toca estado compartido
+        sentencias = [(normalizar(sql), sql, *datos) for sql, datos in medicion.sentencias.items()]
+        with self._lock:
+            self.peticiones.append(peticion)
+            if config['INTERVALO_VOLCADO']:
+                self._pendientes.append(peticion)
+            for clave, sql, veces, total_ms, max_ms, params, alias in sentencias:
+                self._agregar_sentencia(clave, sql, veces, total_ms, max_ms, params, alias, vista, config['SENTENCIAS'])
+
+    def _agregar_sentencia(self, clave, sql, veces, total_ms, max_ms, params, alias, vista, limite):
+        datos = self.sentencias.get(clave)
+        if datos is None:
+            if len(self.sentencias) >= limite:
+                # Lleno: la nueva sentencia solo entra si es más lenta que la más rápida guardada
+                mas_rapida = min(self.sentencias, key=lambda otra: self.sentencias[otra]['max_ms'])
+                if self.sentencias[mas_rapida]['max_ms'] >= max_ms:
+                    return
+                del self.sentencias[mas_rapida]
+            self.sentencias[clave] = {
+                'veces': veces, 'total_ms': total_ms, 'max_ms': max_ms,
+                'sql': sql, 'params': params, 'alias': alias, 'vista': vista, 'plan': None,
+            }
+            return
+        datos['veces'] += veces
+        datos['total_ms'] += total_ms
+        if max_ms > datos['max_ms']:
+            datos.update(max_ms=max_ms, sql=sql, params=params, alias=alias, vista=vista, plan=None)
+
+    def volcado_vencido(self):
+        intervalo = configuracion()['INTERVALO_VOLCADO']
+        return bool(intervalo and self._pendientes and time.monotonic() - self._ultimo_volcado >= intervalo)
+
+    def volcar(self):
+        # Una fila de metricas_vistas por vista con lo medido desde el volcado anterior
+        with self._lock:
+            lote = list(self._pendientes)
+            self._pendientes.clear()
+            self._ultimo_volcado = time.monotonic()
+        if not lote:
+            return 0
+        metricas = {}
+        for fecha, vista, _, estado, duracion_ms, consultas, sql_ms in lote:
+            metrica = metricas.get(vista)
+            if metrica is None:
+                metrica = metricas[vista] = MetricaVista(
+                    desde=fecha, hasta=fecha, vista=vista, peticiones=0, errores=0,
+                    duracion_total_ms=0, duracion_max_ms=0, consultas=0, sql_ms=0,
+                    histograma=[0] * (len(LIMITES_HISTOGRAMA) + 1),
+                )
+            metrica.hasta = fecha
+            metrica.peticiones += 1
+            metrica.errores += estado >= 500
+            metrica.duracion_total_ms += duracion_ms
+            metrica.duracion_max_ms = max(metrica.duracion_max_ms, duracion_ms)
+            metrica.consultas += consultas
+            metrica.sql_ms += sql_ms
+            metrica.histograma[tramo_histograma(duracion_ms)] += 1
+        MetricaVista.objects.bulk_create(metricas.values())
+        return len(metricas)
+
+
+registro = RegistroRendimiento()
+atexit.register(registro.volcar)
+
+
+def muestrear():
+    config = configuracion()
+    return config['ACTIVA'] and (config['MUESTREO'] >= 1 or random.random() < config['MUESTREO'])
+
+
+def _percentil(ordenados, fraccion):
+    return ordenados[min(int(len(ordenados) * fraccion), len(ordenados) - 1)]
+
+
+def resumen_vistas():
+    # Por vista: peticiones, percentiles de latencia, histograma y medias de SQL
+    with registro._lock:
+        peticiones = list(registro.peticiones)
+    por_vista = {}
+    for _, vista, _, estado, duracion_ms, consultas, sql_ms in peticiones:
+        por_vista.setdefault(vista, []).append((duracion_ms, consultas, sql_ms, estado))
+    resumen = []
+    for vista, filas in por_vista.items():
+        duraciones = sorted(fila[0] for fila in filas)
+        histograma = [0] * (len(LIMITES_HISTOGRAMA) + 1)
+        for duracion in duraciones:
+            histograma[tramo_histograma(duracion)] += 1
+        total_ms = sum(duraciones)
+        sql_ms = sum(fila[2] for fila in filas)
+        resumen.append({
+            'vista': vista,
+            'peticiones': len(filas),
+            'errores': sum(1 for fila in filas if fila[3] >= 500),
+            'total_ms': round(total_ms, 1),
+            'p50_ms': round(_percentil(duraciones, 0.5), 1),
+            'p95_ms': round(_percentil(duraciones, 0.95), 1),
+            'max_ms': round(duraciones[-1], 1),
+            'consultas_media': round(sum(fila[1] for fila in filas) / len(filas), 1),
+            'consultas_max': max(fila[1] for fila in filas),
+            'sql_ms_media': round(sql_ms / len(filas), 1),
+            'sql_pct': round(sql_ms / total_ms * 100, 1) if total_ms else 0,
+            'histograma': histograma,
+        })
+    return sorted(resumen, key=lambda fila: fila['total_ms'], reverse=True)
+
+
+def sentencias_lentas(cantidad=20):
+    with registro._lock:
+        sentencias = [
+            {'id': hashlib.sha1(clave.encode()).hexdigest()[:12], 'normalizada': clave, **datos}
+            for clave, datos in registro.sentencias.items()
+        ]
+    sentencias.sort(key=lambda datos: datos['max_ms'], reverse=True)
+    return sentencias[:cantidad]
+
+
+def explicar(clave):
+    # Plan de ejecución de la SELECT guardada como más lenta para 'clave' (se calcula una vez)
+    datos = registro.sentencias.get(clave)
+    if datos is None or not datos['sql'].lstrip().upper().startswith('SELECT'):
+        return None
+    if datos['plan'] is None:
+        conexion = connections[datos['alias']]
+        with conexion.cursor() as cursor:
+            cursor.execute(f"{conexion.ops.explain_query_prefix()} {datos['sql']}", datos['params'])
+            datos['plan'] = '\n'.join(' | '.join(str(valor) for valor in fila) for fila in cursor.fetchall())
+    return datos['plan']
@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, When
+from django.db.models.functions import Abs
+
+from . import dashboard, fechas
+from .models import MovimientoInventario, Producto, SnapshotStock, TipoMovimientoInventario
+
+
+# Libro de stock en la aplicación.
+# Cada MovimientoInventario insertado suma o resta su cantidad a
+# productos.stock_actual con un UPDATE atómico (F()), igual en cualquier motor.
+# El INSERT del movimiento y este UPDATE van en una transacción (MovimientoInventario.save).
+# SnapshotStock guarda el stock de cada producto al cierre de cada día, así el
+# stock a una fecha o la conciliación solo recorren los movimientos posteriores
+# al último snapshot en lugar de todo el historial.
+
+ENTRADAS = (TipoMovimientoInventario.ENTRADA, TipoMovimientoInventario.AJUSTE_POSITIVO)
+
+
+def delta(tipo_movimiento, cantidad):
+    cantidad = abs(cantidad)
+    return cantidad if tipo_movimiento in ENTRADAS else -cantidad
+
+
+def delta_expr():
+    # Expresión SQL con el efecto firmado de cada movimiento sobre el stock
+    return Case(
+        When(tipo_movimiento__in=ENTRADAS, then=Abs('cantidad')),
+        default=-Abs('cantidad'),
+        output_field=IntegerField(),
+    )
+
+
+def aplicar_movimiento(movimiento):
+    Producto.objects.filter(pk=movimiento.producto_id).update(
+        stock_actual=F('stock_actual') + delta(movimiento.tipo_movimiento, movimiento.cantidad)
+    )
+    dashboard.invalidar_modelo(Producto)
+
+
+def _sumas(movimientos):
+    return dict(
+        movimientos.values('producto_id').annotate(total=Sum(delta_expr())).order_by().values_list('producto_id', 'total')
+    )
+
+
+def _fin_del_dia(fecha):
+    return fechas.rango_utc(fecha, fecha)[1]
+
+
+def stock_en_fecha(producto_id, fecha):
+    # Stock al cierre del día local 'fecha'.
+    fin = _fin_del_dia(fecha)
+    snapshot = SnapshotStock.objects.filter(producto_id=producto_id, fecha__lte=fecha).order_by('-fecha').first()
+    if snapshot:
+        # Se suman los movimientos entre el cierre del snapshot y el cierre de 'fecha'
+        suma = MovimientoInventario.objects.filter(
+            producto_id=producto_id,
+            fecha_hora__gte=_fin_del_dia(snapshot.fecha),
+            fecha_hora__lt=fin,
+        ).aggregate(total=Sum(delta_expr()))['total'] or 0
+        return snapshot.stock + suma
+    # Sin snapshot: se deshacen desde el stock actual los movimientos posteriores
+    actual = Producto.objects.values_list('stock_actual', flat=True).get(pk=producto_id)
+    posteriores = MovimientoInventario.objects.filter(
+        producto_id=producto_id, fecha_hora__gte=fin,
+    ).aggregate(total=Sum(delta_expr()))['total'] or 0
+    return actual - posteriores
+
+
+def tomar_snapshot(fecha=None):
+    # Snapshot de todos los productos al cierre de 'fecha' (por defecto, ayer).
+    fecha = fecha or fechas.hoy() - timedelta(days=1)
+    fin = fechas.rango_utc(fecha, fecha)[1]
+    anteriores = dict(SnapshotStock.objects.filter(fecha=fecha - timedelta(days=1)).values_list('producto_id', 'stock'))
+    del_dia = _sumas(MovimientoInventario.objects.del_dia(fecha))
+    actuales = dict(Producto.objects.values_list('producto_id', 'stock_actual'))
+    posteriores = {}
+    if set(actuales) - set(anteriores):
+        posteriores = _sumas(MovimientoInventario.objects.filter(fecha_hora__gte=fin))
+
+    snapshots = []
+    for producto_id, stock_actual in actuales.items():
+        if producto_id in anteriores:
+            stock = anteriores[producto_id] + del_dia.get(producto_id, 0)
+        else:
+            stock = stock_actual - posteriores.get(producto_id, 0)
+        snapshots.append(SnapshotStock(producto_id=producto_id, fecha=fecha, stock=stock))
+
+    with transaction.atomic():
+        SnapshotStock.objects.filter(fecha=fecha).delete()
+        SnapshotStock.objects.bulk_create(snapshots, batch_size=1000)
+    return len(snapshots)
+
+
+def conciliar():
+    # Compara stock_actual con (último snapshot + movimientos posteriores).
+    # Devuelve [(producto_id, esperado, stock_actual)] de los productos que no cuadran.
+    ultima = SnapshotStock.objects.order_by('-fecha').values_list('fecha', flat=True).first()
+    if ultima is None:
+        return []
+    base = dict(SnapshotStock.objects.filter(fecha=ultima).values_list('producto_id', 'stock'))
+    posteriores = _sumas(MovimientoInventario.objects.filter(fecha_hora__gte=_fin_del_dia(ultima)))
+    diferencias = []
+    for producto_id, stock_actual in Producto.objects.filter(pk__in=base).values_list('producto_id', 'stock_actual'):
+        esperado = base[producto_id] + posteriores.get(producto_id, 0)
+        if esperado != stock_actual:
+            diferencias.append((producto_id, esperado, stock_actual))
+    return diferencias
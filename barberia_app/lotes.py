@@ -0,0 +1,37 @@
+from django.db import connections, router, transaction
+
+
+# Inserción o actualización por lotes según una columna única.
+# PostgreSQL y SQLite resuelven el conflicto en la misma sentencia
+# (bulk_create con update_conflicts y unique_fields). MySQL no admite indicar
+# las columnas del conflicto (ON DUPLICATE KEY salta con cualquier clave única):
+# ahí se leen las claves ya guardadas y el lote se reparte entre un bulk_update
+# de las existentes y un bulk_create de las nuevas, en una sola transacción.
+
+def insertar_o_actualizar(modelo, instancias, clave, campos):
+    # clave: nombre del campo único; campos: columnas que se actualizan si ya existe
+    using = router.db_for_write(modelo)
+    if connections[using].features.supports_update_conflicts_with_target:
+        modelo.objects.using(using).bulk_create(
+            instancias, update_conflicts=True, unique_fields=[clave], update_fields=campos,
+        )
+        return
+    columna = modelo._meta.get_field(clave).attname
+    with transaction.atomic(using=using):
+        pks = dict(
+            modelo.objects.using(using)
+            .filter(**{f'{columna}__in': [getattr(instancia, columna) for instancia in instancias]})
+            .values_list(columna, 'pk')
+        )
+        existentes, nuevas = [], []
+        for instancia in instancias:
+            pk = pks.get(getattr(instancia, columna))
+            if pk is None:
+                nuevas.append(instancia)
+            else:
+                instancia.pk = pk
+                existentes.append(instancia)
+        if existentes:
+            modelo.objects.using(using).bulk_update(existentes, campos)
+        if nuevas:
+            modelo.objects.using(using).bulk_create(nuevas)
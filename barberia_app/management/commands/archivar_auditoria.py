@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from barberia_app import archivo_auditoria
+
+
+class Command(BaseCommand):
+    help = ('Mueve a archivos JSONL comprimidos los meses de auditoría anteriores al horizonte '
+            'de retención y los borra de la tabla.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--meses', type=int, help='Meses a conservar en la tabla (por defecto RETENCION_MESES)')
+        parser.add_argument('--directorio', help='Directorio de archivo (por defecto DIRECTORIO_ARCHIVO)')
+
+    def handle(self, *args, **options):
+        limite = archivo_auditoria.limite_retencion(options['meses'])
+        self.stdout.write(f'Archivando registros anteriores al {limite}...')
+        archivadas = archivo_auditoria.archivar(options['meses'], options['directorio'])
+        for entrada in archivadas:
+            self.stdout.write(
+                f"  {entrada['archivo']}: {entrada['filas']} filas "
+                f"(log_id {entrada['log_id_min']}-{entrada['log_id_max']})"
+            )
+        self.stdout.write(self.style.SUCCESS(f'Archivos generados: {len(archivadas)}'))
@@ -0,0 +1,68 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from barberia_app.benchmarks import BENCHMARKS
+
+
+def _mediciones(resultado, ruta=()):
+    # Recorre el resultado y devuelve {ruta: medición} de cada resumen con p50_ms
+    if isinstance(resultado, dict):
+        if 'p50_ms' in resultado:
+            return {'.'.join(ruta): resultado}
+        encontradas = {}
+        for clave, valor in resultado.items():
+            encontradas.update(_mediciones(valor, ruta + (str(clave),)))
+        return encontradas
+    return {}
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los benchmarks de barberia_app y muestra los resultados en JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('nombres', nargs='*', help=f"Benchmarks a ejecutar ({', '.join(BENCHMARKS)}); por defecto todos")
+        parser.add_argument('--salida', help='Guarda también los resultados en este archivo JSON')
+        parser.add_argument(
+            '--comparar', metavar='ARCHIVO',
+            help='Compara p50, p95 y consultas con un JSON guardado antes con --salida',
+        )
+
+    def handle(self, *args, **options):
+        nombres = options['nombres'] or list(BENCHMARKS)
+        desconocidos = [nombre for nombre in nombres if nombre not in BENCHMARKS]
+        if desconocidos:
+            raise CommandError(f"Benchmarks desconocidos: {', '.join(desconocidos)}")
+        anteriores = None
+        if options['comparar']:
+            try:
+                with open(options['comparar'], encoding='utf-8') as archivo:
+                    anteriores = _mediciones(json.load(archivo))
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'No se pudo leer {options["comparar"]}: {exc}')
+
+        resultados = {nombre: BENCHMARKS[nombre]() for nombre in nombres}
+        texto = json.dumps(resultados, indent=2, default=str)
+        self.stdout.write(texto)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(texto + '\n')
+        if anteriores is not None:
+            self._comparar(anteriores, _mediciones(resultados))
+
+    def _comparar(self, anteriores, actuales):
+        self.stdout.write('\nmedición: p50 antes -> ahora (cambio) | p95 | consultas')
+        for ruta, actual in actuales.items():
+            anterior = anteriores.get(ruta)
+            if anterior is None:
+                self.stdout.write(f'{ruta}: nueva')
+                continue
+            cambio = (actual['p50_ms'] - anterior['p50_ms']) / anterior['p50_ms'] * 100 if anterior['p50_ms'] else 0
+            linea = (
+                f"{ruta}: {anterior['p50_ms']} -> {actual['p50_ms']} ms ({cambio:+.1f}%)"
+                f" | {anterior['p95_ms']} -> {actual['p95_ms']} ms"
+            )
+            if 'consultas' in actual:
+                linea += f" | {anterior.get('consultas', '?')} -> {actual['consultas']}"
+            estilo = self.style.ERROR if cambio > 10 else self.style.SUCCESS if cambio < -10 else str
+            self.stdout.write(estilo(linea))
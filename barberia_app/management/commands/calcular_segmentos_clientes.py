@@ -0,0 +1,27 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from barberia_app import segmentos_clientes, visitas_clientes
+
+
+class Command(BaseCommand):
+    help = 'Calcula las puntuaciones RFM y el segmento de todos los clientes (tabla segmentos_clientes).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=segmentos_clientes.LOTE, help='Clientes por tramo')
+        parser.add_argument(
+            '--reconstruir-visitas', action='store_true',
+            help='Recalcula antes ultima_visita, visitas y gasto_total desde citas y ventas',
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que cero')
+        inicio = time.perf_counter()
+        if options['reconstruir_visitas']:
+            visitas_clientes.reconstruir()
+        resultado = segmentos_clientes.calcular(lote=options['lote'])
+        resultado['segundos'] = round(time.perf_counter() - inicio, 1)
+        self.stdout.write(json.dumps(resultado, indent=2, default=str))
@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from barberia_app import comisiones, fechas
+
+
+class Command(BaseCommand):
+    help = 'Cierra un mes de comisiones: guarda los importes de cada empleado en periodos_comision.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mes', help='Mes a cerrar (YYYY-MM); por defecto el mes anterior')
+
+    def handle(self, *args, **options):
+        if options['mes']:
+            try:
+                mes = datetime.strptime(options['mes'], '%Y-%m').date()
+            except ValueError as exc:
+                raise CommandError(f'Mes inválido: {exc}')
+        else:
+            mes = comisiones.mes_de(comisiones.mes_de(fechas.hoy()) - timedelta(days=1))
+        try:
+            empleados = comisiones.cerrar(mes)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f'Mes {mes:%Y-%m} cerrado: {empleados} empleados.'))
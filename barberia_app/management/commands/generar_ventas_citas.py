@@ -0,0 +1,40 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from barberia_app import fechas, generacion_ventas
+from barberia_app.models import Cita, MetodoPagoVenta
+
+
+class Command(BaseCommand):
+    help = 'Genera en lotes las ventas de las citas completadas que aún no tienen venta.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial de las citas (YYYY-MM-DD), inclusive')
+        parser.add_argument('--hasta', help='Fecha final de las citas (YYYY-MM-DD), inclusive')
+        parser.add_argument('--metodo-pago', default=MetodoPagoVenta.EFECTIVO, choices=MetodoPagoVenta.values)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--fecha-cita', action='store_true',
+            help='Registrar cada venta con la fecha y hora de su cita en lugar de la actual',
+        )
+
+    def handle(self, *args, **options):
+        citas = Cita.objects.all()
+        try:
+            desde = date.fromisoformat(options['desde']) if options['desde'] else None
+            hasta = date.fromisoformat(options['hasta']) if options['hasta'] else None
+        except ValueError as exc:
+            raise CommandError(f'Fecha inválida: {exc}')
+        if desde:
+            citas = citas.filter(fecha_hora__gte=fechas.inicio_del_dia(desde))
+        if hasta:
+            citas = citas.filter(fecha_hora__lt=fechas.rango_utc(hasta, hasta)[1])
+
+        creadas = generacion_ventas.generar_ventas_en_lote(
+            citas,
+            metodo_pago=options['metodo_pago'],
+            batch_size=options['batch_size'],
+            fecha_de_la_cita=options['fecha_cita'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Ventas generadas: {creadas}'))
@@ -0,0 +1,51 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from barberia_app import importacion
+
+
+class Command(BaseCommand):
+    help = 'Importa (crea o actualiza) clientes, productos o servicios desde un archivo CSV o XLSX.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('catalogo', choices=list(importacion.CATALOGOS))
+        parser.add_argument('archivo', help='Archivo CSV (UTF-8) o XLSX; la primera fila lleva los nombres de campo')
+        parser.add_argument('--rechazos', help='CSV donde se escriben las filas rechazadas (por defecto <archivo>.rechazos.csv)')
+        parser.add_argument('--lote', type=int, default=importacion.LOTE, help='Filas por lote de escritura')
+
+    def handle(self, *args, **options):
+        ruta_rechazos = options['rechazos'] or f"{options['archivo']}.rechazos.csv"
+        formato = importacion.formato_de(options['archivo'])
+        salida = {}
+
+        def rechazar(numero, fila, motivo):
+            # El archivo de rechazos se crea solo si hay alguna fila rechazada
+            if not salida:
+                salida['archivo'] = open(ruta_rechazos, 'w', newline='', encoding='utf-8')
+                salida['escritor'] = csv.writer(salida['archivo'])
+                salida['escritor'].writerow(['fila', 'motivo', 'datos'])
+            salida['escritor'].writerow([numero, motivo, *fila])
+
+        inicio = time.perf_counter()
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importacion.importar(
+                    options['catalogo'],
+                    importacion.LECTORES[formato](archivo),
+                    rechazos=rechazar,
+                    lote=options['lote'],
+                )
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        finally:
+            if salida:
+                salida['archivo'].close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['creados']} creados, {resultado['actualizados']} actualizados, "
+            f"{resultado['rechazados']} rechazados en {time.perf_counter() - inicio:.1f} s."
+        ))
+        if resultado['rechazados']:
+            self.stdout.write(self.style.WARNING(f'Filas rechazadas en {ruta_rechazos}'))
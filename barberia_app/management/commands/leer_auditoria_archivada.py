@@ -0,0 +1,35 @@
+import json
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from barberia_app import archivo_auditoria
+
+
+class Command(BaseCommand):
+    help = 'Muestra en JSONL los registros de auditoría archivados de un rango de fechas, sin restaurarlos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('desde', help='Fecha inicial (YYYY-MM-DD), inclusive')
+        parser.add_argument('hasta', help='Fecha final (YYYY-MM-DD), inclusive')
+        parser.add_argument('--directorio', help='Directorio de archivo (por defecto DIRECTORIO_ARCHIVO)')
+        parser.add_argument('--tabla', help='Filtrar por tabla_afectada')
+        parser.add_argument('--registro', help='Filtrar por registro_id')
+        parser.add_argument('--operacion', help='Filtrar por operación (INSERT, UPDATE, DELETE)')
+
+    def handle(self, *args, **options):
+        try:
+            desde = date.fromisoformat(options['desde'])
+            hasta = date.fromisoformat(options['hasta'])
+        except ValueError as exc:
+            raise CommandError(f'Fecha inválida: {exc}')
+
+        filas = archivo_auditoria.leer(
+            desde, hasta,
+            directorio=options['directorio'],
+            tabla=options['tabla'],
+            registro_id=options['registro'],
+            operacion=options['operacion'],
+        )
+        for fila in filas:
+            self.stdout.write(json.dumps(fila, ensure_ascii=False))
@@ -0,0 +1,21 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from barberia_app import reposicion
+
+
+class Command(BaseCommand):
+    help = 'Pronostica el consumo de cada producto activo y guarda los días hasta agotar y la cantidad a pedir (tabla pronosticos_reposicion).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=reposicion.LOTE, help='Pronósticos por upsert')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que cero')
+        inicio = time.perf_counter()
+        resultado = reposicion.calcular(lote=options['lote'])
+        resultado['segundos'] = round(time.perf_counter() - inicio, 1)
+        self.stdout.write(json.dumps(resultado, indent=2))
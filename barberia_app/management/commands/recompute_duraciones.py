@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from barberia_app import duracion_citas
+from barberia_app.models import Cita
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula citas.duracion_total a partir de sus líneas (detalle_citas) en tramos de ids; '
+        'solo escribe las citas cuyo valor no coincide.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='Citas (rango de ids) por tramo')
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        if lote < 1:
+            raise CommandError('--lote debe ser mayor que cero')
+        limites = Cita.objects.aggregate(primera=Min('pk'), ultima=Max('pk'))
+        if limites['primera'] is None:
+            self.stdout.write('No hay citas registradas.')
+            return
+
+        inicio = time.perf_counter()
+        corregidas = 0
+        for desde in range(limites['primera'], limites['ultima'] + 1, lote):
+            corregidas += duracion_citas.corregir_tramo(desde, desde + lote)
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Hasta la cita {desde + lote - 1}: {corregidas} corregidas.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Duraciones revisadas: {corregidas} citas corregidas en {time.perf_counter() - inicio:.1f} s.'
+        ))
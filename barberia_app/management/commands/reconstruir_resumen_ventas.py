@@ -0,0 +1,35 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from barberia_app import fechas, resumen_ventas
+from barberia_app.models import Venta
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye la tabla resumen_ventas_diario para un rango de fechas (por defecto, todo el historial).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial (YYYY-MM-DD), inclusive')
+        parser.add_argument('--hasta', help='Fecha final (YYYY-MM-DD), inclusive')
+
+    def handle(self, *args, **options):
+        try:
+            desde = date.fromisoformat(options['desde']) if options['desde'] else None
+            hasta = date.fromisoformat(options['hasta']) if options['hasta'] else None
+        except ValueError as exc:
+            raise CommandError(f'Fecha inválida: {exc}')
+
+        if desde is None or hasta is None:
+            limites = Venta.objects.aggregate(primera=Min('fecha_hora'), ultima=Max('fecha_hora'))
+            if limites['primera'] is None:
+                self.stdout.write('No hay ventas registradas.')
+                return
+            desde = desde or fechas.fecha_local(limites['primera'])
+            hasta = hasta or fechas.fecha_local(limites['ultima'])
+        if desde > hasta:
+            raise CommandError('--desde debe ser anterior o igual a --hasta')
+
+        filas = resumen_ventas.reconstruir(desde, hasta)
+        self.stdout.write(self.style.SUCCESS(f'Resumen reconstruido del {desde} al {hasta}: {filas} filas.'))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from barberia_app import visitas_clientes
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula ultima_visita, visitas y gasto_total de los clientes a partir de citas y ventas, '
+        'por tramos de cliente_id.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=visitas_clientes.LOTE * 5, help='Clientes (rango de ids) por tramo')
+        parser.add_argument('--desde', type=int, help='Primer cliente_id (para reanudar)')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('--lote debe ser mayor que cero')
+        inicio = time.perf_counter()
+        total = visitas_clientes.reconstruir(desde_pk=options['desde'], lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Clientes recalculados: {total} en {time.perf_counter() - inicio:.1f} s.'
+        ))
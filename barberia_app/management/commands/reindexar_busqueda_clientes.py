@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from barberia_app import busqueda_clientes
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de clientes (términos y trigramas).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=busqueda_clientes.LOTE, help='Clientes por lote')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        total = busqueda_clientes.reindexar(lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice reconstruido: {total} clientes en {time.perf_counter() - inicio:.1f} s.'
+        ))
@@ -0,0 +1,51 @@
+import json
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from barberia_app import auditoria, datos_sinteticos
+from barberia_app.models import Cita, Venta
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera datos sintéticos deterministas (clientes, empleados con horarios, citas, ventas y '
+        'movimientos de inventario) en una base sin citas ni ventas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=5000)
+        parser.add_argument('--empleados', type=int, default=8)
+        parser.add_argument('--anios', type=int, default=2, help='Años de historial hasta la fecha final')
+        parser.add_argument('--citas-por-dia', type=int, default=40, help='Citas de un día laborable promedio')
+        parser.add_argument('--ventas-mostrador', type=int, default=4, help='Ventas sin cita por día')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument(
+            '--hasta', help='Fecha final del historial (YYYY-MM-DD); por defecto hoy. Fíjela para repetir exactamente los mismos datos',
+        )
+        parser.add_argument('--lote', type=int, default=datos_sinteticos.LOTE)
+
+    def handle(self, *args, **options):
+        try:
+            hasta = date.fromisoformat(options['hasta']) if options['hasta'] else None
+        except ValueError as exc:
+            raise CommandError(f'Fecha inválida: {exc}')
+        if Cita.objects.exists() or Venta.objects.exists():
+            raise CommandError('La base ya tiene citas o ventas; seed_barberia se ejecuta sobre una base vacía.')
+
+        inicio = time.perf_counter()
+        # Los datos generados no son operaciones de usuarios: no se auditan
+        with auditoria.desactivada():
+            resultado = datos_sinteticos.generar(
+                clientes=options['clientes'],
+                empleados=options['empleados'],
+                anios=options['anios'],
+                citas_por_dia=options['citas_por_dia'],
+                ventas_mostrador_por_dia=options['ventas_mostrador'],
+                semilla=options['semilla'],
+                hasta=hasta,
+                lote=options['lote'],
+            )
+        resultado['segundos'] = round(time.perf_counter() - inicio, 1)
+        self.stdout.write(json.dumps(resultado, indent=2))
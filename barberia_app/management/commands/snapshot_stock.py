@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from barberia_app import inventario
+
+
+class Command(BaseCommand):
+    help = 'Guarda el stock de cada producto al cierre de un día (por defecto, ayer) y opcionalmente concilia stock_actual.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Día del snapshot (YYYY-MM-DD); por defecto, ayer')
+        parser.add_argument('--conciliar', action='store_true', help='Compara stock_actual con el último snapshot y los movimientos posteriores')
+
+    def handle(self, *args, **options):
+        try:
+            fecha = date.fromisoformat(options['fecha']) if options['fecha'] else None
+        except ValueError as exc:
+            raise CommandError(f'Fecha inválida: {exc}')
+
+        productos = inventario.tomar_snapshot(fecha)
+        self.stdout.write(self.style.SUCCESS(f'Snapshot de stock guardado: {productos} productos.'))
+
+        if options['conciliar']:
+            diferencias = inventario.conciliar()
+            if not diferencias:
+                self.stdout.write(self.style.SUCCESS('El stock cuadra con los movimientos registrados.'))
+            for producto_id, esperado, stock_actual in diferencias:
+                self.stdout.write(self.style.WARNING(
+                    f'Producto {producto_id}: stock_actual={stock_actual}, esperado={esperado}'
+                ))
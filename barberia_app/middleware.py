@@ -0,0 +1,132 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from . import auditoria, instrumentacion, replicas
+
+
+class MiddlewareSincronoAsincrono:
+    # Base de los middlewares del proyecto: con ASGI y una cadena asíncrona se
+    # usa __acall__, así las vistas async no pasan por un hilo solo por ellos.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.llamar(request)
+
+
+class AuditoriaMiddleware(MiddlewareSincronoAsincrono):
+    # Expone el usuario y la IP de la petición a los registros de auditoría y
+    # vuelca el buffer al terminar si venció el intervalo de escritura.
+
+    def llamar(self, request):
+        usuario = getattr(request, 'user', None)
+        usuario_app = usuario.get_username() if usuario is not None and usuario.is_authenticated else None
+        token = auditoria.fijar_contexto(usuario_app, self.ip_origen(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            auditoria.restablecer_contexto(token)
+        if auditoria.buffer.intervalo_vencido():
+            auditoria.buffer.vaciar()
+        return response
+
+    async def __acall__(self, request):
+        usuario = await request.auser() if hasattr(request, 'auser') else None
+        usuario_app = usuario.get_username() if usuario is not None and usuario.is_authenticated else None
+        token = auditoria.fijar_contexto(usuario_app, self.ip_origen(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            auditoria.restablecer_contexto(token)
+        if auditoria.buffer.intervalo_vencido():
+            await sync_to_async(auditoria.buffer.vaciar)()
+        return response
+
+    @staticmethod
+    def ip_origen(request):
+        reenviada = request.META.get('HTTP_X_FORWARDED_FOR')
+        if reenviada:
+            return reenviada.split(',')[0].strip()[:45]
+        return request.META.get('REMOTE_ADDR')
+
+
+class InstrumentacionMiddleware(MiddlewareSincronoAsincrono):
+    # Mide latencia, consultas y tiempo SQL de una fracción de las peticiones
+    # (ver instrumentacion.py). Va primero en MIDDLEWARE para medir toda la pila.
+    # En respuestas en streaming se mide hasta que la vista devuelve la respuesta.
+
+    def llamar(self, request):
+        if not instrumentacion.muestrear():
+            return self.get_response(request)
+        medicion = instrumentacion.Medicion()
+        inicio = time.perf_counter()
+        with medicion.medir():
+            response = self.get_response(request)
+        if self.registrar(request, response, inicio, medicion):
+            instrumentacion.registro.volcar()
+        return response
+
+    async def __acall__(self, request):
+        if not instrumentacion.muestrear():
+            return await self.get_response(request)
+        medicion = instrumentacion.Medicion()
+        inicio = time.perf_counter()
+        # El ORM async ejecuta las consultas en el hilo de la petición (sync_to_async
+        # con thread_sensitive): los wrappers se instalan y se quitan en ese hilo
+        pila = await sync_to_async(medicion.medir)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(pila.close)()
+        if self.registrar(request, response, inicio, medicion):
+            await sync_to_async(instrumentacion.registro.volcar)()
+        return response
+
+    @staticmethod
+    def registrar(request, response, inicio, medicion):
+        # Agrega la medición; devuelve True si toca volcar el registro
+        duracion_ms = (time.perf_counter() - inicio) * 1000
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = (coincidencia.view_name or coincidencia._func_path) if coincidencia else 'sin_resolver'
+        instrumentacion.registro.agregar(vista, request.method, response.status_code, duracion_ms, medicion)
+        return instrumentacion.registro.volcado_vencido()
+
+
+class ReplicaMiddleware(MiddlewareSincronoAsincrono):
+    # Lectura de lo propio con réplica (ver replicas.py): una sesión que acaba de
+    # escribir lee del primario durante unos segundos. Va después de SessionMiddleware.
+    METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+    def llamar(self, request):
+        sesion = getattr(request, 'session', None)
+        if sesion is None or replicas.alias() is None:
+            return self.get_response(request)
+        token = replicas.fijar_pegado(time.time() < sesion.get(replicas.CLAVE_SESION, 0))
+        try:
+            response = self.get_response(request)
+        finally:
+            replicas.restablecer_pegado(token)
+        if request.method not in self.METODOS_SEGUROS:
+            sesion[replicas.CLAVE_SESION] = time.time() + replicas.configuracion()['PEGAJOSIDAD']
+        return response
+
+    async def __acall__(self, request):
+        sesion = getattr(request, 'session', None)
+        if sesion is None or replicas.alias() is None:
+            return await self.get_response(request)
+        token = replicas.fijar_pegado(time.time() < await sesion.aget(replicas.CLAVE_SESION, 0))
+        try:
+            response = await self.get_response(request)
+        finally:
+            replicas.restablecer_pegado(token)
+        if request.method not in self.METODOS_SEGUROS:
+            await sesion.aset(replicas.CLAVE_SESION, time.time() + replicas.configuracion()['PEGAJOSIDAD'])
+        return response
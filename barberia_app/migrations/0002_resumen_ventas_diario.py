@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:21
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barberia_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentaDiario',
+            fields=[
+                ('resumen_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('metodo_pago', models.CharField(choices=[('efectivo', 'Efectivo'), ('tarjeta_credito', 'Tarjeta de Crédito'), ('tarjeta_debito', 'Tarjeta de Débito'), ('transferencia', 'Transferencia'), ('otro', 'Otro')], max_length=20)),
+                ('estado', models.CharField(choices=[('completada', 'Completada'), ('anulada', 'Anulada'), ('reembolsada', 'Reembolsada')], default='completada', max_length=20)),
+                ('cantidad', models.IntegerField(default=0)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('descuentos', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('total', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('actualizado_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('empleado', models.ForeignKey(db_column='empleado_id', on_delete=django.db.models.deletion.CASCADE, to='barberia_app.empleado')),
+            ],
+            options={
+                'verbose_name': 'Resumen Diario de Ventas',
+                'verbose_name_plural': 'Resúmenes Diarios de Ventas',
+                'db_table': 'resumen_ventas_diario',
+                'indexes': [models.Index(fields=['fecha', 'estado'], name='idx_resumen_venta_fecha')],
+                'unique_together': {('fecha', 'empleado', 'metodo_pago', 'estado')},
+            },
+        ),
+    ]
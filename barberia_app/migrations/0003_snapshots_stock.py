@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:29
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def eliminar_trigger_stock(apps, schema_editor):
+    # El stock lo mantiene ahora la aplicación; con el trigger se contaría dos veces.
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP TRIGGER IF EXISTS update_stock_after_movement')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barberia_app', '0002_resumen_ventas_diario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('snapshot_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('stock', models.IntegerField()),
+                ('creado_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('producto', models.ForeignKey(db_column='producto_id', on_delete=django.db.models.deletion.CASCADE, to='barberia_app.producto')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Stock',
+                'verbose_name_plural': 'Snapshots de Stock',
+                'db_table': 'snapshots_stock',
+                'indexes': [models.Index(fields=['fecha'], name='idx_snapshot_stock_fecha')],
+                'unique_together': {('producto', 'fecha')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='movimientoinventario',
+            index=models.Index(fields=['producto', 'fecha_hora'], name='idx_movimiento_producto_fecha'),
+        ),
+        migrations.RunPython(eliminar_trigger_stock, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:56
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Copia congelada de la normalización de busqueda_clientes al crear el índice:
+# la migración no importa código de la app, que puede cambiar después.
+# Un cambio posterior de criterio se aplica con 'manage.py reindexar_busqueda_clientes'.
+LARGO_MAXIMO = 100
+SEPARADORES = re.compile(r'[^0-9a-z]+')
+
+
+def plegar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or '')).lower()
+    return ''.join(caracter for caracter in texto if not unicodedata.combining(caracter))
+
+
+def palabras(texto):
+    return [palabra for palabra in SEPARADORES.split(texto) if palabra]
+
+
+def terminos_cliente(nombre, apellido, telefono, email):
+    terminos = set(palabras(plegar(nombre))) | set(palabras(plegar(apellido)))
+    email = plegar(email).strip()
+    if email:
+        terminos.add(email)
+        terminos.update(palabras(email.split('@')[0]))
+    numero = ''.join(caracter for caracter in str(telefono or '') if caracter.isdigit())
+    terminos.update(numero[inicio:] for inicio in range(max(len(numero) - 3, 1)))
+    return {termino[:LARGO_MAXIMO] for termino in terminos}
+
+
+def trigramas(termino):
+    return {termino[inicio:inicio + 3] for inicio in range(len(termino) - 2)}
+
+
+def indexar_clientes(apps, schema_editor):
+    # Índice inicial con los clientes existentes (mismo criterio que busqueda_clientes.indexar)
+    Cliente = apps.get_model('barberia_app', 'Cliente')
+    TerminoCliente = apps.get_model('barberia_app', 'TerminoCliente')
+    TrigramaTermino = apps.get_model('barberia_app', 'TrigramaTermino')
+    vocabulario = set()
+    terminos = []
+    for cliente_id, nombre, apellido, telefono, email in Cliente.objects.values_list(
+        'cliente_id', 'nombre', 'apellido', 'telefono', 'email'
+    ).iterator(chunk_size=5000):
+        for termino in terminos_cliente(nombre, apellido, telefono, email):
+            terminos.append(TerminoCliente(cliente_id=cliente_id, termino=termino))
+            if termino.isalpha():
+                vocabulario.add(termino)
+        if len(terminos) >= 5000:
+            TerminoCliente.objects.bulk_create(terminos)
+            terminos = []
+    TerminoCliente.objects.bulk_create(terminos)
+    TrigramaTermino.objects.bulk_create(
+        [TrigramaTermino(trigrama=trigrama, termino=termino) for termino in vocabulario for trigrama in trigramas(termino)],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barberia_app', '0003_snapshots_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrigramaTermino',
+            fields=[
+                ('trigrama_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('trigrama', models.CharField(max_length=3)),
+                ('termino', models.CharField(max_length=100)),
+            ],
+            options={
+                'verbose_name': 'Trigrama de Búsqueda',
+                'verbose_name_plural': 'Trigramas de Búsqueda',
+                'db_table': 'busqueda_clientes_trigramas',
+                'indexes': [models.Index(fields=['trigrama', 'termino'], name='idx_trigrama_termino')],
+                'unique_together': {('termino', 'trigrama')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TerminoCliente',
+            fields=[
+                ('termino_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('termino', models.CharField(max_length=100)),
+                ('cliente', models.ForeignKey(db_column='cliente_id', db_index=False, on_delete=django.db.models.deletion.CASCADE, to='barberia_app.cliente')),
+            ],
+            options={
+                'verbose_name': 'Término de Búsqueda de Cliente',
+                'verbose_name_plural': 'Términos de Búsqueda de Clientes',
+                'db_table': 'busqueda_clientes_terminos',
+                'indexes': [models.Index(fields=['termino', 'cliente'], name='idx_termino_cliente'), models.Index(fields=['cliente', 'termino'], name='idx_cliente_termino')],
+            },
+        ),
+        migrations.RunPython(indexar_clientes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barberia_app', '0004_busqueda_clientes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricaVista',
+            fields=[
+                ('metrica_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('desde', models.DateTimeField()),
+                ('hasta', models.DateTimeField()),
+                ('vista', models.CharField(max_length=200)),
+                ('peticiones', models.IntegerField()),
+                ('errores', models.IntegerField(default=0)),
+                ('duracion_total_ms', models.FloatField()),
+                ('duracion_max_ms', models.FloatField()),
+                ('consultas', models.IntegerField()),
+                ('sql_ms', models.FloatField()),
+                ('histograma', models.JSONField(help_text='Peticiones por tramo de latencia (ver instrumentacion.LIMITES_HISTOGRAMA)')),
+            ],
+            options={
+                'verbose_name': 'Métrica de Vista',
+                'verbose_name_plural': 'Métricas de Vistas',
+                'db_table': 'metricas_vistas',
+                'indexes': [models.Index(fields=['desde'], name='idx_metrica_vista_desde'), models.Index(fields=['vista', 'desde'], name='idx_metrica_vista_vista')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:16
+
+import barberia_app.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barberia_app', '0005_metricas_vistas'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='cita',
+            name='idx_cita_empleado_fecha',
+        ),
+        migrations.AddField(
+            model_name='cita',
+            name='fecha_hora_fin',
+            field=models.GeneratedField(db_persist=True, expression=barberia_app.models.SumarMinutos('fecha_hora', 'duracion_total'), output_field=models.DateTimeField()),
+        ),
+        migrations.AddIndex(
+            model_name='cita',
+            index=models.Index(fields=['empleado', 'fecha_hora', 'fecha_hora_fin'], name='idx_cita_empleado_rango'),
+        ),
+    ]
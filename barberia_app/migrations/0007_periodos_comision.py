@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barberia_app', '0006_cita_fecha_hora_fin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodoComision',
+            fields=[
+                ('periodo_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('mes', models.DateField(help_text='Primer día del mes')),
+                ('porcentaje_comision', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('ventas', models.IntegerField(default=0, help_text='Ventas completadas')),
+                ('ingresos_servicios', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('ingresos_productos', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('descuentos', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('reembolsos', models.IntegerField(default=0)),
+                ('importe_reembolsos', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('anulaciones', models.IntegerField(default=0)),
+                ('importe_anulaciones', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('comision', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('cerrado_en', models.DateTimeField(default=django.utils.timezone.now)),
+                ('empleado', models.ForeignKey(db_column='empleado_id', on_delete=django.db.models.deletion.RESTRICT, to='barberia_app.empleado')),
+            ],
+            options={
+                'verbose_name': 'Periodo de Comisión',
+                'verbose_name_plural': 'Periodos de Comisión',
+                'db_table': 'periodos_comision',
+                'unique_together': {('mes', 'empleado')},
+            },
+        ),
+    ]
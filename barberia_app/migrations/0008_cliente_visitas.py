@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barberia_app', '0007_periodos_comision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='gasto_total',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='visitas',
+            field=models.IntegerField(default=0, help_text='Citas completadas y ventas sin cita'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['ultima_visita'], name='idx_cliente_ultima_visita'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barberia_app', '0008_cliente_visitas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SegmentoCliente',
+            fields=[
+                ('cliente', models.OneToOneField(db_column='cliente_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='segmento', serialize=False, to='barberia_app.cliente')),
+                ('segmento', models.CharField(choices=[('campeones', 'Campeones'), ('leales', 'Leales'), ('potenciales', 'Potenciales'), ('necesitan_atencion', 'Necesitan atención'), ('no_perder', 'No perder'), ('en_riesgo', 'En riesgo'), ('hibernando', 'Hibernando'), ('sin_visitas', 'Sin visitas')], max_length=20)),
+                ('recencia_dias', models.IntegerField(blank=True, help_text='Días desde la última visita', null=True)),
+                ('frecuencia', models.IntegerField(default=0)),
+                ('monetario', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('puntuacion_r', models.PositiveSmallIntegerField(default=0)),
+                ('puntuacion_f', models.PositiveSmallIntegerField(default=0)),
+                ('puntuacion_m', models.PositiveSmallIntegerField(default=0)),
+                ('calculado_en', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Segmento de Cliente',
+                'verbose_name_plural': 'Segmentos de Clientes',
+                'db_table': 'segmentos_clientes',
+                'indexes': [models.Index(fields=['segmento'], name='idx_segmento_cliente')],
+            },
+        ),
+    ]
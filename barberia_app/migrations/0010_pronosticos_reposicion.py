@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('barberia_app', '0009_segmentos_clientes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PronosticoReposicion',
+            fields=[
+                ('producto', models.OneToOneField(db_column='producto_id', on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pronostico', serialize=False, to='barberia_app.producto')),
+                ('stock', models.IntegerField(help_text='Stock del producto al calcular el pronóstico')),
+                ('consumo_diario', models.DecimalField(decimal_places=3, default=0, max_digits=10)),
+                ('factores_semana', models.JSONField(help_text='Factor de consumo de lunes a domingo (media 1)')),
+                ('dias_hasta_agotar', models.IntegerField(blank=True, help_text='Vacío si no hay consumo o no se agota dentro del horizonte', null=True)),
+                ('fecha_agotamiento', models.DateField(blank=True, null=True)),
+                ('punto_pedido', models.IntegerField(default=0, help_text='Consumo durante el plazo de entrega más el stock mínimo')),
+                ('cantidad_sugerida', models.IntegerField(default=0)),
+                ('calculado_en', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Pronóstico de Reposición',
+                'verbose_name_plural': 'Reposición',
+                'db_table': 'pronosticos_reposicion',
+                'indexes': [models.Index(fields=['dias_hasta_agotar'], name='idx_pronostico_dias_agotar')],
+            },
+        ),
+    ]
@@ -1,8 +1,13 @@
-from django.db import models
+from datetime import timedelta
 
+from django.db import models, router, transaction
+
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
+from . import fechas
+
 # Helpers para choices de ENUMs
 class EstadoEmpleado(models.TextChoices):
     ACTIVO = 'activo', 'Activo'
@@ -16,6 +21,13 @@ class EstadoCita(models.TextChoices):
     CANCELADA = 'cancelada', 'Cancelada'
     NO_ASISTIO = 'no_asistio', 'No Asistió'
 
+# Estados de cita que ocupan la agenda del empleado
+ESTADOS_OCUPADOS = (EstadoCita.PENDIENTE, EstadoCita.CONFIRMADA, EstadoCita.COMPLETADA)
+
+# Una cita válida cabe en un turno, así que dura menos de un día. Acota hacia
+# atrás la búsqueda de solapes sobre idx_cita_empleado_rango.
+DURACION_MAXIMA_CITA = timedelta(days=1)
+
 class MetodoPagoVenta(models.TextChoices):
     EFECTIVO = 'efectivo', 'Efectivo'
     TARJETA_CREDITO = 'tarjeta_credito', 'Tarjeta de Crédito'
@@ -44,6 +56,16 @@ class OperacionAuditoria(models.TextChoices):
     UPDATE = 'UPDATE', 'Actualización'
     DELETE = 'DELETE', 'Eliminación'
 
+class SegmentoRFM(models.TextChoices):
+    CAMPEONES = 'campeones', 'Campeones'
+    LEALES = 'leales', 'Leales'
+    POTENCIALES = 'potenciales', 'Potenciales'
+    NECESITAN_ATENCION = 'necesitan_atencion', 'Necesitan atención'
+    NO_PERDER = 'no_perder', 'No perder'
+    EN_RIESGO = 'en_riesgo', 'En riesgo'
+    HIBERNANDO = 'hibernando', 'Hibernando'
+    SIN_VISITAS = 'sin_visitas', 'Sin visitas'
+
 class DiaSemana(models.IntegerChoices):
     LUNES = 1, 'Lunes'
     MARTES = 2, 'Martes'
@@ -65,13 +87,17 @@ class Cliente(models.Model):
     fecha_registro = models.DateTimeField(default=timezone.now)
     preferencias = models.TextField(blank=True, null=True, help_text='Ej: tipo de corte preferido, productos usados')
     historial_notas = models.TextField(blank=True, null=True)
+    # ultima_visita, visitas y gasto_total los mantiene visitas_clientes.py
     ultima_visita = models.DateTimeField(null=True, blank=True)
+    visitas = models.IntegerField(default=0, help_text='Citas completadas y ventas sin cita')
+    gasto_total = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
     activo = models.BooleanField(default=True)
 
     class Meta:
         db_table = 'clientes'
         indexes = [
             models.Index(fields=['nombre', 'apellido'], name='idx_cliente_nombre_apellido'),
+            models.Index(fields=['ultima_visita'], name='idx_cliente_ultima_visita'),
         ]
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
@@ -128,13 +154,53 @@ class Servicio(models.Model):
     def __str__(self):
         return f"{self.nombre} ({self.categoria})"
 
+class SumarMinutos(models.Func):
+    # fecha + minutos calculado por la BD; expresión de la columna generada Cita.fecha_hora_fin
+    arity = 2
+    output_field = models.DateTimeField()
+    template = 'DATE_ADD(%(expressions)s MINUTE)'
+    arg_joiner = ', INTERVAL '
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection, template="datetime(%(expressions)s || ' minutes')", arg_joiner=", '+' || ",
+            **extra_context
+        )
+
+class RangoFechasQuerySet(models.QuerySet):
+    # Filtros por fechas locales de la barbería. Cada día local se convierte en
+    # límites UTC precalculados [inicio, fin) sobre la columna indexada, en lugar
+    # de fecha_hora__date, que aplica DATE(CONVERT_TZ(...)) fila a fila.
+    campo_fecha = 'fecha_hora'
+
+    def entre(self, desde, hasta):
+        # Días locales desde..hasta, ambos incluidos
+        inicio, fin = fechas.rango_utc(desde, hasta)
+        return self.filter(**{f'{self.campo_fecha}__gte': inicio, f'{self.campo_fecha}__lt': fin})
+
+    def del_dia(self, fecha=None):
+        fecha = fecha or fechas.hoy()
+        return self.entre(fecha, fecha)
+
+    def de_la_semana(self, fecha=None):
+        # Semana de lunes a domingo que contiene 'fecha'
+        lunes = fechas.inicio_de_semana(fecha or fechas.hoy())
+        return self.entre(lunes, lunes + timedelta(days=6))
+
 class Cita(models.Model):
     cita_id = models.AutoField(primary_key=True)
     cliente = models.ForeignKey(Cliente, on_delete=models.SET_NULL, null=True, blank=True, db_column='cliente_id')
     empleado = models.ForeignKey(Empleado, on_delete=models.RESTRICT, db_column='empleado_id') # RESTRICT no es directamente soportado por Django a nivel de ORM, se maneja a nivel DB.
                                                                                              # En Django, on_delete=models.PROTECT es similar.
     fecha_hora = models.DateTimeField()
-    duracion_total = models.IntegerField(help_text='Duración total calculada de los servicios en la cita') # Este campo se actualiza por el procedimiento almacenado sp_actualizar_duracion_cita
+    duracion_total = models.IntegerField(help_text='Duración total calculada de los servicios en la cita') # Suma de las líneas; la mantiene duracion_citas.py (antes el procedimiento sp_actualizar_duracion_cita)
+    # Columna generada almacenada: la BD la mantiene al cambiar fecha_hora o duracion_total,
+    # también con un update() en bloque como el de duracion_citas.py
+    fecha_hora_fin = models.GeneratedField(
+        expression=SumarMinutos('fecha_hora', 'duracion_total'),
+        output_field=models.DateTimeField(),
+        db_persist=True,
+    )
     estado = models.CharField(
         max_length=20,
         choices=EstadoCita.choices,
@@ -143,12 +209,15 @@ class Cita(models.Model):
     notas = models.TextField(blank=True, null=True)
     fecha_creacion = models.DateTimeField(default=timezone.now)
 
+    objects = RangoFechasQuerySet.as_manager()
+
     class Meta:
         db_table = 'citas'
         unique_together = (('empleado', 'fecha_hora'),) # Corresponde a uni_empleado_fecha_hora
         indexes = [
             models.Index(fields=['fecha_hora'], name='idx_cita_fecha_hora'),
-            models.Index(fields=['empleado', 'fecha_hora'], name='idx_cita_empleado_fecha'),
+            # Búsqueda de solapes: rango sobre fecha_hora y fecha_hora_fin leído del propio índice
+            models.Index(fields=['empleado', 'fecha_hora', 'fecha_hora_fin'], name='idx_cita_empleado_rango'),
             models.Index(fields=['cliente'], name='idx_cita_cliente'),
             models.Index(fields=['estado'], name='idx_cita_estado'),
         ]
@@ -160,7 +229,57 @@ class Cita(models.Model):
         return f"Cita ID: {self.cita_id} - {cliente_nombre} con {self.empleado.nombre} el {self.fecha_hora.strftime('%Y-%m-%d %H:%M')}"
 
     # Nota: El trigger 'validate_cita_horario' se ejecuta a nivel de BD.
-    # Para una validación a nivel de Django, se podría implementar un método clean() o signals.
+    # clean() hace la misma validación para lo que pasa por formularios de Django.
+    def clean(self):
+        super().clean()
+        if self.empleado_id and self.fecha_hora and self.duracion_total:
+            self.validar_agenda()
+
+    def validar_agenda(self):
+        # La cita debe caer dentro de un turno del empleado y no solaparse con sus otras citas
+        if self.estado not in ESTADOS_OCUPADOS:
+            return
+        inicio = self.fecha_hora
+        fin = inicio + timedelta(minutes=self.duracion_total)
+        self._validar_turno(timezone.localtime(inicio))
+        # Un solo rango sobre idx_cita_empleado_rango: las citas del empleado que empiezan
+        # antes del fin (y como mucho DURACION_MAXIMA_CITA antes del inicio) y terminan
+        # después del inicio
+        choque = Cita.objects.filter(
+            empleado_id=self.empleado_id,
+            fecha_hora__gt=inicio - DURACION_MAXIMA_CITA,
+            fecha_hora__lt=fin,
+            fecha_hora_fin__gt=inicio,
+            estado__in=ESTADOS_OCUPADOS,
+        )
+        if self.pk is not None:
+            choque = choque.exclude(pk=self.pk)
+        choque = choque.order_by('fecha_hora').values_list('fecha_hora', 'fecha_hora_fin')[:1]
+        for otra_inicio, otra_fin in choque:
+            raise ValidationError({'fecha_hora': (
+                f"El empleado ya tiene una cita de {timezone.localtime(otra_inicio):%H:%M} "
+                f"a {timezone.localtime(otra_fin):%H:%M} que se solapa con esta."
+            )})
+
+    def _validar_turno(self, inicio):
+        # inicio en hora local; turnos y descansos se comparan en minutos desde la medianoche
+        desde = inicio.hour * 60 + inicio.minute + inicio.second / 60
+        hasta = desde + self.duracion_total
+        horarios = HorarioEmpleado.objects.filter(
+            empleado_id=self.empleado_id, dia_semana=inicio.isoweekday()
+        ).values_list('hora_inicio', 'hora_fin', 'es_descanso')
+        en_turno = False
+        for hora_inicio, hora_fin, es_descanso in horarios:
+            turno_desde = hora_inicio.hour * 60 + hora_inicio.minute + hora_inicio.second / 60
+            turno_hasta = hora_fin.hour * 60 + hora_fin.minute + hora_fin.second / 60
+            if es_descanso and turno_desde < hasta and desde < turno_hasta:
+                raise ValidationError({'fecha_hora': (
+                    f"La cita coincide con un descanso del empleado ({hora_inicio:%H:%M}-{hora_fin:%H:%M})."
+                )})
+            if not es_descanso and turno_desde <= desde and hasta <= turno_hasta:
+                en_turno = True
+        if not en_turno:
+            raise ValidationError({'fecha_hora': "La cita queda fuera del turno del empleado."})
 
 class DetalleCita(models.Model):
     detalle_cita_id = models.AutoField(primary_key=True)
@@ -182,16 +301,8 @@ class DetalleCita(models.Model):
     def __str__(self):
         return f"Detalle de Cita ID: {self.detalle_cita_id} - {self.servicio.nombre} para Cita {self.cita_id}"
 
-    # Al guardar un DetalleCita, se debería llamar al procedimiento almacenado sp_actualizar_duracion_cita.
-    # Esto se puede hacer con signals (post_save, post_delete) o sobrescribiendo el método save().
-    # from django.db.models.signals import post_save, post_delete
-    # from django.dispatch import receiver
-    # from django.db import connection
-
-    # @receiver([post_save, post_delete], sender=DetalleCita)
-    # def actualizar_duracion_cita_signal(sender, instance, **kwargs):
-    #     with connection.cursor() as cursor:
-    #         cursor.callproc('sp_actualizar_duracion_cita', [instance.cita.cita_id])
+    # duracion_total de la cita se recalcula al confirmar la transacción que guarda
+    # o borra sus líneas (signals.py y duracion_citas.py), como sp_actualizar_duracion_cita.
 
 
 class Producto(models.Model):
@@ -244,6 +355,8 @@ class Venta(models.Model):
     )
     notas = models.TextField(blank=True, null=True)
 
+    objects = RangoFechasQuerySet.as_manager()
+
     class Meta:
         db_table = 'ventas'
         indexes = [
@@ -308,18 +421,21 @@ class MovimientoInventario(models.Model):
         max_length=30,
         choices=TipoMovimientoInventario.choices
     )
-    cantidad = models.IntegerField() # Puede ser negativa para salidas si se modela así, pero el trigger ya maneja la lógica de +/-
+    cantidad = models.IntegerField() # Puede ser negativa para salidas si se modela así; inventario.py aplica el signo según el tipo
     fecha_hora = models.DateTimeField(default=timezone.now)
     empleado = models.ForeignKey(Empleado, on_delete=models.SET_NULL, null=True, blank=True, db_column='empleado_id')
     venta = models.ForeignKey(Venta, on_delete=models.SET_NULL, null=True, blank=True, db_column='venta_id')
     motivo = models.CharField(max_length=255, blank=True, null=True)
     documento_referencia = models.CharField(max_length=50, blank=True, null=True)
 
+    objects = RangoFechasQuerySet.as_manager()
+
     class Meta:
         db_table = 'movimientos_inventario'
         indexes = [
             models.Index(fields=['producto'], name='idx_movimiento_producto'),
             models.Index(fields=['fecha_hora'], name='idx_movimiento_fecha'),
+            models.Index(fields=['producto', 'fecha_hora'], name='idx_movimiento_producto_fecha'),
             models.Index(fields=['tipo_movimiento'], name='idx_movimiento_tipo'),
         ]
         verbose_name = "Movimiento de Inventario"
@@ -328,8 +444,34 @@ class MovimientoInventario(models.Model):
     def __str__(self):
         return f"Movimiento ID: {self.movimiento_id} - {self.producto.nombre} ({self.tipo_movimiento}: {self.cantidad})"
     
-    # Nota: El trigger 'update_stock_after_movement' actualiza productos.stock_actual automáticamente
-    # al insertar un MovimientoInventario.
+    # Nota: productos.stock_actual se actualiza en la aplicación al insertar un MovimientoInventario
+    # (ver inventario.py); la migración 0003 elimina el trigger 'update_stock_after_movement'.
+    # El INSERT y el UPDATE del stock (receiver post_save) van en la misma transacción:
+    # si falla uno no queda el otro.
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+
+class SnapshotStock(models.Model):
+    # Stock de cada producto al cierre de un día local (ver inventario.py).
+    snapshot_id = models.BigAutoField(primary_key=True)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, db_column='producto_id')
+    fecha = models.DateField()
+    stock = models.IntegerField()
+    creado_en = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'snapshots_stock'
+        unique_together = (('producto', 'fecha'),)
+        indexes = [
+            models.Index(fields=['fecha'], name='idx_snapshot_stock_fecha'),
+        ]
+        verbose_name = "Snapshot de Stock"
+        verbose_name_plural = "Snapshots de Stock"
+
+    def __str__(self):
+        return f"Stock de producto {self.producto_id} al {self.fecha}: {self.stock}"
 
 class HorarioEmpleado(models.Model):
     horario_id = models.AutoField(primary_key=True)
@@ -379,6 +521,8 @@ class Auditoria(models.Model):
     fecha_hora = models.DateTimeField(default=timezone.now) # El (6) de DATETIME(6) es para microsegundos, Django lo maneja.
     ip_origen = models.CharField(max_length=45, null=True, blank=True)
 
+    objects = RangoFechasQuerySet.as_manager()
+
     class Meta:
         db_table = 'auditoria'
         indexes = [
@@ -391,6 +535,188 @@ class Auditoria(models.Model):
     def __str__(self):
         return f"Log ID: {self.log_id} - {self.operacion} en {self.tabla_afectada} ({self.fecha_hora})"
 
+class ResumenVentaDiario(models.Model):
+    # Tabla de resumen mantenida incrementalmente desde signals.py (ver resumen_ventas.py).
+    # Una fila por día local, empleado, método de pago y estado de la venta.
+    resumen_id = models.BigAutoField(primary_key=True)
+    fecha = models.DateField()
+    empleado = models.ForeignKey(Empleado, on_delete=models.CASCADE, db_column='empleado_id')
+    metodo_pago = models.CharField(
+        max_length=20,
+        choices=MetodoPagoVenta.choices
+    )
+    estado = models.CharField(
+        max_length=20,
+        choices=EstadoVenta.choices,
+        default=EstadoVenta.COMPLETADA
+    )
+    cantidad = models.IntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    descuentos = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    actualizado_en = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'resumen_ventas_diario'
+        unique_together = (('fecha', 'empleado', 'metodo_pago', 'estado'),)
+        indexes = [
+            models.Index(fields=['fecha', 'estado'], name='idx_resumen_venta_fecha'),
+        ]
+        verbose_name = "Resumen Diario de Ventas"
+        verbose_name_plural = "Resúmenes Diarios de Ventas"
+
+    def __str__(self):
+        return f"{self.fecha} - Empleado {self.empleado_id} ({self.metodo_pago}, {self.estado}): {self.total}"
+
+class MetricaVista(models.Model):
+    # Métricas por vista volcadas periódicamente desde el buffer en memoria de
+    # instrumentacion.py: una fila por vista y volcado.
+    metrica_id = models.BigAutoField(primary_key=True)
+    desde = models.DateTimeField()
+    hasta = models.DateTimeField()
+    vista = models.CharField(max_length=200)
+    peticiones = models.IntegerField()
+    errores = models.IntegerField(default=0)
+    duracion_total_ms = models.FloatField()
+    duracion_max_ms = models.FloatField()
+    consultas = models.IntegerField()
+    sql_ms = models.FloatField()
+    histograma = models.JSONField(help_text='Peticiones por tramo de latencia (ver instrumentacion.LIMITES_HISTOGRAMA)')
+
+    class Meta:
+        db_table = 'metricas_vistas'
+        indexes = [
+            models.Index(fields=['desde'], name='idx_metrica_vista_desde'),
+            models.Index(fields=['vista', 'desde'], name='idx_metrica_vista_vista'),
+        ]
+        verbose_name = "Métrica de Vista"
+        verbose_name_plural = "Métricas de Vistas"
+
+    def __str__(self):
+        return f"{self.vista} ({self.desde:%Y-%m-%d %H:%M} - {self.hasta:%H:%M}): {self.peticiones} peticiones"
+
+class TerminoCliente(models.Model):
+    # Índice de búsqueda de clientes (ver busqueda_clientes.py): una fila por término
+    # normalizado (palabras del nombre sin tildes, email, dígitos del teléfono).
+    # Las búsquedas por prefijo son un rango sobre idx_termino_cliente; idx_cliente_termino
+    # comprueba si un cliente dado tiene un término.
+    termino_id = models.BigAutoField(primary_key=True)
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, db_column='cliente_id', db_index=False)
+    termino = models.CharField(max_length=100)
+
+    class Meta:
+        db_table = 'busqueda_clientes_terminos'
+        indexes = [
+            models.Index(fields=['termino', 'cliente'], name='idx_termino_cliente'),
+            models.Index(fields=['cliente', 'termino'], name='idx_cliente_termino'),
+        ]
+        verbose_name = "Término de Búsqueda de Cliente"
+        verbose_name_plural = "Términos de Búsqueda de Clientes"
+
+    def __str__(self):
+        return f"{self.termino} -> Cliente {self.cliente_id}"
+
+class TrigramaTermino(models.Model):
+    # Trigramas del vocabulario de términos de texto, para buscar texto en medio
+    # de una palabra sin recorrer la tabla de clientes.
+    trigrama_id = models.BigAutoField(primary_key=True)
+    trigrama = models.CharField(max_length=3)
+    termino = models.CharField(max_length=100)
+
+    class Meta:
+        db_table = 'busqueda_clientes_trigramas'
+        unique_together = (('termino', 'trigrama'),)
+        indexes = [
+            models.Index(fields=['trigrama', 'termino'], name='idx_trigrama_termino'),
+        ]
+        verbose_name = "Trigrama de Búsqueda"
+        verbose_name_plural = "Trigramas de Búsqueda"
+
+    def __str__(self):
+        return f"{self.trigrama} -> {self.termino}"
+
+class SegmentoCliente(models.Model):
+    # Segmento RFM de cada cliente calculado en lote (ver segmentos_clientes.py).
+    # Puntuaciones 1-5 por quintiles entre los clientes con visitas; 0 si no tiene.
+    cliente = models.OneToOneField(
+        Cliente, on_delete=models.CASCADE, primary_key=True, db_column='cliente_id', related_name='segmento'
+    )
+    segmento = models.CharField(max_length=20, choices=SegmentoRFM.choices)
+    recencia_dias = models.IntegerField(null=True, blank=True, help_text='Días desde la última visita')
+    frecuencia = models.IntegerField(default=0)
+    monetario = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    puntuacion_r = models.PositiveSmallIntegerField(default=0)
+    puntuacion_f = models.PositiveSmallIntegerField(default=0)
+    puntuacion_m = models.PositiveSmallIntegerField(default=0)
+    calculado_en = models.DateTimeField()
+
+    class Meta:
+        db_table = 'segmentos_clientes'
+        indexes = [
+            models.Index(fields=['segmento'], name='idx_segmento_cliente'),
+        ]
+        verbose_name = "Segmento de Cliente"
+        verbose_name_plural = "Segmentos de Clientes"
+
+    def __str__(self):
+        return f"Cliente {self.cliente_id}: {self.get_segmento_display()} (R{self.puntuacion_r} F{self.puntuacion_f} M{self.puntuacion_m})"
+
+class PeriodoComision(models.Model):
+    # Comisiones de un mes cerrado (ver comisiones.py): una fila por empleado y mes.
+    # Los meses cerrados se leen de aquí y no se vuelven a calcular, aunque luego
+    # cambie una venta o el porcentaje de comisión del empleado.
+    periodo_id = models.BigAutoField(primary_key=True)
+    mes = models.DateField(help_text='Primer día del mes')
+    empleado = models.ForeignKey(Empleado, on_delete=models.RESTRICT, db_column='empleado_id')
+    porcentaje_comision = models.DecimalField(max_digits=5, decimal_places=2)
+    ventas = models.IntegerField(default=0, help_text='Ventas completadas')
+    ingresos_servicios = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    ingresos_productos = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    descuentos = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    reembolsos = models.IntegerField(default=0)
+    importe_reembolsos = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    anulaciones = models.IntegerField(default=0)
+    importe_anulaciones = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    comision = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    cerrado_en = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'periodos_comision'
+        unique_together = (('mes', 'empleado'),)
+        verbose_name = "Periodo de Comisión"
+        verbose_name_plural = "Periodos de Comisión"
+
+    def __str__(self):
+        return f"{self.mes:%Y-%m} - Empleado {self.empleado_id}: {self.comision}"
+
+class PronosticoReposicion(models.Model):
+    # Pronóstico de consumo y reposición de cada producto activo calculado en lote
+    # (ver reposicion.py) a partir de las salidas por venta y por uso interno.
+    producto = models.OneToOneField(
+        Producto, on_delete=models.CASCADE, primary_key=True, db_column='producto_id', related_name='pronostico'
+    )
+    stock = models.IntegerField(help_text='Stock del producto al calcular el pronóstico')
+    consumo_diario = models.DecimalField(max_digits=10, decimal_places=3, default=0)
+    factores_semana = models.JSONField(help_text='Factor de consumo de lunes a domingo (media 1)')
+    dias_hasta_agotar = models.IntegerField(
+        null=True, blank=True, help_text='Vacío si no hay consumo o no se agota dentro del horizonte'
+    )
+    fecha_agotamiento = models.DateField(null=True, blank=True)
+    punto_pedido = models.IntegerField(default=0, help_text='Consumo durante el plazo de entrega más el stock mínimo')
+    cantidad_sugerida = models.IntegerField(default=0)
+    calculado_en = models.DateTimeField()
+
+    class Meta:
+        db_table = 'pronosticos_reposicion'
+        indexes = [
+            models.Index(fields=['dias_hasta_agotar'], name='idx_pronostico_dias_agotar'),
+        ]
+        verbose_name = "Pronóstico de Reposición"
+        verbose_name_plural = "Reposición"
+
+    def __str__(self):
+        return f"{self.producto_id}: agota en {self.dias_hasta_agotar} días, pedir {self.cantidad_sugerida}"
+
 # Vistas SQL como modelos no gestionados (solo lectura)
 # class VistaDisponibilidadEmpleados(models.Model):
 #     empleado_id = models.IntegerField(primary_key=True) # Necesita una clave primaria para Django
@@ -0,0 +1,141 @@
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Lecturas en la réplica para dashboard, reportes, exportaciones y auditoría.
+# Las vistas de solo lectura marcan su trabajo con lectura() (o los decoradores
+# y el mixin de abajo) y RouterReplica envía esas lecturas al alias de la
+# réplica; todo lo demás, y toda escritura, va al primario.
+# Lectura de lo propio: tras un POST (o cualquier método no seguro) la sesión
+# queda pegada al primario durante PEGAJOSIDAD segundos, el retraso de
+# replicación que se tolera. Dentro de una transacción abierta en el primario
+# también se lee del primario.
+# Lo que se guarda en caché para todos (widgets del dashboard, gráficos) no se
+# recalcula desde la réplica durante PEGAJOSIDAD segundos tras un cambio de sus
+# datos (lectura_tras_cambio): la réplica aún podría no tenerlo y la caché lo
+# serviría hasta el siguiente cambio o su TIMEOUT.
+#
+# Configuración en settings.BARBERIA_REPLICA:
+#   ALIAS: alias de la réplica en DATABASES. Si no existe, todo se lee del primario.
+#   PEGAJOSIDAD: segundos que una sesión lee del primario después de escribir.
+
+CONFIGURACION_POR_DEFECTO = {
+    'ALIAS': 'replica',
+    'PEGAJOSIDAD': 10,
+}
+
+CLAVE_SESION = 'barberia_primario_hasta'
+
+_en_replica = ContextVar('barberia_en_replica', default=False)
+_pegado = ContextVar('barberia_pegado_al_primario', default=False)
+
+
+def configuracion():
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'BARBERIA_REPLICA', {})}
+
+
+def alias():
+    # Alias de la réplica o None si no está configurada
+    nombre = configuracion()['ALIAS']
+    return nombre if nombre in settings.DATABASES else None
+
+
+def fijar_pegado(pegado):
+    return _pegado.set(pegado)
+
+
+def restablecer_pegado(token):
+    _pegado.reset(token)
+
+
+def usar_replica():
+    # Decisión para el trabajo que empieza ahora
+    return alias() is not None and not _pegado.get()
+
+
+@contextmanager
+def lectura(activa=True):
+    token = _en_replica.set(activa and usar_replica())
+    try:
+        yield
+    finally:
+        _en_replica.reset(token)
+
+
+def lectura_tras_cambio(cambio):
+    # cambio: momento (timestamp) de la última modificación de los datos leídos.
+    # Si es reciente se lee del primario; si no, vale la decisión de la vista.
+    if time.time() - cambio < configuracion()['PEGAJOSIDAD']:
+        return lectura(False)
+    return nullcontext()
+
+
+def _iterar(iterable, activa):
+    # El contenido en streaming se genera después de que la vista devuelve la
+    # respuesta: cada tramo se lee dentro de su propio lectura()
+    iterador = iter(iterable)
+    while True:
+        with lectura(activa):
+            try:
+                bloque = next(iterador)
+            except StopIteration:
+                return
+        yield bloque
+
+
+def vista_en_replica(vista):
+    # Decorador para vistas de solo lectura; solo GET y HEAD van a la réplica
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        activa = request.method in ('GET', 'HEAD') and usar_replica()
+        with lectura(activa):
+            response = renderizar(vista(request, *args, **kwargs))
+        if activa and getattr(response, 'streaming', False):
+            response.streaming_content = _iterar(response.streaming_content, activa)
+        return response
+    return envoltura
+
+
+def renderizar(response):
+    # Las TemplateResponse evalúan sus querysets al renderizarse, después de la
+    # vista: se renderizan aquí, dentro de lectura()
+    if hasattr(response, 'render') and not response.is_rendered:
+        response.render()
+    return response
+
+
+class LecturaEnReplicaAdminMixin:
+    # ModelAdmin cuyo listado e historial se leen de la réplica (las peticiones GET)
+    def changelist_view(self, request, extra_context=None):
+        with lectura(request.method == 'GET'):
+            return renderizar(super().changelist_view(request, extra_context))
+
+    def history_view(self, request, object_id, extra_context=None):
+        with lectura(request.method == 'GET'):
+            return renderizar(super().history_view(request, object_id, extra_context))
+
+
+class RouterReplica:
+    def db_for_read(self, model, **hints):
+        if not _en_replica.get():
+            return None
+        # Lo leído dentro de una transacción del primario debe ver sus propias escrituras
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias()
+
+    def db_for_write(self, model, **hints):
+        # Explícito: sin esto un objeto leído de la réplica se guardaría en ella
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Primario y réplica tienen los mismos datos
+        bases = {DEFAULT_DB_ALIAS, alias()}
+        if obj1._state.db in bases and obj2._state.db in bases:
+            return True
+        return None
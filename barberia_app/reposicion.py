@@ -0,0 +1,177 @@
+import math
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Min, Q, Sum
+from django.db.models.functions import Abs, ExtractWeekDay
+from django.utils import timezone
+
+from . import fechas, lotes
+from .models import MovimientoInventario, Producto, PronosticoReposicion, TipoMovimientoInventario
+
+
+# Pronóstico de consumo y reposición de todos los productos activos.
+# Una sola consulta agrupa las salidas por venta y por uso interno del historial
+# por producto y día de la semana local (total del historial y total de la
+# ventana reciente); el resto es aritmética en memoria por producto, sin más
+# consultas. El consumo diario es la media de la ventana reciente y cada día de
+# la semana lo escala con su factor (media del día / media de los siete días).
+# Con eso se proyectan los días hasta agotar el stock, el punto de pedido
+# (consumo durante el plazo de entrega + stock mínimo) y, si el stock está por
+# debajo, la cantidad para cubrir el plazo de entrega más la cobertura.
+# Los resultados se guardan con un upsert por lotes en pronosticos_reposicion (lotes.py).
+
+CONFIGURACION_POR_DEFECTO = {
+    'HISTORIAL_DIAS': 364,  # Días para los factores por día de la semana (52 semanas)
+    'VENTANA_DIAS': 56,  # Días recientes para el consumo diario
+    'MINIMO_DIAS_ESTACIONALIDAD': 28,  # Con menos historial los factores son 1
+    'PLAZO_ENTREGA_DIAS': 7,
+    'COBERTURA_DIAS': 30,
+    'HORIZONTE_DIAS': 730,  # Más allá, dias_hasta_agotar queda vacío
+}
+
+LOTE = 1000
+SALIDAS = (TipoMovimientoInventario.SALIDA_VENTA, TipoMovimientoInventario.SALIDA_USO_INTERNO)
+CAMPOS = (
+    'stock', 'consumo_diario', 'factores_semana', 'dias_hasta_agotar', 'fecha_agotamiento',
+    'punto_pedido', 'cantidad_sugerida', 'calculado_en',
+)
+
+
+def configuracion():
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'BARBERIA_REPOSICION', {})}
+
+
+def consumos(hoy, historial_dias, ventana_dias):
+    # Salidas por producto y día de la semana (1 = domingo ... 7 = sábado) en los
+    # 'historial_dias' días anteriores a hoy; 'reciente' solo cuenta la ventana.
+    return (
+        MovimientoInventario.objects.entre(hoy - timedelta(days=historial_dias), hoy - timedelta(days=1))
+        .filter(tipo_movimiento__in=SALIDAS)
+        .annotate(dia_semana=ExtractWeekDay('fecha_hora'))
+        .values('producto_id', 'dia_semana')
+        .annotate(
+            total=Sum(Abs('cantidad')),
+            reciente=Sum(Abs('cantidad'), filter=Q(fecha_hora__gte=fechas.inicio_del_dia(hoy - timedelta(days=ventana_dias)))),
+            primera=Min('fecha_hora'),
+        )
+        .order_by()
+    )
+
+
+def dias_de_semana(hoy, dias):
+    # Veces que aparece cada día de la semana (lunes = 0) en los 'dias' días anteriores a hoy
+    conteo = [dias // 7] * 7
+    for atras in range(1, dias % 7 + 1):
+        conteo[(hoy - timedelta(days=atras)).weekday()] += 1
+    return conteo
+
+
+def factores(totales, conteo):
+    medias = [total / veces if veces else 0 for total, veces in zip(totales, conteo)]
+    media = sum(medias) / 7
+    if not media:
+        return [1.0] * 7
+    return [valor / media for valor in medias]
+
+
+def consumo(tasa, factores_semana, desde, dias):
+    # Consumo previsto en los 'dias' días a partir de 'desde' (incluido). Los
+    # factores tienen media 1: cada semana completa consume 7 * tasa.
+    semanas, resto = divmod(dias, 7)
+    inicio = desde.weekday()
+    return tasa * (semanas * 7 + sum(factores_semana[(inicio + dia) % 7] for dia in range(resto)))
+
+
+def dias_hasta_agotar(stock, tasa, factores_semana, hoy):
+    # Día (hoy = 0) en el que el consumo previsto alcanza el stock; None sin consumo
+    if stock <= 0:
+        return 0
+    if tasa <= 0:
+        return None
+    # Se saltan las semanas completas que no agotan el stock; quedan como mucho 7 días
+    dia = (_entero(stock / (tasa * 7)) - 1) * 7
+    restante = stock - dia * tasa
+    inicio = hoy.weekday()
+    while True:
+        gasto = tasa * factores_semana[(inicio + dia) % 7]
+        if round(gasto - restante, 6) >= 0:
+            return dia
+        restante -= gasto
+        dia += 1
+
+
+def _entero(valor):
+    # Redondeo hacia arriba sin arrastrar el error de coma flotante
+    return math.ceil(round(valor, 6))
+
+
+def pronosticar(totales, reciente, dias_historial, stock, stock_minimo, hoy, config):
+    conteo = dias_de_semana(hoy, dias_historial)
+    if dias_historial >= config['MINIMO_DIAS_ESTACIONALIDAD']:
+        factores_semana = factores(totales, conteo)
+    else:
+        factores_semana = [1.0] * 7
+    tasa = reciente / min(config['VENTANA_DIAS'], dias_historial) if dias_historial else 0.0
+
+    dias = dias_hasta_agotar(stock, tasa, factores_semana, hoy)
+    if dias is not None and dias > config['HORIZONTE_DIAS']:
+        dias = None
+    plazo = config['PLAZO_ENTREGA_DIAS']
+    punto_pedido = _entero(consumo(tasa, factores_semana, hoy, plazo)) + stock_minimo
+    cantidad_sugerida = 0
+    if stock <= punto_pedido:
+        objetivo = _entero(consumo(tasa, factores_semana, hoy, plazo + config['COBERTURA_DIAS'])) + stock_minimo
+        cantidad_sugerida = max(objetivo - max(stock, 0), 0)
+    return {
+        'stock': stock,
+        'consumo_diario': Decimal(f'{tasa:.3f}'),
+        'factores_semana': [round(factor, 3) for factor in factores_semana],
+        'dias_hasta_agotar': dias,
+        'fecha_agotamiento': hoy + timedelta(days=dias) if dias is not None else None,
+        'punto_pedido': punto_pedido,
+        'cantidad_sugerida': cantidad_sugerida,
+    }
+
+
+def _guardar(pronosticos):
+    lotes.insertar_o_actualizar(PronosticoReposicion, pronosticos, 'producto', CAMPOS)
+
+
+def calcular(lote=LOTE):
+    config = configuracion()
+    ahora = timezone.now()
+    hoy = fechas.fecha_local(ahora)
+    historial = config['HISTORIAL_DIAS']
+    ventana = min(config['VENTANA_DIAS'], historial)
+
+    # producto_id -> [totales de lunes a domingo, total reciente, primer día con salidas]
+    salidas = {}
+    for fila in consumos(hoy, historial, ventana):
+        datos = salidas.setdefault(fila['producto_id'], [[0] * 7, 0, fila['primera']])
+        # ExtractWeekDay: 1 = domingo; weekday(): 0 = lunes
+        datos[0][(fila['dia_semana'] + 5) % 7] = fila['total']
+        datos[1] += fila['reciente'] or 0
+        datos[2] = min(datos[2], fila['primera'])
+
+    resumen = {'productos': 0, 'con_consumo': 0, 'a_reponer': 0, 'se_agotan_en_plazo': 0}
+    pendientes = []
+    productos = Producto.objects.filter(activo=True).order_by('pk').values_list('producto_id', 'stock_actual', 'stock_minimo')
+    for producto_id, stock, stock_minimo in productos:
+        totales, reciente, primera = salidas.get(producto_id, ([0] * 7, 0, None))
+        dias_historial = min((hoy - fechas.fecha_local(primera)).days, historial) if primera else 0
+        datos = pronosticar(totales, reciente, dias_historial, stock, stock_minimo, hoy, config)
+        resumen['productos'] += 1
+        resumen['con_consumo'] += bool(reciente)
+        resumen['a_reponer'] += bool(datos['cantidad_sugerida'])
+        if datos['dias_hasta_agotar'] is not None and datos['dias_hasta_agotar'] <= config['PLAZO_ENTREGA_DIAS']:
+            resumen['se_agotan_en_plazo'] += 1
+        pendientes.append(PronosticoReposicion(producto_id=producto_id, calculado_en=ahora, **datos))
+        if len(pendientes) >= lote:
+            _guardar(pendientes)
+            pendientes = []
+    if pendientes:
+        _guardar(pendientes)
+    PronosticoReposicion.objects.filter(producto__activo=False).delete()
+    return resumen
@@ -0,0 +1,72 @@
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, OperationalError, transaction
+
+from . import catalogo as catalogo_activo
+from .models import Cita, Cliente, DetalleCita, Empleado, EstadoCita, EstadoEmpleado
+
+
+# Reservas en línea (widget de reservas, vistas de views.py).
+# Los servicios, sus precios y duraciones salen del catálogo en memoria
+# (catalogo.py). Las vistas son síncronas: cada petición hace unas pocas
+# consultas en serie y el alta es una transacción, así que una versión async
+# (sync_to_async o el ORM async) solo añadía el salto entre hilos y con carga
+# atendía menos peticiones por segundo que los workers síncronos.
+# La fila del empleado se bloquea con SELECT ... FOR UPDATE, así dos reservas
+# simultáneas del mismo empleado se validan una después de otra; la restricción
+# única (empleado, fecha_hora) es la última barrera. Si la espera por el bloqueo
+# vence o la BD aborta la transacción por un interbloqueo, la reserva se
+# rechaza como agenda ocupada (409) en lugar de un error 500.
+
+
+def catalogo():
+    return [{**fila, 'precio': str(fila['precio'])} for fila in catalogo_activo.servicios().values()]
+
+
+
+def reservar(servicio_ids, empleado_id, inicio, cliente, notas=None):
+    # cliente: dict con nombre, apellido, telefono y opcionalmente email. Se
+    # reutiliza el cliente con ese teléfono. ValueError o ValidationError si la
+    # reserva no es posible.
+    try:
+        return _reservar(servicio_ids, empleado_id, inicio, cliente, notas)
+    except OperationalError:
+        # Tiempo de espera del bloqueo agotado o interbloqueo: la transacción ya se deshizo
+        raise ValidationError({'fecha_hora': 'La agenda del empleado está ocupada, vuelva a intentarlo.'})
+
+
+@transaction.atomic
+def _reservar(servicio_ids, empleado_id, inicio, cliente, notas):
+    activos = catalogo_activo.servicios()
+    servicios = {
+        servicio_id: (activos[servicio_id]['precio'], activos[servicio_id]['duracion_minutos'])
+        for servicio_id in servicio_ids if servicio_id in activos
+    }
+    faltantes = set(servicio_ids) - set(servicios)
+    if faltantes:
+        raise ValueError(f"Servicios inexistentes o inactivos: {sorted(faltantes)}")
+    if not Empleado.objects.select_for_update().filter(pk=empleado_id, estado=EstadoEmpleado.ACTIVO).exists():
+        raise ValueError('Empleado inexistente o inactivo')
+
+    cita = Cita(
+        empleado_id=empleado_id,
+        fecha_hora=inicio,
+        duracion_total=sum(duracion for _, duracion in servicios.values()),
+        estado=EstadoCita.PENDIENTE,
+        notas=notas,
+    )
+    cita.validar_agenda()
+    try:
+        cita.cliente, _ = Cliente.objects.get_or_create(
+            telefono=cliente['telefono'],
+            defaults={'nombre': cliente['nombre'], 'apellido': cliente['apellido'], 'email': cliente.get('email') or None},
+        )
+    except IntegrityError:
+        raise ValidationError({'email': 'El email ya está registrado con otro teléfono.'})
+    try:
+        with transaction.atomic():
+            cita.save()
+    except IntegrityError:
+        raise ValidationError({'fecha_hora': 'El empleado ya tiene una cita a esa hora.'})
+    for servicio_id, (precio, duracion) in servicios.items():
+        DetalleCita.objects.create(cita=cita, servicio_id=servicio_id, precio_aplicado=precio, duracion_minutos=duracion)
+    return cita
@@ -0,0 +1,158 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import fechas
+from .models import EstadoVenta, ResumenVentaDiario, Venta
+
+
+# Mantenimiento incremental de ResumenVentaDiario.
+# Cada venta aporta una fila (cantidad=1 y sus importes) a la clave
+# (fecha local, empleado, método de pago, estado). Al modificar una venta se
+# resta su aporte anterior y se suma el nuevo, así una anulación o reembolso
+# mueve la venta de 'completada' al estado correspondiente.
+
+CAMPOS_VENTA = ('fecha_hora', 'empleado_id', 'metodo_pago', 'estado', 'subtotal', 'descuentos', 'total')
+
+
+def _decimal(valor):
+    if isinstance(valor, Decimal):
+        return valor
+    return Decimal(str(valor or 0))
+
+
+def aporte(datos):
+    # 'datos' puede ser una instancia de Venta o un dict con CAMPOS_VENTA.
+    if isinstance(datos, Venta):
+        datos = {campo: getattr(datos, campo) for campo in CAMPOS_VENTA}
+    clave = {
+        'fecha': fechas.fecha_local(datos['fecha_hora']),
+        'empleado_id': datos['empleado_id'],
+        'metodo_pago': datos['metodo_pago'],
+        'estado': datos['estado'],
+    }
+    importes = {
+        'subtotal': _decimal(datos['subtotal']),
+        'descuentos': _decimal(datos['descuentos']),
+        'total': _decimal(datos['total']),
+    }
+    return clave, importes
+
+
+def aporte_guardado(venta_id):
+    datos = Venta.objects.filter(pk=venta_id).values(*CAMPOS_VENTA).first()
+    return aporte(datos) if datos else None
+
+
+def _aplicar(clave, importes, signo):
+    cambios = {
+        'cantidad': F('cantidad') + signo,
+        'actualizado_en': timezone.now(),
+    }
+    for campo, valor in importes.items():
+        cambios[campo] = F(campo) + signo * valor
+
+    if ResumenVentaDiario.objects.filter(**clave).update(**cambios):
+        return
+    if signo < 0:
+        # No hay fila que descontar: ese día aún no se ha reconstruido.
+        return
+    try:
+        with transaction.atomic():
+            ResumenVentaDiario.objects.create(cantidad=1, **clave, **importes)
+    except IntegrityError:
+        # Otra transacción creó la fila entre el UPDATE y el INSERT.
+        ResumenVentaDiario.objects.filter(**clave).update(**cambios)
+
+
+def registrar_cambio(anterior, actual):
+    if anterior == actual:
+        return
+    if anterior is not None:
+        _aplicar(*anterior, signo=-1)
+    if actual is not None:
+        _aplicar(*actual, signo=1)
+
+
+def reconstruir(desde, hasta):
+    filas = (
+        Venta.objects.entre(desde, hasta)
+        .annotate(fecha=TruncDate('fecha_hora', tzinfo=timezone.get_current_timezone()))
+        .values('fecha', 'empleado_id', 'metodo_pago', 'estado')
+        .annotate(
+            cantidad=Count('venta_id'),
+            suma_subtotal=Sum('subtotal'),
+            suma_descuentos=Sum('descuentos'),
+            suma_total=Sum('total'),
+        )
+        .order_by()
+    )
+    ahora = timezone.now()
+    resumenes = [
+        ResumenVentaDiario(
+            fecha=fila['fecha'],
+            empleado_id=fila['empleado_id'],
+            metodo_pago=fila['metodo_pago'],
+            estado=fila['estado'],
+            cantidad=fila['cantidad'],
+            subtotal=fila['suma_subtotal'] or 0,
+            descuentos=fila['suma_descuentos'] or 0,
+            total=fila['suma_total'] or 0,
+            actualizado_en=ahora,
+        )
+        for fila in filas
+    ]
+    with transaction.atomic():
+        ResumenVentaDiario.objects.filter(fecha__gte=desde, fecha__lte=hasta).delete()
+        ResumenVentaDiario.objects.bulk_create(resumenes, batch_size=1000)
+    return len(resumenes)
+
+
+def reconstruir_dias(dias):
+    # Reconstruye un conjunto arbitrario de días agrupándolos en tramos contiguos.
+    dias = sorted(set(dias))
+    total = 0
+    while dias:
+        desde = hasta = dias.pop(0)
+        while dias and dias[0] == hasta + timedelta(days=1):
+            hasta = dias.pop(0)
+        total += reconstruir(desde, hasta)
+    return total
+
+
+def totales(desde, hasta, estado=EstadoVenta.COMPLETADA):
+    resultado = ResumenVentaDiario.objects.filter(
+        fecha__gte=desde,
+        fecha__lte=hasta,
+        estado=estado,
+    ).aggregate(cantidad=Sum('cantidad'), total=Sum('total'))
+    return {
+        'cantidad': resultado['cantidad'] or 0,
+        'total': resultado['total'] or 0,
+    }
+
+
+def totales_tramos(tramos, estado=EstadoVenta.COMPLETADA):
+    # Totales de varios tramos {nombre: (desde, hasta)} en una sola consulta con
+    # sumas condicionales sobre el rango que los cubre a todos.
+    desde = min(inicio for inicio, _ in tramos.values())
+    hasta = max(fin for _, fin in tramos.values())
+    agregados = {}
+    for nombre, (inicio, fin) in tramos.items():
+        filtro = Q(fecha__gte=inicio, fecha__lte=fin)
+        agregados[f'{nombre}_cantidad'] = Sum('cantidad', filter=filtro)
+        agregados[f'{nombre}_total'] = Sum('total', filter=filtro)
+    resultado = ResumenVentaDiario.objects.filter(
+        fecha__gte=desde, fecha__lte=hasta, estado=estado,
+    ).aggregate(**agregados)
+    return {
+        nombre: {
+            'cantidad': resultado[f'{nombre}_cantidad'] or 0,
+            'total': resultado[f'{nombre}_total'] or 0,
+        }
+        for nombre in tramos
+    }
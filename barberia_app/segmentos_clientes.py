@@ -0,0 +1,127 @@
+import bisect
+from array import array
+from collections import Counter
+from decimal import Decimal
+
+from django.utils import timezone
+
+from . import lotes
+from .models import Cliente, SegmentoCliente, SegmentoRFM
+
+
+# Segmentación RFM (recencia, frecuencia, valor monetario) de todos los clientes.
+# Parte de las columnas que visitas_clientes.py mantiene en clientes
+# (ultima_visita, visitas, gasto_total), así no se recorren citas ni ventas.
+# Una pasada por tramos de cliente_id llena arrays compactos (módulo array,
+# 8 bytes por cliente y columna). Los cortes de los quintiles se piden a la BD,
+# una fila por corte, y una segunda pasada por los arrays puntúa, segmenta y
+# escribe por tramos con un upsert en segmentos_clientes (lotes.py). En memoria
+# solo quedan los arrays y un tramo de filas; no hay consultas por cliente.
+
+LOTE = 5000
+QUINTILES = 5
+CAMPOS = (
+    'segmento', 'recencia_dias', 'frecuencia', 'monetario',
+    'puntuacion_r', 'puntuacion_f', 'puntuacion_m', 'calculado_en',
+)
+
+
+def cortes(campo, total, convertir, descendente=False):
+    # Los QUINTILES - 1 valores que separan los quintiles de 'campo' entre los
+    # 'total' clientes con visitas. Cada corte es una consulta ORDER BY ... LIMIT 1
+    # OFFSET n: la columna no se copia ni se ordena en Python.
+    valores = (
+        Cliente.objects.filter(ultima_visita__isnull=False)
+        .order_by(f'-{campo}' if descendente else campo)
+        .values_list(campo, flat=True)
+    )
+    resultado = []
+    for quintil in range(1, QUINTILES):
+        posicion = total * quintil // QUINTILES
+        # Sin fila si otro proceso quitó clientes desde la carga: se usan los cortes obtenidos
+        resultado.extend(convertir(valor) for valor in valores[posicion:posicion + 1])
+    return resultado
+
+
+def puntuar(valor, limites):
+    # 1 a QUINTILES: quintil al que pertenece el valor (más alto = valor mayor)
+    return bisect.bisect_right(limites, valor) + 1
+
+
+def segmento(r, f, m):
+    if not r:
+        return SegmentoRFM.SIN_VISITAS
+    if r >= 4 and f >= 4 and m >= 4:
+        return SegmentoRFM.CAMPEONES
+    if r <= 2:
+        if m >= 4:
+            return SegmentoRFM.NO_PERDER
+        return SegmentoRFM.EN_RIESGO if f >= 3 else SegmentoRFM.HIBERNANDO
+    if f >= 4:
+        return SegmentoRFM.LEALES
+    if r >= 4:
+        return SegmentoRFM.POTENCIALES
+    return SegmentoRFM.NECESITAN_ATENCION
+
+
+def cargar(ahora, lote=LOTE):
+    # Columnas de todos los clientes; recencia -1 para los que nunca vinieron
+    ids, recencia, frecuencia, monetario = array('q'), array('q'), array('q'), array('d')
+    ultimo = 0
+    while True:
+        filas = list(
+            Cliente.objects.filter(pk__gt=ultimo).order_by('pk')
+            .values_list('cliente_id', 'ultima_visita', 'visitas', 'gasto_total')[:lote]
+        )
+        if not filas:
+            return ids, recencia, frecuencia, monetario
+        for cliente_id, ultima_visita, visitas, gasto_total in filas:
+            ids.append(cliente_id)
+            recencia.append(max((ahora - ultima_visita).days, 0) if ultima_visita else -1)
+            frecuencia.append(visitas)
+            monetario.append(float(gasto_total))
+        ultimo = filas[-1][0]
+
+
+def _guardar(segmentos):
+    lotes.insertar_o_actualizar(SegmentoCliente, segmentos, 'cliente', CAMPOS)
+
+
+def calcular(lote=LOTE):
+    ahora = timezone.now()
+    ids, recencia, frecuencia, monetario = cargar(ahora, lote)
+    # Cortes entre los clientes con visitas. Menos días desde la última visita es
+    # mejor: la recencia se puntúa invertida. Los días crecen al retroceder la
+    # última visita, así que sus cortes salen de ultima_visita en orden descendente.
+    con_visitas = sum(1 for dias in recencia if dias >= 0)
+    cortes_r = cortes('ultima_visita', con_visitas, lambda fecha: max((ahora - fecha).days, 0), descendente=True)
+    cortes_f = cortes('visitas', con_visitas, int)
+    cortes_m = cortes('gasto_total', con_visitas, float)
+
+    conteo = Counter()
+    pendientes = []
+    for indice, cliente_id in enumerate(ids):
+        dias = recencia[indice]
+        if dias < 0:
+            r = f = m = 0
+        else:
+            r = QUINTILES + 1 - puntuar(dias, cortes_r)
+            f = puntuar(frecuencia[indice], cortes_f)
+            m = puntuar(monetario[indice], cortes_m)
+        nombre = segmento(r, f, m)
+        conteo[nombre] += 1
+        pendientes.append(SegmentoCliente(
+            cliente_id=cliente_id, segmento=nombre, recencia_dias=dias if dias >= 0 else None,
+            frecuencia=frecuencia[indice], monetario=Decimal(str(monetario[indice])),
+            puntuacion_r=r, puntuacion_f=f, puntuacion_m=m, calculado_en=ahora,
+        ))
+        if len(pendientes) >= lote:
+            _guardar(pendientes)
+            pendientes = []
+    if pendientes:
+        _guardar(pendientes)
+    return {
+        'clientes': len(ids),
+        'cortes': {'recencia_dias': cortes_r, 'frecuencia': cortes_f, 'monetario': cortes_m},
+        'segmentos': {nombre.value: conteo[nombre] for nombre in SegmentoRFM},
+    }
@@ -0,0 +1,125 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import (
+    auditoria, busqueda_clientes, catalogo, dashboard, duracion_citas, graficos, inventario, resumen_ventas,
+    visitas_clientes,
+)
+from .models import Cita, Cliente, DetalleCita, MovimientoInventario, Producto, Servicio, Venta
+
+CAMPOS_VENTA_ANTERIOR = tuple(dict.fromkeys(resumen_ventas.CAMPOS_VENTA + visitas_clientes.CAMPOS_VENTA))
+
+
+# Resumen diario de ventas y visitas del cliente: se descuenta el aporte anterior
+# de la venta y se suma el nuevo. La fila guardada se lee una sola vez para ambos.
+@receiver(pre_save, sender=Venta)
+def guardar_aporte_anterior_venta(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    guardada = Venta.objects.filter(pk=instance.pk).values(*CAMPOS_VENTA_ANTERIOR).first() if instance.pk else None
+    instance._aporte_anterior = resumen_ventas.aporte(guardada) if guardada else None
+    instance._visita_anterior = visitas_clientes.aporte_venta(guardada) if guardada else None
+
+
+@receiver(post_save, sender=Venta)
+def actualizar_resumen_venta(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_aporte_anterior', None)
+    resumen_ventas.registrar_cambio(anterior, resumen_ventas.aporte(instance))
+    instance._aporte_anterior = resumen_ventas.aporte(instance)
+    actual = visitas_clientes.aporte_venta(instance)
+    visitas_clientes.registrar_cambio(getattr(instance, '_visita_anterior', None), actual)
+    instance._visita_anterior = actual
+
+
+@receiver(post_delete, sender=Venta)
+def descontar_resumen_venta(sender, instance, **kwargs):
+    resumen_ventas.registrar_cambio(resumen_ventas.aporte(instance), None)
+    visitas_clientes.registrar_cambio(visitas_clientes.aporte_venta(instance), None)
+
+
+# Visitas del cliente: una cita cuenta al pasar a completada (ver visitas_clientes.py).
+@receiver(pre_save, sender=Cita)
+def guardar_visita_anterior_cita(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    guardada = Cita.objects.filter(pk=instance.pk).values(*visitas_clientes.CAMPOS_CITA).first() if instance.pk else None
+    instance._visita_anterior = visitas_clientes.aporte_cita(guardada) if guardada else None
+
+
+@receiver(post_save, sender=Cita)
+def actualizar_visitas_cita(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    actual = visitas_clientes.aporte_cita(instance)
+    visitas_clientes.registrar_cambio(getattr(instance, '_visita_anterior', None), actual)
+    instance._visita_anterior = actual
+
+
+@receiver(post_delete, sender=Cita)
+def descontar_visita_cita(sender, instance, **kwargs):
+    visitas_clientes.registrar_cambio(visitas_clientes.aporte_cita(instance), None)
+
+
+# Stock en la aplicación: cada movimiento nuevo suma o resta su cantidad a productos.stock_actual.
+@receiver(post_save, sender=MovimientoInventario)
+def aplicar_movimiento_inventario(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    inventario.aplicar_movimiento(instance)
+
+
+# Duración de la cita: se recalcula una vez por cita al confirmar la transacción (ver duracion_citas.py).
+# Una línea que pasa a otra cita marca también la anterior.
+@receiver(pre_save, sender=DetalleCita)
+def guardar_cita_anterior_detalle(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    instance._cita_anterior = (
+        DetalleCita.objects.filter(pk=instance.pk).values_list('cita_id', flat=True).first() if instance.pk else None
+    )
+
+
+@receiver([post_save, post_delete], sender=DetalleCita)
+def marcar_duracion_cita(sender, instance, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    duracion_citas.marcar(instance.cita_id, using)
+    anterior = getattr(instance, '_cita_anterior', None)
+    if anterior != instance.cita_id:
+        duracion_citas.marcar(anterior, using)
+    instance._cita_anterior = instance.cita_id
+
+
+# Índice de búsqueda de clientes; al borrar un cliente sus términos se borran en cascada.
+@receiver(post_save, sender=Cliente)
+def indexar_cliente(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    busqueda_clientes.indexar_cliente(instance)
+
+
+# Catálogo en memoria: cualquier cambio de un servicio o producto (también los
+# guardados y la edición en lista del admin) renueva el sello al confirmar.
+@receiver([post_save, post_delete], sender=Servicio)
+@receiver([post_save, post_delete], sender=Producto)
+def invalidar_catalogo(sender, using=None, **kwargs):
+    catalogo.invalidar(using)
+
+
+# Caché del dashboard: cada cambio invalida, al confirmar la transacción, solo los
+# widgets que dependen del modelo y registra el momento del cambio para los gráficos.
+def invalidar_widgets_dashboard(sender, raw=False, using=None, **kwargs):
+    if raw:
+        return
+    dashboard.invalidar_modelo(sender, using)
+
+
+for modelo in set(dashboard.MODELOS_OBSERVADOS) | set(graficos.MODELOS):
+    post_save.connect(invalidar_widgets_dashboard, sender=modelo, dispatch_uid=f'dashboard_save_{modelo.__name__}')
+    post_delete.connect(invalidar_widgets_dashboard, sender=modelo, dispatch_uid=f'dashboard_delete_{modelo.__name__}')
+
+
+# Auditoría a nivel de aplicación (ver auditoria.py)
+auditoria.conectar()
@@ -0,0 +1,175 @@
+// Gráficos de tendencia del dashboard.
+// Cada contenedor .grafico-dashboard indica en data-url la serie de la API de
+// gráficos del admin (JSON por columnas: periodos + series) y en data-tipo cómo
+// dibujarla ('lineas' o 'barras' apiladas). Se dibujan en SVG sin librerías.
+// El navegador revalida con el ETag: si la serie no cambió la API responde 304.
+(function () {
+    'use strict';
+
+    var SVG = 'http://www.w3.org/2000/svg';
+    var ANCHO = 640;
+    var ALTO = 220;
+    var MARGEN = {arriba: 10, derecha: 10, abajo: 24, izquierda: 56};
+    var COLORES = ['#007bff', '#28a745', '#dc3545', '#ffc107', '#17a2b8', '#6f42c1', '#fd7e14'];
+
+    function elemento(nombre, atributos, padre) {
+        var nodo = document.createElementNS(SVG, nombre);
+        Object.keys(atributos).forEach(function (clave) {
+            nodo.setAttribute(clave, atributos[clave]);
+        });
+        if (padre) {
+            padre.appendChild(nodo);
+        }
+        return nodo;
+    }
+
+    function formatear(valor) {
+        return valor.toLocaleString(undefined, {maximumFractionDigits: 2});
+    }
+
+    function ejes(svg, datos, maximo) {
+        var alto = ALTO - MARGEN.arriba - MARGEN.abajo;
+        [0, 0.5, 1].forEach(function (fraccion) {
+            var y = MARGEN.arriba + alto * (1 - fraccion);
+            elemento('line', {x1: MARGEN.izquierda, x2: ANCHO - MARGEN.derecha, y1: y, y2: y, stroke: '#eee'}, svg);
+            elemento('text', {x: MARGEN.izquierda - 6, y: y + 4, 'text-anchor': 'end', 'font-size': 11}, svg)
+                .textContent = formatear(maximo * fraccion);
+        });
+        var periodos = datos.periodos;
+        [0, periodos.length - 1].forEach(function (indice, posicion) {
+            elemento('text', {
+                x: posicion ? ANCHO - MARGEN.derecha : MARGEN.izquierda,
+                y: ALTO - 6,
+                'text-anchor': posicion ? 'end' : 'start',
+                'font-size': 11
+            }, svg).textContent = periodos[indice];
+        });
+    }
+
+    function escalaX(cantidad) {
+        var ancho = ANCHO - MARGEN.izquierda - MARGEN.derecha;
+        return function (indice) {
+            return MARGEN.izquierda + (cantidad > 1 ? ancho * indice / (cantidad - 1) : ancho / 2);
+        };
+    }
+
+    function escalaY(maximo) {
+        var alto = ALTO - MARGEN.arriba - MARGEN.abajo;
+        return function (valor) {
+            return MARGEN.arriba + alto * (1 - (maximo ? valor / maximo : 0));
+        };
+    }
+
+    function lineas(svg, datos, series) {
+        var maximo = Math.max.apply(null, [0].concat.apply([], series.map(function (serie) {
+            return serie.valores;
+        })));
+        var x = escalaX(datos.periodos.length);
+        var y = escalaY(maximo);
+        ejes(svg, datos, maximo);
+        series.forEach(function (serie, numero) {
+            var puntos = serie.valores.map(function (valor, indice) {
+                return x(indice).toFixed(1) + ',' + y(valor).toFixed(1);
+            });
+            elemento('polyline', {
+                points: puntos.join(' '), fill: 'none', stroke: COLORES[numero % COLORES.length], 'stroke-width': 1.5
+            }, svg);
+        });
+    }
+
+    function barras(svg, datos, series) {
+        var cantidad = datos.periodos.length;
+        var totales = datos.periodos.map(function (periodo, indice) {
+            return series.reduce(function (suma, serie) {
+                return suma + serie.valores[indice];
+            }, 0);
+        });
+        var maximo = Math.max.apply(null, [0].concat(totales));
+        var ancho = (ANCHO - MARGEN.izquierda - MARGEN.derecha) / cantidad;
+        var y = escalaY(maximo);
+        ejes(svg, datos, maximo);
+        var base = datos.periodos.map(function () {
+            return 0;
+        });
+        series.forEach(function (serie, numero) {
+            serie.valores.forEach(function (valor, indice) {
+                if (!valor) {
+                    return;
+                }
+                var barra = elemento('rect', {
+                    x: MARGEN.izquierda + ancho * indice,
+                    y: y(base[indice] + valor),
+                    width: Math.max(ancho - 1, 0.5),
+                    height: y(base[indice]) - y(base[indice] + valor),
+                    fill: COLORES[numero % COLORES.length]
+                }, svg);
+                elemento('title', {}, barra).textContent = datos.periodos[indice] + ' · ' + serie.nombre + ': ' + valor;
+                base[indice] += valor;
+            });
+        });
+    }
+
+    function leyenda(contenedor, series) {
+        var lista = document.createElement('div');
+        lista.className = 'grafico-leyenda';
+        series.forEach(function (serie, numero) {
+            var item = document.createElement('span');
+            item.style.marginRight = '12px';
+            item.innerHTML = '<span style="display:inline-block;width:10px;height:10px;margin-right:4px;background:' +
+                COLORES[numero % COLORES.length] + '"></span>';
+            item.appendChild(document.createTextNode(serie.nombre));
+            lista.appendChild(item);
+        });
+        contenedor.appendChild(lista);
+    }
+
+    function dibujar(contenedor, datos) {
+        // data-series limita las series dibujadas (por ejemplo "0" para solo los ingresos)
+        var indices = contenedor.dataset.series;
+        var series = indices ? indices.split(',').map(function (indice) {
+            return datos.series[Number(indice)];
+        }) : datos.series;
+        contenedor.innerHTML = '';
+        var svg = elemento('svg', {viewBox: '0 0 ' + ANCHO + ' ' + ALTO, width: '100%', role: 'img'});
+        if (contenedor.dataset.tipo === 'barras') {
+            barras(svg, datos, series);
+        } else {
+            lineas(svg, datos, series);
+        }
+        contenedor.appendChild(svg);
+        leyenda(contenedor, series);
+    }
+
+    function cargar(contenedor, agrupacion) {
+        var url = contenedor.dataset.url + '?agrupacion=' + encodeURIComponent(agrupacion);
+        fetch(url, {credentials: 'same-origin', headers: {'Accept': 'application/json'}})
+            .then(function (respuesta) {
+                if (!respuesta.ok) {
+                    throw new Error(respuesta.status);
+                }
+                return respuesta.json();
+            })
+            .then(function (datos) {
+                dibujar(contenedor, datos);
+            })
+            .catch(function () {
+                contenedor.textContent = 'No se pudo cargar el gráfico.';
+            });
+    }
+
+    function cargarTodos() {
+        var selector = document.getElementById('agrupacion-graficos');
+        var agrupacion = selector ? selector.value : 'dia';
+        document.querySelectorAll('.grafico-dashboard').forEach(function (contenedor) {
+            cargar(contenedor, agrupacion);
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        var selector = document.getElementById('agrupacion-graficos');
+        if (selector) {
+            selector.addEventListener('change', cargarTodos);
+        }
+        cargarTodos();
+    });
+}());
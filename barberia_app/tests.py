@@ -1,3 +1,1559 @@
-from django.test import TestCase
+import csv
+import json
+import tempfile
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from time import monotonic, sleep
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.db import DatabaseError, OperationalError, connection, connections, router, transaction
+from django.db.models import Max, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    archivo_auditoria, auditoria, busqueda_clientes, catalogo, checks, comisiones, dashboard, disponibilidad,
+    duracion_citas, exportacion, fechas, generacion_ventas, graficos, importacion, inventario, replicas, reposicion,
+    segmentos_clientes, visitas_clientes,
+)
+from .admin import PaginadorSinConteo
+from .models import (
+    Auditoria, Cita, Cliente, DetalleCita, DetalleVenta, Empleado, HorarioEmpleado, MovimientoInventario,
+    PeriodoComision, Producto, PronosticoReposicion, ResumenVentaDiario, SegmentoCliente, Servicio, Venta,
+)
+
+
+def limpiar_caches():
+    # Widgets, marcas de cambio y sello del catálogo viven en la caché compartida
+    for cache in caches.all():
+        cache.clear()
+
+
+class DatosMixin:
+    # Filas mínimas para los tests de reglas de negocio. Los empleados trabajan
+    # de 9 a 18 todos los días salvo que se indique otro turno.
+
+    def setUp(self):
+        super().setUp()
+        limpiar_caches()
+        self.secuencia = 0
+
+    def _siguiente(self):
+        self.secuencia += 1
+        return self.secuencia
+
+    def crear_cliente(self):
+        n = self._siguiente()
+        return Cliente.objects.create(nombre=f'Cliente{n}', apellido='Prueba', telefono=f'900{n:06d}')
+
+    def crear_empleado(self, turnos=((time(9), time(18)),), descansos=(), **campos):
+        n = self._siguiente()
+        empleado = Empleado.objects.create(
+            nombre=f'Empleado{n}', apellido='Prueba', telefono=f'800{n:06d}',
+            puesto='Barbero', fecha_contratacion=date(2024, 1, 1), **campos,
+        )
+        HorarioEmpleado.objects.bulk_create([
+            HorarioEmpleado(
+                empleado=empleado, dia_semana=dia, hora_inicio=desde, hora_fin=hasta, es_descanso=es_descanso,
+            )
+            for dia in range(1, 8)
+            for es_descanso, franjas in ((False, turnos), (True, descansos))
+            for desde, hasta in franjas
+        ])
+        return empleado
+
+    def crear_servicio(self, precio=20, duracion=30):
+        n = self._siguiente()
+        return Servicio.objects.create(
+            nombre=f'Servicio{n}', duracion_minutos=duracion, precio=precio, categoria='Cortes',
+        )
+
+    def crear_producto(self, precio=10):
+        n = self._siguiente()
+        return Producto.objects.create(
+            nombre=f'Producto{n}', categoria='Ceras', precio_venta=precio, precio_costo=precio / 2, stock_actual=20,
+        )
+
+    def crear_cita(self, empleado, inicio, servicios=(), estado='completada', cliente=None):
+        cita = Cita.objects.create(
+            cliente=cliente or self.crear_cliente(), empleado=empleado, fecha_hora=inicio,
+            duracion_total=sum(servicio.duracion_minutos for servicio in servicios) or 30, estado=estado,
+        )
+        for servicio in servicios:
+            DetalleCita.objects.create(
+                cita=cita, servicio=servicio, precio_aplicado=servicio.precio, duracion_minutos=servicio.duracion_minutos,
+            )
+        return cita
+
+    def a_las(self, hora, minuto=0, dias=1):
+        # Momento aware en hora local, 'dias' después de hoy
+        return timezone.make_aware(datetime.combine(fechas.hoy() + timedelta(days=dias), time(hora, minuto)))
+
+
+class ChangelistQueryCountTests(TestCase):
+    # El número de consultas de cada changelist no debe depender de cuántas filas muestre.
+
+    def setUp(self):
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        self.client.force_login(self.usuario)
+        self.secuencia = 0
+
+    def _siguiente(self):
+        self.secuencia += 1
+        return self.secuencia
+
+    def _cliente(self):
+        n = self._siguiente()
+        return Cliente.objects.create(nombre=f'Cliente{n}', apellido='Prueba', telefono=f'900{n:06d}')
+
+    def _empleado(self):
+        n = self._siguiente()
+        return Empleado.objects.create(
+            nombre=f'Empleado{n}', apellido='Prueba', telefono=f'800{n:06d}',
+            puesto='Barbero', fecha_contratacion=date(2024, 1, 1),
+        )
+
+    def _producto(self):
+        n = self._siguiente()
+        return Producto.objects.create(
+            nombre=f'Producto{n}', categoria='Ceras', precio_venta=10, precio_costo=5, stock_actual=20,
+        )
+
+    def _crear_citas(self, cantidad):
+        for _ in range(cantidad):
+            cita = Cita.objects.create(
+                cliente=self._cliente(),
+                empleado=self._empleado(),
+                fecha_hora=timezone.now() + timedelta(minutes=self._siguiente()),
+                duracion_total=30,
+                estado='completada',
+            )
+            # La mitad de las citas ya tiene venta asociada
+            if cita.pk % 2:
+                Venta.objects.create(
+                    cliente=cita.cliente, empleado=cita.empleado, cita=cita,
+                    subtotal=20, total=20, metodo_pago='efectivo',
+                )
+
+    def _crear_ventas(self, cantidad):
+        for _ in range(cantidad):
+            Venta.objects.create(
+                cliente=self._cliente(), empleado=self._empleado(),
+                subtotal=15, total=15, metodo_pago='efectivo',
+            )
+
+    def _crear_movimientos(self, cantidad):
+        empleado = self._empleado()
+        for _ in range(cantidad):
+            venta = Venta.objects.create(empleado=empleado, subtotal=10, total=10, metodo_pago='efectivo')
+            MovimientoInventario.objects.create(
+                producto=self._producto(), tipo_movimiento='salida_venta', cantidad=1,
+                empleado=self._empleado(), venta=venta,
+            )
+
+    def _crear_horarios(self, cantidad):
+        for _ in range(cantidad):
+            HorarioEmpleado.objects.create(
+                empleado=self._empleado(), dia_semana=1, hora_inicio=time(9), hora_fin=time(18),
+            )
+
+    def _consultas(self, modelo):
+        url = reverse(f'barberia_admin:barberia_app_{modelo}_changelist')
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas)
+
+    def _assert_constante(self, modelo, crear):
+        crear(2)
+        pocas = self._consultas(modelo)
+        crear(10)
+        self.assertEqual(self._consultas(modelo), pocas)
+
+    def test_cita_changelist(self):
+        self._assert_constante('cita', self._crear_citas)
+
+    def test_venta_changelist(self):
+        self._assert_constante('venta', self._crear_ventas)
+
+    def test_movimiento_inventario_changelist(self):
+        self._assert_constante('movimientoinventario', self._crear_movimientos)
+
+    def test_horario_empleado_changelist(self):
+        self._assert_constante('horarioempleado', self._crear_horarios)
+
+
+class DashboardQueryCountTests(TestCase):
+    # Cada widget del dashboard sale de un número fijo de consultas, haya las filas
+    # que haya: citas de hoy, empleados, productos bajo stock, ventas (hoy y semana),
+    # más vendidos (una por servicios y otra por productos, con LIMIT) y actividad
+    # reciente. La base es la sesión, el usuario y sus permisos (jazzmin los lee
+    # para los enlaces del menú).
+    CONSULTAS_BASE = 4
+    CONSULTAS_SIN_CACHE = CONSULTAS_BASE + 7
+
+    def setUp(self):
+        limpiar_caches()
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        self.client.force_login(self.usuario)
+        self.servicio = Servicio.objects.create(nombre='Corte', duracion_minutos=30, precio=20, categoria='Cortes')
+        self.secuencia = 0
+
+    def _crear_datos(self, cantidad):
+        for _ in range(cantidad):
+            self.secuencia += 1
+            n = self.secuencia
+            cliente = Cliente.objects.create(nombre=f'Cliente{n}', apellido='Prueba', telefono=f'900{n:06d}')
+            empleado = Empleado.objects.create(
+                nombre=f'Empleado{n}', apellido='Prueba', telefono=f'800{n:06d}',
+                puesto='Barbero', fecha_contratacion=date(2024, 1, 1),
+            )
+            producto = Producto.objects.create(
+                nombre=f'Producto{n}', categoria='Ceras', precio_venta=10, precio_costo=5, stock_actual=1,
+            )
+            Cita.objects.create(
+                cliente=cliente, empleado=empleado, duracion_total=30,
+                fecha_hora=fechas.inicio_del_dia(fechas.hoy()) + timedelta(hours=9, minutes=n),
+            )
+            venta = Venta.objects.create(
+                cliente=cliente, empleado=empleado, subtotal=30, total=30, metodo_pago='efectivo',
+            )
+            DetalleVenta.objects.create(
+                venta=venta, tipo='servicio', servicio=self.servicio, precio_unitario=20, subtotal_linea=20,
+            )
+            DetalleVenta.objects.create(
+                venta=venta, tipo='producto', producto=producto, precio_unitario=10, subtotal_linea=10,
+            )
+
+    def _consultas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('barberia_admin:index'))
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta, len(consultas)
+
+    def test_consultas_fijas_sin_cache(self):
+        self._crear_datos(2)
+        respuesta, consultas = self._consultas()
+        self.assertEqual(consultas, self.CONSULTAS_SIN_CACHE)
+        self.assertEqual(len(respuesta.context['citas_hoy']), 2)
+        self.assertEqual(respuesta.context['ventas_hoy'], {'cantidad': 2, 'total': 60})
+        self.assertEqual(respuesta.context['servicios_populares'][0]['total'], 2)
+        self.assertEqual(len(respuesta.context['productos_populares']), 2)
+
+        self._crear_datos(10)
+        limpiar_caches()
+        respuesta, consultas = self._consultas()
+        self.assertEqual(consultas, self.CONSULTAS_SIN_CACHE)
+        self.assertEqual(len(respuesta.context['citas_hoy']), 12)
+        self.assertEqual(len(respuesta.context['productos_populares']), 5)
+
+    def test_populares_limitados_en_la_consulta(self):
+        self._crear_datos(7)
+        with CaptureQueriesContext(connection) as consultas:
+            populares = dashboard.obtener('populares')
+        self.assertEqual((len(populares['servicios']), len(populares['productos'])), (1, 5))
+        self.assertEqual(len(consultas), 2)
+        self.assertTrue(all('LIMIT 5' in consulta['sql'] for consulta in consultas))
+
+    def test_con_cache_sin_consultas_de_widgets(self):
+        self._crear_datos(2)
+        self._consultas()
+        self.assertEqual(self._consultas()[1], self.CONSULTAS_BASE)
+
+    def test_widgets_en_la_cache_compartida(self):
+        # Widgets, contadores y marcas de cambio van al alias configurado, no a la caché del proceso
+        self._crear_datos(1)
+        self._consultas()
+        clave = dashboard._clave('ventas', fechas.hoy())
+        self.assertIsNotNone(caches['compartida'].get(clave))
+        self.assertIsNone(caches['default'].get(clave))
+        self.assertEqual(dashboard.estadisticas()['ventas']['misses'], 1)
+        self.assertIsNotNone(caches['compartida'].get(dashboard._clave_cambio(Venta)))
+
+    def test_invalidacion_al_confirmar(self):
+        # Antes del commit otra petición recalcularía el widget con los datos viejos
+        self._crear_datos(1)
+        self._consultas()
+        with self.captureOnCommitCallbacks(execute=True):
+            Empleado.objects.update(estado='inactivo')
+            Empleado.objects.get().save()
+            self.assertEqual(self._consultas()[1], self.CONSULTAS_BASE)
+        self.assertEqual(dashboard.obtener('empleados_disponibles'), [])
+
+    @override_settings(TIME_ZONE='America/Lima')
+    def test_citas_hoy_por_dia_local(self):
+        # 23:30 en Lima ya es el día siguiente en UTC; 00:30 en Lima aún es ayer en UTC
+        hoy = fechas.hoy()
+        self._crear_datos(1)
+        cita = Cita.objects.get()
+        for minutos, incluida in ((-30, False), (30, True), (23 * 60 + 30, True), (24 * 60 + 30, False)):
+            Cita.objects.filter(pk=cita.pk).update(fecha_hora=fechas.inicio_del_dia(hoy) + timedelta(minutes=minutos))
+            limpiar_caches()
+            with CaptureQueriesContext(connection) as consultas:
+                citas = dashboard.obtener('citas_hoy')
+            self.assertEqual(len(citas) == 1, incluida, minutos)
+            tabla = f"FROM {connection.ops.quote_name('citas')}"
+            sql = next(consulta['sql'] for consulta in consultas if tabla in consulta['sql'])
+            self.assertNotIn('django_datetime_cast_date', sql)
+
+
+def _replica_propia():
+    replica = settings.DATABASES.get(replicas.configuracion()['ALIAS'])
+    return replica is not None and not replica.get('TEST', {}).get('MIRROR')
+
+
+@skipUnless(_replica_propia(), "Requiere un alias 'replica' con base propia, como en barberia_project.settings_test")
+class ReplicaRoutingTests(TransactionTestCase):
+    # Primario y réplica son bases distintas sin replicación entre ellas: cada
+    # test escribe datos diferentes en cada una para saber de dónde se leyó.
+    # Sin réplica la clase se omite, pero el runner igual prepararía las bases de 'databases'
+    databases = {'default', 'replica'} if _replica_propia() else {'default'}
+
+    def setUp(self):
+        limpiar_caches()
+        self.usuario = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+        User.objects.using('replica').bulk_create([User.objects.get(pk=self.usuario.pk)])
+        self.client.force_login(self.usuario)
+        Cliente.objects.create(nombre='Primario', apellido='Prueba', telefono='900000001')
+        empleado = Empleado(
+            nombre='Empleado', apellido='Replica', telefono='800000001',
+            puesto='Barbero', fecha_contratacion=date(2024, 1, 1),
+        )
+        Empleado.objects.using('replica').bulk_create([empleado])
+        cliente = Cliente(pk=1000, nombre='Replica', apellido='Prueba', telefono='900000002')
+        Cliente.objects.using('replica').bulk_create([cliente])
+        Venta.objects.using('replica').bulk_create([
+            Venta(cliente_id=cliente.pk, empleado_id=empleado.pk, subtotal=20, total=20, metodo_pago='efectivo'),
+        ])
+
+    def tearDown(self):
+        # Las entradas de auditoría de estos datos se guardan antes de vaciar las bases
+        auditoria.buffer.vaciar(esperar=True)
+        super().tearDown()
+
+    def _nombres(self):
+        return set(Cliente.objects.values_list('nombre', flat=True))
+
+    def _exportar(self):
+        with CaptureQueriesContext(connections['replica']) as en_replica:
+            respuesta = self.client.get(reverse('exportar', args=['ventas']))
+            contenido = b''.join(respuesta.streaming_content).decode()
+        self.assertEqual(respuesta.status_code, 200)
+        return contenido, len(en_replica)
+
+    def test_lecturas_marcadas_van_a_la_replica(self):
+        self.assertEqual(self._nombres(), {'Primario'})
+        with replicas.lectura():
+            self.assertEqual(self._nombres(), {'Replica'})
+        self.assertEqual(self._nombres(), {'Primario'})
+
+    def test_escrituras_van_al_primario(self):
+        with replicas.lectura():
+            cliente = Cliente.objects.get(nombre='Replica')
+            self.assertEqual(router.db_for_write(Cliente, instance=cliente), 'default')
+            cliente.save()
+        self.assertEqual(self._nombres(), {'Primario', 'Replica'})
+
+    def test_transaccion_abierta_lee_del_primario(self):
+        with transaction.atomic(), replicas.lectura():
+            self.assertEqual(self._nombres(), {'Primario'})
+
+    @override_settings(BARBERIA_REPLICA={'PEGAJOSIDAD': 0})
+    def test_exportacion_dashboard_y_auditoria_leen_de_la_replica(self):
+        contenido, consultas = self._exportar()
+        self.assertIn('Replica Prueba', contenido)
+        self.assertGreater(consultas, 0)
+        for url in (reverse('barberia_admin:index'), reverse('barberia_admin:barberia_app_auditoria_changelist')):
+            with CaptureQueriesContext(connections['replica']) as en_replica:
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertGreater(len(en_replica), 0, url)
+
+    def test_cache_del_dashboard_se_recalcula_en_el_primario_tras_un_cambio(self):
+        # El empleado solo está en la réplica: el widget recalculado justo después
+        # del cambio no debe verlo (la réplica aún podría ir retrasada)
+        dashboard.registrar_cambio(Empleado)
+        respuesta = self.client.get(reverse('barberia_admin:index'))
+        self.assertEqual(respuesta.context['empleados_disponibles'], [])
+        with override_settings(BARBERIA_REPLICA={'PEGAJOSIDAD': 0}):
+            dashboard.registrar_cambio(Empleado)
+            respuesta = self.client.get(reverse('barberia_admin:index'))
+        self.assertEqual([empleado.apellido for empleado in respuesta.context['empleados_disponibles']], ['Replica'])
+
+    def test_sesion_lee_del_primario_despues_de_un_post(self):
+        self.client.post(reverse('barberia_admin:rendimiento'), {'reiniciar': '1'})
+        contenido, consultas = self._exportar()
+        self.assertNotIn('Replica Prueba', contenido)
+        self.assertEqual(consultas, 0)
+
+    def test_pegajosidad_vencida_vuelve_a_la_replica(self):
+        with override_settings(BARBERIA_REPLICA={'PEGAJOSIDAD': 0}):
+            self.client.post(reverse('barberia_admin:rendimiento'), {'reiniciar': '1'})
+        contenido, consultas = self._exportar()
+        self.assertIn('Replica Prueba', contenido)
+        self.assertGreater(consultas, 0)
+
+
+class GeneracionVentasTests(DatosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.empleado = self.crear_empleado()
+        self.servicios = [self.crear_servicio(precio=20), self.crear_servicio(precio=15)]
+
+    def _cambios(self):
+        # Cambios registrados en el dashboard por modelo (también usados por los gráficos)
+        return mock.patch.object(dashboard, 'registrar_cambio', wraps=dashboard.registrar_cambio)
+
+    def _populares_en_cache(self):
+        dashboard.obtener('populares')
+        return dashboard._cache().get(dashboard._clave('populares', fechas.hoy())) is not None
+
+    def test_venta_desde_cita(self):
+        cita = self.crear_cita(self.empleado, self.a_las(10, dias=-1), self.servicios)
+        self.assertTrue(self._populares_en_cache())
+        with self._cambios() as cambios, self.captureOnCommitCallbacks(execute=True):
+            venta, creada = generacion_ventas.generar_venta_desde_cita(cita.pk)
+        self.assertIn(mock.call(DetalleVenta), cambios.call_args_list)
+        self.assertTrue(creada)
+        self.assertEqual(venta.total, 35)
+        self.assertEqual(
+            sorted(DetalleVenta.objects.filter(venta=venta).values_list('servicio_id', 'subtotal_linea')),
+            sorted((servicio.pk, servicio.precio) for servicio in self.servicios),
+        )
+        # Las líneas se insertan con bulk_create: el widget de más vendidos se invalida igual
+        self.assertIsNone(dashboard._cache().get(dashboard._clave('populares', fechas.hoy())))
+        self.assertEqual(dashboard.obtener('populares')['servicios'][0]['total'], 1)
+        self.assertEqual(generacion_ventas.generar_venta_desde_cita(cita.pk), (venta, False))
+
+    def test_venta_creada_por_otra_peticion(self):
+        # La comprobación previa no ve la venta (carrera); la restricción única sobre
+        # ventas.cita_id hace fallar el INSERT y se devuelve la venta existente
+        cita = self.crear_cita(self.empleado, self.a_las(10, dias=-1), self.servicios)
+        existente = Venta.objects.create(
+            cliente=cita.cliente, empleado=self.empleado, cita=cita, subtotal=35, total=35, metodo_pago='efectivo',
+        )
+        sin_venta = mock.Mock(**{'first.return_value': None})
+        with mock.patch.object(Venta.objects, 'filter', return_value=sin_venta):
+            venta, creada = generacion_ventas.generar_venta_desde_cita(cita.pk)
+        self.assertEqual((venta, creada), (existente, False))
+        self.assertEqual(Venta.objects.count(), 1)
+        self.assertFalse(DetalleVenta.objects.exists())
+
+    def test_ventas_en_lote(self):
+        citas = [self.crear_cita(self.empleado, self.a_las(10 + n, dias=-1), self.servicios) for n in range(3)]
+        facturada = self.crear_cita(self.empleado, self.a_las(15, dias=-1), self.servicios)
+        generacion_ventas.generar_venta_desde_cita(facturada.pk)
+        self.crear_cita(self.empleado, self.a_las(16, dias=-1), self.servicios, estado='pendiente')
+        self.assertTrue(self._populares_en_cache())
+        with self._cambios() as cambios, self.captureOnCommitCallbacks(execute=True):
+            creadas = generacion_ventas.generar_ventas_en_lote(Cita.objects.all(), batch_size=2)
+        self.assertIn(mock.call(DetalleVenta), cambios.call_args_list)
+        self.assertEqual(creadas, 3)
+        self.assertEqual(
+            set(Venta.objects.values_list('cita_id', flat=True)), {cita.pk for cita in citas} | {facturada.pk},
+        )
+        self.assertEqual(DetalleVenta.objects.count(), 8)
+        self.assertEqual(set(Venta.objects.values_list('total', flat=True)), {35})
+        self.assertIsNone(dashboard._cache().get(dashboard._clave('populares', fechas.hoy())))
+        self.assertEqual(generacion_ventas.generar_ventas_en_lote(Cita.objects.all()), 0)
+
+
+class BufferAuditoriaTests(TestCase):
+    def setUp(self):
+        self.buffer = auditoria.BufferAuditoria()
+
+    def _entradas(self, cantidad):
+        for n in range(cantidad):
+            self.buffer.agregar(auditoria._entrada(Cliente, 'INSERT', n, nuevos={'cliente_id': n}))
+
+    def _fallando(self):
+        return mock.patch.object(Auditoria.objects, 'bulk_create', side_effect=DatabaseError('caída'))
+
+    @override_settings(BARBERIA_AUDITORIA={'TAMANO_LOTE': 2, 'INTERVALO': 60})
+    def test_error_de_bd_conserva_el_lote(self):
+        with self._fallando(), self.assertLogs('barberia_app.auditoria', 'ERROR'):
+            self._entradas(3)
+        self.assertEqual(len(self.buffer), 3)
+        self.assertEqual(self.buffer.vaciar(), 3)
+        self.assertEqual(len(self.buffer), 0)
+        self.assertEqual(sorted(Auditoria.objects.values_list('registro_id', flat=True)), ['0', '1', '2'])
+
+    @override_settings(BARBERIA_AUDITORIA={'TAMANO_LOTE': 100, 'MAX_PENDIENTES': 5, 'INTERVALO': 60})
+    def test_cota_maxima(self):
+        with self._fallando(), self.assertLogs('barberia_app.auditoria', 'ERROR'):
+            self._entradas(8)
+        self.assertEqual(len(self.buffer), 5)
+        self.assertEqual(self.buffer.descartadas, 3)
+        self.buffer.vaciar()
+        self.assertEqual(sorted(Auditoria.objects.values_list('registro_id', flat=True)), ['3', '4', '5', '6', '7'])
+
+    @override_settings(BARBERIA_AUDITORIA={'TAMANO_LOTE': 100, 'INTERVALO': 0.1})
+    def test_volcado_por_tiempo_sin_peticiones(self):
+        # El hilo del buffer guarda lo pendiente aunque no lleguen más entradas ni peticiones
+        with mock.patch.object(Auditoria.objects, 'bulk_create') as guardar:
+            self.buffer._ultimo_volcado = monotonic()
+            self._entradas(1)
+            limite = monotonic() + 5
+            while len(self.buffer) and monotonic() < limite:
+                sleep(0.05)
+        self.assertEqual(len(self.buffer), 0)
+        guardar.assert_called_once()
+
+
+class AuditoriaTests(TestCase):
+    def _entradas(self, operacion):
+        auditoria.buffer.vaciar(esperar=True)
+        return list(Auditoria.objects.filter(operacion=operacion).values_list('datos_antiguos', 'datos_nuevos'))
+
+    def test_update_con_las_columnas_cambiadas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Cliente.objects.create(nombre='Ana', apellido='Ruiz', telefono='600000001')
+        # Cargar instancias no lee nada más: los valores anteriores se leen al guardar
+        with self.assertNumQueries(1):
+            cliente = Cliente.objects.get(telefono='600000001')
+        cliente.preferencias = 'Degradado'
+        with self.captureOnCommitCallbacks(execute=True):
+            cliente.save()
+            cliente.save()
+        self.assertEqual(self._entradas('UPDATE'), [({'preferencias': None}, {'preferencias': 'Degradado'})])
+
+    def test_update_fields(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cliente = Cliente.objects.create(nombre='Ana', apellido='Ruiz', telefono='600000001')
+        cliente.nombre, cliente.apellido = 'Ana María', 'Ruiz Gil'
+        with self.captureOnCommitCallbacks(execute=True):
+            cliente.save(update_fields=['nombre'])
+        self.assertEqual(self._entradas('UPDATE'), [({'nombre': 'Ana'}, {'nombre': 'Ana María'})])
+
+
+class ArchivoAuditoriaTests(TestCase):
+    def test_meses_intercalados(self):
+        # Los log_id de marzo y abril se intercalan (escritores en varios procesos):
+        # archivar marzo no debe borrar las filas de abril que caen en su rango de ids
+        filas = []
+        for n in range(6):
+            mes = 3 if n % 2 == 0 else 4
+            entrada = auditoria._entrada(Cliente, 'INSERT', n, nuevos={'cliente_id': n})
+            entrada['fecha_hora'] = timezone.make_aware(datetime(2024, mes, 10 + n, 12))
+            filas.append(Auditoria(**entrada))
+        Auditoria.objects.bulk_create(filas)
+        with tempfile.TemporaryDirectory() as directorio:
+            entrada = archivo_auditoria.archivar_mes(date(2024, 3, 1), directorio)
+            self.assertEqual(entrada['filas'], 3)
+            archivadas = list(archivo_auditoria.leer(date(2024, 3, 1), date(2024, 3, 31), directorio))
+        self.assertEqual([fila['registro_id'] for fila in archivadas], ['0', '2', '4'])
+        self.assertEqual(sorted(Auditoria.objects.values_list('registro_id', flat=True)), ['1', '3', '5'])
+
+
+class ImportacionTests(DatosMixin, TestCase):
+    def _importar(self):
+        existente = self.crear_servicio(precio=20)
+        filas = [
+            ['nombre', 'categoria', 'duracion_minutos', 'precio'],
+            [existente.nombre, 'Barba', '45', '25.50'],
+            ['Nuevo', 'Cortes', '30', '12'],
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = importacion.importar('servicios', filas)
+        self.assertEqual(resultado, {'creados': 1, 'actualizados': 1, 'rechazados': 0})
+        existente.refresh_from_db()
+        self.assertEqual((existente.categoria, existente.duracion_minutos, existente.precio), ('Barba', 45, Decimal('25.50')))
+        self.assertEqual(Servicio.objects.get(nombre='Nuevo').precio, 12)
+        self.assertEqual(Servicio.objects.count(), 2)
+
+    def test_upsert_en_la_misma_sentencia(self):
+        self._importar()
+
+    def test_upsert_sin_columnas_de_conflicto(self):
+        # MySQL: se reparte el lote entre bulk_update y bulk_create
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                CaptureQueriesContext(connection) as consultas:
+            self._importar()
+        sentencias = [consulta['sql'] for consulta in consultas.captured_queries]
+        self.assertFalse(any('ON CONFLICT' in sql for sql in sentencias))
+        self.assertTrue(any(sql.startswith('UPDATE') for sql in sentencias))
+
+    def test_rechaza_columnas_mantenidas(self):
+        # visitas, gasto_total y ultima_visita los calcula visitas_clientes.py
+        filas = [['nombre', 'apellido', 'telefono', 'visitas'], ['Ana', 'Ruiz', '600000001', '50']]
+        with self.assertRaisesMessage(ValueError, 'Columnas desconocidas para clientes: visitas'):
+            importacion.importar('clientes', filas)
+        self.assertFalse(Cliente.objects.exists())
+
+
+class InventarioTests(DatosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.producto = self.crear_producto()
+
+    def _stock(self):
+        return Producto.objects.values_list('stock_actual', flat=True).get(pk=self.producto.pk)
+
+    def _mover(self, tipo, cantidad):
+        return MovimientoInventario.objects.create(producto=self.producto, tipo_movimiento=tipo, cantidad=cantidad)
+
+    def test_movimientos_actualizan_el_stock(self):
+        self._mover('entrada', 5)
+        self._mover('salida_venta', 2)
+        self._mover('salida_venta', -1)
+        self.assertEqual(self._stock(), 22)
+        self.assertEqual(inventario.stock_en_fecha(self.producto.pk, fechas.hoy()), 22)
+
+    def test_fallo_al_actualizar_el_stock_deshace_el_movimiento(self):
+        with mock.patch.object(inventario, 'aplicar_movimiento', side_effect=DatabaseError('caída')):
+            with self.assertRaises(DatabaseError):
+                self._mover('entrada', 5)
+        self.assertFalse(MovimientoInventario.objects.exists())
+        self.assertEqual(self._stock(), 20)
+
+
+class GraficosTests(DatosMixin, TestCase):
+    # Series del dashboard (graficos.py y GraficosView)
+    def setUp(self):
+        super().setUp()
+        self.usuario = User.objects.create_user('recepcion', password='clave', is_staff=True)
+        self.usuario.user_permissions.add(Permission.objects.get(codename='view_venta'))
+        self.client.force_login(self.usuario)
+        self.empleado = self.crear_empleado()
+
+    def _get(self, serie='ingresos', **cabeceras):
+        return self.client.get(reverse('barberia_admin:graficos', args=[serie]), self.parametros, **cabeceras)
+
+    @property
+    def parametros(self):
+        return {'desde': (fechas.hoy() - timedelta(days=6)).isoformat(), 'agrupacion': 'dia'}
+
+    def _venta(self, momento, total=20):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Venta.objects.create(
+                empleado=self.empleado, fecha_hora=momento, subtotal=total, total=total, metodo_pago='efectivo',
+            )
+
+    def _local(self, fecha, hora, minuto=0):
+        return timezone.make_aware(datetime.combine(fecha, time(hora, minuto)))
+
+    def test_revalidacion_con_etag(self):
+        self._venta(self.a_las(10, dias=-1))
+        respuesta = self._get()
+        self.assertEqual(respuesta.status_code, 200)
+        etag = respuesta.headers['ETag']
+        self.assertEqual(json.loads(respuesta.content)['series'][0]['valores'][-2], 20.0)
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self._get(HTTP_IF_MODIFIED_SINCE=respuesta.headers['Last-Modified']).status_code, 304)
+        # Una venta nueva cambia la marca del modelo y con ella la serie y su ETag
+        self._venta(self.a_las(11, dias=-1))
+        respuesta = self._get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta.headers['ETag'], etag)
+        self.assertEqual(json.loads(respuesta.content)['series'][0]['valores'][-2], 40.0)
+
+    def test_parametros(self):
+        url = reverse('barberia_admin:graficos', args=['ingresos'])
+        for datos in (
+            {'agrupacion': 'hora'},
+            {'desde': 'ayer'},
+            {'desde': '2026-02-01', 'hasta': '2026-01-01'},
+            {'desde': '2020-01-01', 'hasta': '2026-01-01', 'agrupacion': 'dia'},
+        ):
+            with self.subTest(datos=datos):
+                self.assertEqual(self.client.get(url, datos).status_code, 400)
+        self.assertEqual(self.client.get(url, {'desde': '2020-01-01', 'hasta': '2026-01-01', 'agrupacion': 'mes'}).status_code, 200)
+        self.assertEqual(self._get('desconocida').status_code, 404)
+        # Por defecto, el último año por día
+        self.assertEqual(graficos.parametros({}, hoy=date(2026, 6, 30)), (date(2025, 7, 1), date(2026, 6, 30), 'dia'))
+
+    def test_permisos(self):
+        self.assertEqual(self._get('ingresos').status_code, 200)
+        self.assertEqual(self._get('servicios').status_code, 200)
+        self.assertEqual(self._get('citas').status_code, 403)
+        self.usuario.user_permissions.add(Permission.objects.get(codename='view_cita'))
+        self.assertEqual(self._get('citas').status_code, 200)
+        # Sin staff, el admin redirige al login
+        self.client.force_login(User.objects.create_user('cliente', password='clave'))
+        self.assertEqual(self._get('ingresos').status_code, 302)
+
+    @override_settings(TIME_ZONE='Europe/Madrid')
+    def test_limites_de_periodo_en_hora_local(self):
+        # Domingo 01/03/2026 23:30 y lunes 02/03 00:30 en Madrid (ambos el domingo en UTC)
+        domingo, lunes = date(2026, 3, 1), date(2026, 3, 2)
+        self._venta(self._local(domingo, 23, 30), 10)
+        self._venta(self._local(lunes, 0, 30), 30)
+        self.crear_cita(self.empleado, self._local(domingo, 23, 30))
+        self.crear_cita(self.empleado, self._local(lunes, 0, 30))
+        self.crear_cita(self.empleado, self._local(lunes, 9))
+        _, series = graficos.ingresos(date(2026, 2, 23), lunes, 'semana')
+        self.assertEqual(series[0]['valores'], [10.0, 30.0])
+        lista, series = graficos.citas(date(2026, 2, 23), lunes, 'semana')
+        self.assertEqual(lista, [date(2026, 2, 23), lunes])
+        self.assertEqual(next(serie for serie in series if serie['nombre'] == 'Completada')['valores'], [1, 2])
+        # Por mes: 28/02 23:30 es febrero y 01/03 00:30 marzo
+        self.crear_cita(self.empleado, self._local(date(2026, 2, 28), 23, 30))
+        self.crear_cita(self.empleado, self._local(domingo, 0, 30))
+        lista, series = graficos.citas(date(2026, 2, 10), date(2026, 3, 20), 'mes')
+        self.assertEqual(lista, [date(2026, 2, 1), domingo])
+        self.assertEqual(next(serie for serie in series if serie['nombre'] == 'Completada')['valores'], [1, 4])
+
+
+class RendimientoTests(TestCase):
+    def setUp(self):
+        self.url = reverse('barberia_admin:rendimiento')
+        self.usuario = User.objects.create_user('recepcion', password='clave', is_staff=True)
+        self.client.force_login(self.usuario)
+
+    def test_mismo_permiso_que_el_menu(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.usuario.user_permissions.add(Permission.objects.get(codename='view_metricavista'))
+        respuesta = self.client.get(self.url)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse(respuesta.context['explain'])
+        self.assertEqual(self.client.post(self.url, {'reiniciar': '1'}).status_code, 403)
+
+    @override_settings(BARBERIA_INSTRUMENTACION={'EXPLAIN': True})
+    def test_explain_solo_superusuarios(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        self.assertTrue(self.client.get(self.url).context['explain'])
+        self.assertEqual(self.client.post(self.url, {'reiniciar': '1'}).status_code, 302)
+
+
+class AgendaCitaTests(DatosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.empleado = self.crear_empleado(descansos=((time(13), time(14)),))
+
+    def _validar(self, inicio, duracion=30, cita=None, empleado=None):
+        cita = cita or Cita(empleado=empleado or self.empleado, estado='pendiente')
+        cita.fecha_hora, cita.duracion_total = inicio, duracion
+        cita.validar_agenda()
+
+    def _rechazada(self, inicio, mensaje, **kwargs):
+        with self.assertRaisesMessage(ValidationError, mensaje):
+            self._validar(inicio, **kwargs)
+
+    def test_solape(self):
+        self.crear_cita(self.empleado, self.a_las(10), estado='confirmada')
+        self._rechazada(self.a_las(9, 45), 'se solapa')
+        self._rechazada(self.a_las(10, 15), 'se solapa')
+        self._rechazada(self.a_las(9, 30), 'se solapa', duracion=120)
+
+    def test_citas_seguidas_no_se_solapan(self):
+        self.crear_cita(self.empleado, self.a_las(10))
+        self._validar(self.a_las(9, 30))
+        self._validar(self.a_las(10, 30))
+
+    def test_cita_cancelada_no_ocupa(self):
+        self.crear_cita(self.empleado, self.a_las(10), estado='cancelada')
+        self._validar(self.a_las(10))
+
+    def test_cruce_de_medianoche(self):
+        # Un turno termina como muy tarde a medianoche: la cita que la cruza queda fuera
+        tarde = self.crear_empleado(turnos=((time(18), time(23, 59)),))
+        self._rechazada(self.a_las(23, 30), 'fuera del turno', duracion=60, empleado=tarde)
+        # Una cita del día anterior que termina pasada la medianoche ocupa el día siguiente
+        continuo = self.crear_empleado(turnos=((time(0), time(23, 59)),))
+        self.crear_cita(continuo, self.a_las(23, 45), estado='confirmada')
+        self._rechazada(self.a_las(0, 0, dias=2), 'se solapa', empleado=continuo)
+        self._validar(self.a_las(0, 15, dias=2), empleado=continuo)
+
+    def test_fuera_del_turno(self):
+        self._rechazada(self.a_las(8, 30), 'fuera del turno')
+        self._rechazada(self.a_las(17, 45), 'fuera del turno')
+        self._validar(self.a_las(17, 30))
+
+    def test_en_un_descanso(self):
+        self._rechazada(self.a_las(12, 45), 'descanso')
+        self._rechazada(self.a_las(13, 30), 'descanso')
+        self._validar(self.a_las(12, 30))
+        self._validar(self.a_las(14))
+
+    def test_edicion_de_una_cita_existente(self):
+        cita = self.crear_cita(self.empleado, self.a_las(10), estado='confirmada')
+        self.crear_cita(self.empleado, self.a_las(11), estado='confirmada')
+        # No choca consigo misma al moverla o alargarla
+        self._validar(self.a_las(10, 15), cita=cita)
+        self._validar(self.a_las(10), duracion=60, cita=cita)
+        self._rechazada(self.a_las(10, 45), 'se solapa', cita=cita)
+        # Al cancelarla deja de validarse
+        cita.estado = 'cancelada'
+        self._validar(self.a_las(10, 45), cita=cita)
+
+
+class DuracionCitasTests(DatosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.empleado = self.crear_empleado()
+        self.servicios = [self.crear_servicio(duracion=duracion) for duracion in (30, 20, 15)]
+
+    def _confirmar_pendientes(self):
+        # Las líneas creadas en el test no se confirman: sus marcas se recalculan aquí
+        duracion_citas.recalcular_pendientes()
+
+    def _duraciones(self, *citas):
+        return [Cita.objects.values_list('duracion_total', flat=True).get(pk=cita.pk) for cita in citas]
+
+    def _linea(self, cita, servicio):
+        return DetalleCita.objects.create(
+            cita=cita, servicio=servicio, precio_aplicado=servicio.precio, duracion_minutos=servicio.duracion_minutos,
+        )
+
+    def test_un_recalculo_por_transaccion(self):
+        cita = self.crear_cita(self.empleado, self.a_las(10))
+        self._confirmar_pendientes()
+        with mock.patch.object(duracion_citas, 'recalcular', wraps=duracion_citas.recalcular) as recalcular, \
+                self.captureOnCommitCallbacks(execute=True):
+            for servicio in self.servicios:
+                self._linea(cita, servicio)
+            recalcular.assert_not_called()
+        recalcular.assert_called_once_with({cita.pk}, 'default')
+        self.assertEqual(self._duraciones(cita), [65])
+
+    def test_linea_movida_a_otra_cita(self):
+        origen = self.crear_cita(self.empleado, self.a_las(10), servicios=self.servicios[:2])
+        destino = self.crear_cita(self.empleado, self.a_las(12), servicios=self.servicios[2:])
+        linea = DetalleCita.objects.get(cita=origen, servicio=self.servicios[1])
+        self._confirmar_pendientes()
+        with self.captureOnCommitCallbacks(execute=True):
+            linea.cita = destino
+            linea.save()
+        self.assertEqual(self._duraciones(origen, destino), [30, 35])
+        with self.captureOnCommitCallbacks(execute=True):
+            linea.delete()
+        self.assertEqual(self._duraciones(origen, destino), [30, 15])
+
+    def test_recompute_duraciones(self):
+        citas = [self.crear_cita(self.empleado, self.a_las(9 + hora), servicios=self.servicios[:hora + 1]) for hora in range(3)]
+        sin_lineas = self.crear_cita(self.empleado, self.a_las(14))
+        Cita.objects.filter(pk__in=[citas[0].pk, citas[2].pk, sin_lineas.pk]).update(duracion_total=999)
+        salida = StringIO()
+        call_command('recompute_duraciones', lote=2, stdout=salida)
+        self.assertIn('3 citas corregidas', salida.getvalue())
+        self.assertEqual(self._duraciones(*citas, sin_lineas), [30, 50, 65, 0])
+        salida = StringIO()
+        call_command('recompute_duraciones', stdout=salida)
+        self.assertIn('0 citas corregidas', salida.getvalue())
+
+
+class DisponibilidadTests(DatosMixin, TestCase):
+    # Motor de huecos (disponibilidad.py): turno de 9 a 18 con descanso de 13 a 14
+    def setUp(self):
+        super().setUp()
+        self.empleado = self.crear_empleado(descansos=((time(13), time(14)),))
+        self.corte = self.crear_servicio(duracion=30)
+
+    def _inicios(self, servicios=None, empleado=None, desde=None, dias=1, paso=15):
+        _, huecos = disponibilidad.buscar_huecos(
+            [servicio.pk for servicio in servicios or [self.corte]], desde=desde or fechas.hoy() + timedelta(days=1),
+            dias=dias, cantidad=500, empleado_id=(empleado or self.empleado).pk, paso=paso,
+        )
+        return [timezone.localtime(hueco['inicio']) for hueco in huecos]
+
+    def test_descanso_y_cierre(self):
+        inicios = self._inicios()
+        self.assertEqual(inicios[0], self.a_las(9))
+        self.assertEqual(inicios[-1], self.a_las(17, 30))
+        self.assertIn(self.a_las(12, 30), inicios)
+        self.assertNotIn(self.a_las(12, 45), inicios)
+        self.assertNotIn(self.a_las(13, 30), inicios)
+        self.assertIn(self.a_las(14), inicios)
+        # De 9:00 a 17:30 cada 15 minutos, sin 12:45 a 13:45
+        self.assertEqual(len(inicios), 35 - 5)
+
+    def test_citas_existentes_y_canceladas(self):
+        self.crear_cita(self.empleado, self.a_las(10), estado='confirmada')
+        self.crear_cita(self.empleado, self.a_las(11), estado='cancelada')
+        inicios = self._inicios()
+        self.assertIn(self.a_las(9, 30), inicios)
+        self.assertNotIn(self.a_las(9, 45), inicios)
+        self.assertNotIn(self.a_las(10), inicios)
+        self.assertNotIn(self.a_las(10, 15), inicios)
+        self.assertIn(self.a_las(10, 30), inicios)
+        self.assertIn(self.a_las(11), inicios)
+
+    def test_duracion_de_varios_servicios(self):
+        # 30 + 45 minutos: el último antes del descanso empieza a las 11:45
+        duracion, huecos = disponibilidad.buscar_huecos(
+            [self.corte.pk, self.crear_servicio(duracion=45).pk],
+            desde=fechas.hoy() + timedelta(days=1), dias=1, cantidad=500, empleado_id=self.empleado.pk,
+        )
+        inicios = [timezone.localtime(hueco['inicio']) for hueco in huecos]
+        self.assertEqual(duracion, 75)
+        self.assertEqual(huecos[0]['fin'] - huecos[0]['inicio'], timedelta(minutes=75))
+        self.assertIn(self.a_las(11, 45), inicios)
+        self.assertNotIn(self.a_las(12), inicios)
+        self.assertEqual(inicios[-1], self.a_las(16, 45))
+
+    def test_ventana_que_cruza_la_medianoche(self):
+        # La cita de las 23:30 ocupa los primeros 30 minutos del día siguiente
+        continuo = self.crear_empleado(turnos=((time(0), time(23, 59)),))
+        self.crear_cita(continuo, self.a_las(23, 30), servicios=[self.crear_servicio(duracion=60)], estado='confirmada')
+        inicios = self._inicios(empleado=continuo, dias=2)
+        self.assertNotIn(self.a_las(23, 30), inicios)
+        self.assertNotIn(self.a_las(0, 15, dias=2), inicios)
+        self.assertEqual([inicio for inicio in inicios if inicio.date() > fechas.hoy() + timedelta(days=1)][0], self.a_las(0, 30, dias=2))
+
+    @override_settings(TIME_ZONE='Europe/Madrid')
+    def test_cambio_de_hora(self):
+        continuo = self.crear_empleado(turnos=((time(0), time(23, 59)),))
+        # 28/03/2027: de 02:00 se pasa a 03:00, esa hora no existe y no se ofrece
+        primavera = self._inicios(empleado=continuo, desde=date(2027, 3, 28), paso=60)
+        self.assertEqual([inicio.hour for inicio in primavera], [0, 1] + list(range(3, 24)))
+        self.assertEqual(len(set(primavera)), len(primavera))
+        # 31/10/2027: de 03:00 se vuelve a 02:00; la 01:00 dura una hora real
+        _, huecos = disponibilidad.buscar_huecos(
+            [self.corte.pk], desde=date(2027, 10, 31), dias=1, cantidad=500, empleado_id=continuo.pk, paso=60,
+        )
+        self.assertEqual([timezone.localtime(hueco['inicio']).hour for hueco in huecos], list(range(24)))
+        self.assertTrue(all(hueco['fin'] - hueco['inicio'] == timedelta(minutes=30) for hueco in huecos))
+
+
+class BusquedaClientesTests(DatosMixin, TestCase):
+    # Buscador de clientes sobre busqueda_clientes_terminos (signals.py lo mantiene)
+    def setUp(self):
+        super().setUp()
+        for nombre, apellido, telefono in (
+            ('Luis', 'Ortiz', '600 000 009'),
+            ('Ana', 'Ruiz', '611111119'),
+            ('Zoe', 'Pérez', '622222220'),
+            ('Íñigo', 'Muñoz', '633333330'),
+            ('Ana', 'Gómez', '644444440'),
+        ):
+            Cliente.objects.create(nombre=nombre, apellido=apellido, telefono=telefono)
+
+    def _apellidos(self, texto, con_limite=True):
+        return sorted(cliente.apellido for cliente in busqueda_clientes.filtrar(Cliente.objects.all(), texto, con_limite))
+
+    def test_terminos_acabados_en_z_y_9(self):
+        # Con un rango [término, siguiente) '{' y ':' ordenan antes que letras y dígitos en MySQL
+        self.assertEqual(self._apellidos('ortiz'), ['Ortiz'])
+        self.assertEqual(self._apellidos('z'), ['Pérez'])
+        self.assertEqual(self._apellidos('MUÑOZ'), ['Muñoz'])
+        self.assertEqual(self._apellidos('0009'), ['Ortiz'])
+        self.assertEqual(self._apellidos('1119'), ['Ruiz'])
+        self.assertEqual(self._apellidos('611111119'), ['Ruiz'])
+
+    def test_filtrar(self):
+        for con_limite in (True, False):
+            with self.subTest(con_limite=con_limite):
+                # Prefijo, en medio de una palabra (trigramas), varios términos (AND) y teléfono
+                self.assertEqual(self._apellidos('an', con_limite), ['Gómez', 'Ruiz'])
+                self.assertEqual(self._apellidos('rti', con_limite), ['Ortiz'])
+                self.assertEqual(self._apellidos('ana ru', con_limite), ['Ruiz'])
+                self.assertEqual(self._apellidos('ana ortiz', con_limite), [])
+                self.assertEqual(self._apellidos('644-444 44', con_limite), ['Gómez'])
+                self.assertEqual(self._apellidos('  ', con_limite), ['Gómez', 'Muñoz', 'Ortiz', 'Pérez', 'Ruiz'])
+
+    def test_indice_al_editar(self):
+        cliente = Cliente.objects.get(apellido='Ortiz')
+        cliente.apellido = 'Sanz'
+        cliente.save()
+        self.assertEqual(self._apellidos('ortiz'), [])
+        self.assertEqual(self._apellidos('sanz'), ['Sanz'])
+
+    def test_paginador_sin_conteo(self):
+        paginador = PaginadorSinConteo(Cliente.objects.order_by('pk'), 2)
+        with CaptureQueriesContext(connection) as consultas:
+            paginas = [paginador.page(numero) for numero in (1, 2, 3)]
+        self.assertEqual([len(pagina) for pagina in paginas], [2, 2, 1])
+        self.assertEqual([pagina.has_next() for pagina in paginas], [True, True, False])
+        self.assertEqual(len(consultas), 3)
+        self.assertFalse(any('COUNT(' in consulta['sql'] for consulta in consultas))
+        self.assertEqual(len(paginador.page(4)), 0)
+        with self.assertRaises(PageNotAnInteger):
+            paginador.page('dos')
+        with self.assertRaises(EmptyPage):
+            paginador.page(0)
+
+    def test_autocompletado(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('barberia_admin:autocomplete'), {
+                'app_label': 'barberia_app', 'model_name': 'cita', 'field_name': 'cliente', 'term': 'ana',
+            })
+        self.assertEqual(respuesta.status_code, 200)
+        datos = json.loads(respuesta.content)
+        self.assertEqual(len(datos['results']), 2)
+        self.assertFalse(datos['pagination']['more'])
+        # Solo los conteos acotados del propio buscador, ningún COUNT(*) del paginador
+        self.assertFalse([
+            consulta for consulta in consultas if 'COUNT(*)' in consulta['sql'] and 'LIMIT' not in consulta['sql']
+        ])
+
+
+class ExportacionTests(DatosMixin, TestCase):
+    # Exportación en streaming (exportacion.py y la vista exportar)
+    def setUp(self):
+        super().setUp()
+        self.usuario = User.objects.create_user('contable', password='clave', is_staff=True)
+        self.usuario.user_permissions.add(*Permission.objects.filter(codename__in=['view_venta', 'view_detalleventa']))
+        self.client.force_login(self.usuario)
+        self.empleado = self.crear_empleado()
+        self.cliente = self.crear_cliente()
+
+    def _venta(self, momento, total=20, cliente=True):
+        return Venta.objects.create(
+            cliente=self.cliente if cliente else None, empleado=self.empleado, fecha_hora=momento,
+            subtotal=total, total=total, metodo_pago='efectivo',
+        )
+
+    def _exportar(self, nombre='ventas', **parametros):
+        respuesta = self.client.get(reverse('exportar', args=[nombre]), parametros)
+        if respuesta.status_code != 200:
+            return respuesta, None
+        return respuesta, b''.join(respuesta.streaming_content).decode()
+
+    def test_tramos_sin_duplicados_ni_huecos(self):
+        ventas = [self._venta(self.a_las(10, dias=-dia)) for dia in range(1, 9)]
+        # Huecos en la clave primaria: el tramo siguiente parte del último id leído
+        ventas.pop(2).delete()
+        ventas.pop(4).delete()
+        esperados = sorted(venta.pk for venta in ventas)
+        for lote in (1, 2, 3, 6, 10):
+            with self.subTest(lote=lote):
+                tramos = list(exportacion.tramos('ventas', exportacion.consulta('ventas'), lote))
+                self.assertEqual([fila[0] for tramo in tramos for fila in tramo], esperados)
+                self.assertTrue(all(len(tramo) <= lote for tramo in tramos))
+                lineas = ''.join(exportacion.lineas_csv('ventas', exportacion.consulta('ventas'), lote)).splitlines()
+                self.assertEqual([int(linea.split(',')[0]) for linea in lineas[1:]], esperados)
+
+    def test_csv(self):
+        venta = self._venta(self.a_las(10, dias=-1), total=Decimal('12.50'))
+        sin_cliente = self._venta(self.a_las(11, dias=-1), cliente=False)
+        respuesta, contenido = self._exportar(formato='csv')
+        self.assertEqual(respuesta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn(f'filename="ventas-{fechas.hoy()}.csv"', respuesta['Content-Disposition'])
+        encabezado, *filas = list(csv.reader(StringIO(contenido)))
+        self.assertEqual(tuple(encabezado), exportacion.EXPORTACIONES['ventas'][3])
+        self.assertEqual(filas[0], [
+            str(venta.pk), self.a_las(10, dias=-1).isoformat(), f'{self.cliente.nombre} Prueba',
+            f'{self.empleado.nombre} Prueba', '', '12.50', '0.00', '0.00', '12.50', 'efectivo', 'completada',
+        ])
+        self.assertEqual((filas[1][0], filas[1][2]), (str(sin_cliente.pk), ''))
+        # Sin filas, solo el encabezado
+        Venta.objects.all().delete()
+        self.assertEqual(self._exportar(formato='csv')[1].splitlines(), [','.join(encabezado)])
+
+    def test_jsonl(self):
+        venta = self._venta(self.a_las(10, dias=-1))
+        DetalleVenta.objects.create(
+            venta=venta, tipo='servicio', servicio=self.crear_servicio(), precio_unitario=20, subtotal_linea=20,
+        )
+        respuesta, contenido = self._exportar('detalle_ventas', formato='jsonl')
+        self.assertEqual(respuesta['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        filas = [json.loads(linea) for linea in contenido.splitlines()]
+        self.assertEqual(len(filas), 1)
+        self.assertEqual(filas[0]['venta_id'], venta.pk)
+        self.assertEqual((filas[0]['item'], filas[0]['subtotal_linea']), (DetalleVenta.objects.get().servicio.nombre, '20.00'))
+        self.assertEqual(self._exportar('detalle_ventas', formato='jsonl', desde=fechas.hoy().isoformat())[1], '')
+
+    @override_settings(TIME_ZONE='Europe/Madrid')
+    def test_filtros_por_dia_local(self):
+        hoy = fechas.hoy()
+        dentro = [self._venta(self.a_las(0, 0, dias=-2)), self._venta(self.a_las(23, 59, dias=-1))]
+        self._venta(self.a_las(23, 59, dias=-3))
+        self._venta(self.a_las(0, 0, dias=0))
+        _, contenido = self._exportar(
+            formato='jsonl', desde=(hoy - timedelta(days=2)).isoformat(), hasta=(hoy - timedelta(days=1)).isoformat(),
+        )
+        self.assertEqual([json.loads(linea)['venta_id'] for linea in contenido.splitlines()], [venta.pk for venta in dentro])
+        _, contenido = self._exportar(formato='jsonl', desde=hoy.isoformat())
+        self.assertEqual(len(contenido.splitlines()), 1)
+
+    def test_permisos_y_parametros(self):
+        self.assertEqual(self._exportar('movimientos')[0].status_code, 403)
+        self.usuario.user_permissions.add(Permission.objects.get(codename='view_movimientoinventario'))
+        self.assertEqual(self._exportar('movimientos')[0].status_code, 200)
+        self.assertEqual(self._exportar('clientes')[0].status_code, 404)
+        self.assertEqual(self._exportar(formato='xlsx')[0].status_code, 400)
+        self.assertEqual(self._exportar(desde='31/01/2026')[0].status_code, 400)
+        # Sin staff, al login del admin
+        self.client.force_login(User.objects.create_user('cliente', password='clave'))
+        self.assertEqual(self._exportar()[0].status_code, 302)
+
+
+class SeedBarberiaTests(TestCase):
+    # Una pasada pequeña del generador (manage.py seed_barberia): las filas deben
+    # ser coherentes entre sí y las columnas derivadas iguales a su reconstrucción
+    @classmethod
+    def setUpTestData(cls):
+        salida = StringIO()
+        call_command(
+            'seed_barberia', clientes=60, empleados=2, anios=1, citas_por_dia=1, ventas_mostrador=1,
+            hasta='2026-06-30', lote=100, stdout=salida,
+        )
+        cls.resultado = json.loads(salida.getvalue())
+
+    def test_tamano(self):
+        self.assertEqual(Cliente.objects.count(), 60)
+        self.assertEqual(Empleado.objects.count(), 2)
+        self.assertEqual(Cita.objects.count(), self.resultado['citas'])
+        self.assertEqual(Venta.objects.count(), self.resultado['ventas'])
+        self.assertTrue(200 < Cita.objects.count() + Venta.objects.count() < 1000)
+
+    def test_integridad_referencial(self):
+        connection.check_constraints()
+        self.assertFalse(Venta.objects.exclude(cita=None).exclude(cita__estado='completada').exists())
+        self.assertFalse(DetalleVenta.objects.filter(servicio=None, producto=None).exists())
+        self.assertFalse(Cita.objects.filter(detallecita=None).exists())
+
+    def test_columnas_derivadas(self):
+        # Stock: suma firmada de los movimientos de cada producto
+        movimientos = dict(
+            MovimientoInventario.objects.values('producto_id').annotate(total=Sum(inventario.delta_expr()))
+            .order_by().values_list('producto_id', 'total')
+        )
+        self.assertEqual(
+            dict(Producto.objects.values_list('pk', 'stock_actual')),
+            {producto_id: movimientos.get(producto_id, 0) for producto_id in Producto.objects.values_list('pk', flat=True)},
+        )
+        self.assertEqual(inventario.conciliar(), [])
+        # Duración de cada cita: la suma de sus líneas
+        self.assertEqual(duracion_citas.corregir_tramo(0, Cita.objects.aggregate(ultima=Max('pk'))['ultima'] + 1), 0)
+        # Visitas y gasto de los clientes, y resumen diario de ventas
+        clientes = list(Cliente.objects.order_by('pk').values_list('pk', 'visitas', 'gasto_total', 'ultima_visita'))
+        self.assertTrue(any(visitas for _, visitas, _, _ in clientes))
+        visitas_clientes.reconstruir()
+        self.assertEqual(list(Cliente.objects.order_by('pk').values_list('pk', 'visitas', 'gasto_total', 'ultima_visita')), clientes)
+        resumen = list(ResumenVentaDiario.objects.order_by('fecha', 'empleado_id', 'metodo_pago', 'estado').values_list(
+            'fecha', 'empleado_id', 'metodo_pago', 'estado', 'cantidad', 'total',
+        ))
+        call_command('reconstruir_resumen_ventas', stdout=StringIO())
+        self.assertEqual(list(ResumenVentaDiario.objects.order_by('fecha', 'empleado_id', 'metodo_pago', 'estado').values_list(
+            'fecha', 'empleado_id', 'metodo_pago', 'estado', 'cantidad', 'total',
+        )), resumen)
+
+
+class ComisionesTests(DatosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.empleado = self.crear_empleado(porcentaje_comision=10)
+        self.servicio = self.crear_servicio(precio=50)
+        self.producto = self.crear_producto(precio=20)
+        # Los dos meses terminados anteriores al actual
+        self.mes_abierto = comisiones.mes_de(comisiones.mes_de(fechas.hoy()) - timedelta(days=1))
+        self.mes_cerrado = comisiones.mes_de(self.mes_abierto - timedelta(days=1))
+
+    def _venta(self, mes, lineas, descuentos=0, estado='completada'):
+        subtotal = sum(item.precio if isinstance(item, Servicio) else item.precio_venta for item in lineas)
+        venta = Venta.objects.create(
+            empleado=self.empleado, fecha_hora=fechas.inicio_del_dia(mes.replace(day=15)) + timedelta(hours=12),
+            subtotal=subtotal, descuentos=descuentos, total=subtotal - descuentos, metodo_pago='efectivo', estado=estado,
+        )
+        for item in lineas:
+            es_servicio = isinstance(item, Servicio)
+            precio = item.precio if es_servicio else item.precio_venta
+            DetalleVenta.objects.create(
+                venta=venta, tipo='servicio' if es_servicio else 'producto',
+                servicio=item if es_servicio else None, producto=None if es_servicio else item,
+                precio_unitario=precio, subtotal_linea=precio,
+            )
+        return venta
+
+    def _ventas_del_mes(self, mes):
+        self._venta(mes, [self.servicio, self.producto], descuentos=5)
+        self._venta(mes, [self.servicio], estado='reembolsada')
+        self._venta(mes, [self.producto], estado='anulada')
+
+    def test_calcular(self):
+        self._ventas_del_mes(self.mes_cerrado)
+        datos = comisiones.calcular(self.mes_cerrado, self.mes_abierto)
+        self.assertEqual(list(datos), [(self.empleado.pk, self.mes_cerrado)])
+        self.assertEqual(datos[(self.empleado.pk, self.mes_cerrado)], {
+            'ventas': 1, 'reembolsos': 1, 'anulaciones': 1,
+            'ingresos_servicios': 50, 'ingresos_productos': 20, 'descuentos': 5,
+            'importe_reembolsos': 50, 'importe_anulaciones': 20,
+        })
+        self.assertEqual(comisiones.comision(datos[(self.empleado.pk, self.mes_cerrado)], 10), Decimal('6.50'))
+
+    def test_cerrar(self):
+        self._ventas_del_mes(self.mes_cerrado)
+        otro = self.crear_empleado()
+        self.assertEqual(comisiones.cerrar(self.mes_cerrado), 2)
+        periodo = PeriodoComision.objects.get(mes=self.mes_cerrado, empleado=self.empleado)
+        self.assertEqual((periodo.ventas, periodo.reembolsos, periodo.comision), (1, 1, Decimal('6.50')))
+        self.assertEqual(PeriodoComision.objects.get(mes=self.mes_cerrado, empleado=otro).comision, 0)
+        with self.assertRaisesMessage(ValueError, 'ya está cerrado'):
+            comisiones.cerrar(self.mes_cerrado)
+        with self.assertRaisesMessage(ValueError, 'aún no ha terminado'):
+            comisiones.cerrar(fechas.hoy())
+        self.assertEqual(PeriodoComision.objects.count(), 2)
+
+    def test_informe_meses_cerrados_y_abiertos(self):
+        self._ventas_del_mes(self.mes_cerrado)
+        comisiones.cerrar(self.mes_cerrado)
+        # Lo que cambia después del cierre ya no afecta al mes cerrado
+        Empleado.objects.filter(pk=self.empleado.pk).update(porcentaje_comision=20)
+        self._venta(self.mes_cerrado, [self.servicio])
+        self._ventas_del_mes(self.mes_abierto)
+
+        informe = comisiones.informe(self.mes_cerrado, self.mes_abierto)
+        self.assertEqual(
+            [(mes['mes'], mes['cerrado'], mes['cerrable']) for mes in informe['meses']],
+            [(self.mes_cerrado, True, True), (self.mes_abierto, False, True)],
+        )
+        fila, = [fila for fila in informe['empleados'] if fila['empleado_id'] == self.empleado.pk]
+        cerrado, abierto = fila['meses']
+        self.assertEqual((cerrado['ventas'], cerrado['comision']), (1, Decimal('6.50')))
+        self.assertEqual((abierto['ventas'], abierto['importe_reembolsos'], abierto['comision']), (1, 50, Decimal('13.00')))
+        self.assertEqual(fila['total']['comision'], Decimal('19.50'))
+        self.assertEqual(fila['total']['anulaciones'], 2)
+
+
+class VisitasClientesTests(DatosMixin, TestCase):
+    # Las signals (guardar y borrar) y las acciones en bloque del admin deben
+    # dejar los clientes igual que una reconstrucción completa
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+        self.empleado = self.crear_empleado()
+        self.clientes = [self.crear_cliente() for _ in range(3)]
+
+    def _venta(self, cliente, total, dias, cita=None):
+        return Venta.objects.create(
+            cliente=cliente, empleado=self.empleado, cita=cita, fecha_hora=self.a_las(12, dias=dias),
+            subtotal=total, total=total, metodo_pago='efectivo',
+        )
+
+    def _accion(self, modelo, accion, objetos):
+        respuesta = self.client.post(reverse(f'barberia_admin:barberia_app_{modelo}_changelist'), {
+            'action': accion, '_selected_action': [objeto.pk for objeto in objetos],
+        })
+        self.assertEqual(respuesta.status_code, 302)
+
+    def _estado(self):
+        return list(Cliente.objects.order_by('pk').values_list('pk', 'visitas', 'gasto_total', 'ultima_visita'))
+
+    def test_signals_y_acciones_igual_que_reconstruir(self):
+        uno, dos, tres = self.clientes
+        # Signals: altas, cambios de estado, de cliente y de fecha, y bajas
+        cita = self.crear_cita(self.empleado, self.a_las(10, dias=-5), cliente=uno)
+        self._venta(uno, 20, -5, cita=cita)
+        self._venta(uno, 15, -4)
+        retirada = self.crear_cita(self.empleado, self.a_las(11, dias=-3), cliente=dos)
+        retirada.estado = 'cancelada'
+        retirada.save()
+        movida = self._venta(dos, 30, -2)
+        movida.cliente = tres
+        movida.fecha_hora = self.a_las(12, dias=-6)
+        movida.save()
+        self._venta(tres, 50, -1).delete()
+        # Acciones en bloque del admin (update() sin signals)
+        pendientes = [
+            self.crear_cita(self.empleado, self.a_las(15, dias=-2), cliente=uno, estado='pendiente'),
+            self.crear_cita(self.empleado, self.a_las(16, dias=-1), cliente=dos, estado='confirmada'),
+        ]
+        self._accion('cita', 'marcar_como_completada', pendientes)
+        self._accion('cita', 'marcar_como_no_asistio', [cita])
+        self._accion('venta', 'marcar_como_reembolsada', Venta.objects.filter(cliente=uno, cita__isnull=True))
+
+        incremental = self._estado()
+        self.assertEqual([visitas for _, visitas, _, _ in incremental], [1, 1, 1])
+        visitas_clientes.reconstruir()
+        self.assertEqual(self._estado(), incremental)
+
+
+class ResumenVentasTests(DatosMixin, TestCase):
+    # El resumen diario mantenido por las signals debe coincidir con el que deja
+    # el comando de reconstrucción. Madrid para que el día local no sea el de UTC.
+    def setUp(self):
+        super().setUp()
+        self.empleado = self.crear_empleado()
+
+    def _venta(self, momento, total, metodo_pago='efectivo'):
+        return Venta.objects.create(
+            empleado=self.empleado, fecha_hora=momento, subtotal=total + 2, descuentos=2, total=total,
+            metodo_pago=metodo_pago,
+        )
+
+    def _estado(self):
+        # Las filas que quedan a cero tras mover o borrar una venta no aportan nada
+        return list(
+            ResumenVentaDiario.objects.filter(cantidad__gt=0)
+            .order_by('fecha', 'metodo_pago', 'estado')
+            .values_list('fecha', 'metodo_pago', 'estado', 'cantidad', 'subtotal', 'descuentos', 'total')
+        )
+
+    def _reconstruido(self):
+        call_command('reconstruir_resumen_ventas', stdout=StringIO())
+        return self._estado()
+
+    @override_settings(TIME_ZONE='Europe/Madrid')
+    def test_signals_igual_que_reconstruir(self):
+        hoy = fechas.hoy()
+        self._venta(self.a_las(10, dias=-3), 20)
+        editada = self._venta(self.a_las(11, dias=-3), 30)
+        editada.total = 35
+        editada.metodo_pago = 'tarjeta_debito'
+        editada.save()
+        reembolsada = self._venta(self.a_las(12, dias=-2), 40)
+        reembolsada.estado = 'reembolsada'
+        reembolsada.save()
+        self._venta(self.a_las(13, dias=-2), 50).delete()
+        # Cambio de día y, con la hora local, de medianoche: 23:30 y 00:30 en Madrid
+        movida = self._venta(self.a_las(23, 30, dias=-2), 15)
+        movida.fecha_hora = self.a_las(0, 30, dias=-1)
+        movida.save()
+
+        incremental = self._estado()
+        self.assertEqual(incremental, [
+            (hoy - timedelta(days=3), 'efectivo', 'completada', 1, Decimal('22'), Decimal('2'), Decimal('20')),
+            (hoy - timedelta(days=3), 'tarjeta_debito', 'completada', 1, Decimal('32'), Decimal('2'), Decimal('35')),
+            (hoy - timedelta(days=2), 'efectivo', 'reembolsada', 1, Decimal('42'), Decimal('2'), Decimal('40')),
+            (hoy - timedelta(days=1), 'efectivo', 'completada', 1, Decimal('17'), Decimal('2'), Decimal('15')),
+        ])
+        self.assertEqual(self._reconstruido(), incremental)
+
+    @override_settings(TIME_ZONE='Europe/Madrid')
+    def test_dia_local_y_no_utc(self):
+        # 00:30 en Madrid es el día anterior en UTC: cuenta en el día local
+        venta = self._venta(self.a_las(0, 30, dias=-1), 10)
+        fecha = fechas.hoy() - timedelta(days=1)
+        self.assertNotEqual(venta.fecha_hora.astimezone(dt_timezone.utc).date(), fecha)
+        self.assertEqual([fila[0] for fila in self._estado()], [fecha])
+        self.assertEqual(self._reconstruido(), [(fecha, 'efectivo', 'completada', 1, Decimal('12'), Decimal('2'), Decimal('10'))])
+
+
+class SegmentosClientesTests(DatosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        ahora = timezone.now()
+        for indice in range(12):
+            cliente = self.crear_cliente()
+            Cliente.objects.filter(pk=cliente.pk).update(
+                ultima_visita=ahora - timedelta(days=indice * 10), visitas=indice % 6 + 1, gasto_total=indice * 25,
+            )
+        self.crear_cliente()  # Sin visitas
+
+    def test_cortes_y_segmentos(self):
+        resultado = segmentos_clientes.calcular(lote=5)
+        # Quintiles de 12 valores: las posiciones 2, 4, 7 y 9 de cada columna ordenada
+        self.assertEqual(resultado['cortes'], {
+            'recencia_dias': [20, 40, 70, 90],
+            'frecuencia': [2, 3, 4, 5],
+            'monetario': [50.0, 100.0, 175.0, 225.0],
+        })
+        self.assertEqual(resultado['clientes'], 13)
+        self.assertEqual(resultado['segmentos']['sin_visitas'], 1)
+        self.assertEqual(SegmentoCliente.objects.count(), 13)
+
+    def test_recalculo_actualiza_los_segmentos(self):
+        segmentos_clientes.calcular()
+        Cliente.objects.update(ultima_visita=None)
+        # Sin columnas de conflicto (MySQL) el upsert se reparte en bulk_update y bulk_create
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            resultado = segmentos_clientes.calcular(lote=5)
+        self.assertEqual(resultado['segmentos']['sin_visitas'], 13)
+        self.assertEqual(set(SegmentoCliente.objects.values_list('segmento', flat=True)), {'sin_visitas'})
+        self.assertEqual(SegmentoCliente.objects.count(), 13)
+
+
+class ReposicionTests(DatosMixin, TestCase):
+    def test_recalculo_actualiza_los_pronosticos(self):
+        producto = self.crear_producto()
+        reposicion.calcular()
+        MovimientoInventario.objects.create(producto=producto, tipo_movimiento='salida_venta', cantidad=15)
+        nuevo = self.crear_producto()
+        # Sin columnas de conflicto (MySQL) el upsert se reparte en bulk_update y bulk_create
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            resumen = reposicion.calcular(lote=1)
+        self.assertEqual(resumen['productos'], 2)
+        self.assertEqual(
+            dict(PronosticoReposicion.objects.values_list('producto_id', 'stock')), {producto.pk: 5, nuevo.pk: 20},
+        )
+
+
+class ChecksTests(TestCase):
+    def _avisos(self, codigo, sufijo='.py'):
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta = Path(directorio) / f'modulo{sufijo}'
+            ruta.write_text(codigo, encoding='utf-8')
+            with mock.patch.object(checks, '_archivos', return_value=[ruta]):
+                return [int(aviso.msg.rsplit(':', 1)[1]) for aviso in checks.lookups_date(None)]
+
+    def test_lookup_date(self):
+        # El lookup se arma por partes para que este archivo no dispare el check
+        date = '__' + 'date'
+        codigo = '\n'.join([
+            f'Venta.objects.filter(fecha_hora{date}=hoy)',
+            f'Venta.objects.filter(fecha_hora{date}__gte=desde)',
+            f"Cita.objects.values('fecha_hora{date}')",
+            f'Venta.objects.filter(fecha_hora__gte=inicio)  # antes: fecha_hora{date}=hoy',
+            'Venta.objects.del_dia(hoy)',
+            f'Cita.objects.filter(fecha_hora{date}s=hoy)',
+        ])
+        self.assertEqual(self._avisos(codigo), [1, 2, 3])
+        self.assertEqual(self._avisos(f'{{{{ venta.fecha_hora{date} }}}}', '.html'), [1])
+
+    def test_sin_avisos_en_la_app(self):
+        self.assertEqual(checks.lookups_date(None), [])
+
+
+class ReservasApiTests(DatosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.empleado = self.crear_empleado()
+        self.servicios = [self.crear_servicio(duracion=30), self.crear_servicio(duracion=15)]
+
+    def _datos(self, **cambios):
+        datos = {
+            'servicios': [servicio.pk for servicio in self.servicios],
+            'empleado': self.empleado.pk,
+            'inicio': self.a_las(10).isoformat(),
+            'cliente': {'nombre': 'Ana', 'apellido': 'Prueba', 'telefono': '611000000'},
+        }
+        datos.update(cambios)
+        return datos
+
+    def _reservar(self, datos):
+        return self.client.post(reverse('reservas_crear'), json.dumps(datos), content_type='application/json')
+
+    def test_reserva_creada(self):
+        respuesta = self._reservar(self._datos())
+        self.assertEqual(respuesta.status_code, 201)
+        cita = Cita.objects.get(pk=respuesta.json()['cita_id'])
+        self.assertEqual((cita.empleado_id, cita.fecha_hora, cita.duracion_total), (self.empleado.pk, self.a_las(10), 45))
+        self.assertEqual(cita.cliente.telefono, '611000000')
+        self.assertEqual(cita.detallecita_set.count(), 2)
+        self.assertEqual(respuesta.json()['fin'], self.a_las(10, 45).isoformat())
+
+    def test_datos_invalidos(self):
+        for cambios in (
+            {'servicios': '12'},
+            {'servicios': [self.servicios[0].pk, '2']},
+            {'servicios': [True]},
+            {'servicios': []},
+            {'servicios': [self.servicios[0].pk + 100]},
+            {'cliente': {'nombre': 'Ana'}},
+            {'inicio': self.a_las(10, dias=-1).isoformat()},
+            {'empleado': self.empleado.pk + 100},
+        ):
+            with self.subTest(cambios):
+                self.assertEqual(self._reservar(self._datos(**cambios)).status_code, 400)
+        self.assertEqual(self.client.post(reverse('reservas_crear'), 'no es json', content_type='application/json').status_code, 400)
+        self.assertFalse(Cita.objects.exists())
+
+    def test_agenda_ocupada(self):
+        self.assertEqual(self._reservar(self._datos()).status_code, 201)
+        for inicio in (self.a_las(10), self.a_las(10, 30), self.a_las(8)):
+            with self.subTest(inicio):
+                respuesta = self._reservar(self._datos(inicio=inicio.isoformat()))
+                self.assertEqual(respuesta.status_code, 409)
+                self.assertIn('fecha_hora', respuesta.json()['error'])
+        self.assertEqual(Cita.objects.count(), 1)
+
+    def test_bloqueo_agotado(self):
+        # Espera del FOR UPDATE vencida o interbloqueo: conflicto, no un 500
+        for mensaje in ('Lock wait timeout exceeded', 'Deadlock found when trying to get lock'):
+            with self.subTest(mensaje), mock.patch.object(
+                Empleado.objects, 'select_for_update', side_effect=OperationalError(mensaje),
+            ):
+                respuesta = self._reservar(self._datos())
+                self.assertEqual(respuesta.status_code, 409)
+                self.assertIn('fecha_hora', respuesta.json()['error'])
+        self.assertFalse(Cita.objects.exists())
+        self.assertEqual(self._reservar(self._datos()).status_code, 201)
+
+    def test_disponibilidad(self):
+        self.crear_cita(self.empleado, self.a_las(9), estado='confirmada')
+        respuesta = self.client.get(reverse('reservas_disponibilidad'), {
+            'servicios': ','.join(str(servicio.pk) for servicio in self.servicios),
+            'desde': (fechas.hoy() + timedelta(days=1)).isoformat(), 'dias': 1, 'n': 1,
+        })
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['duracion_minutos'], 45)
+        self.assertEqual(respuesta.json()['huecos'][0]['inicio'], self.a_las(9, 30).isoformat())
+
+
+class CatalogoTests(DatosMixin, TransactionTestCase):
+    # Fuera de una transacción: dentro de una el catálogo no guarda su copia
+    def setUp(self):
+        super().setUp()
+        caches[catalogo.configuracion()['CACHE']].clear()
+        self.servicio = self.crear_servicio(precio=20)
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'clave'))
+
+    def tearDown(self):
+        auditoria.buffer.vaciar(esperar=True)
+        super().tearDown()
+
+    def _precio(self):
+        return catalogo.servicios()[self.servicio.pk]['precio']
+
+    def test_copia_vigente_sin_consultar_el_catalogo(self):
+        catalogo.obtener()
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self._precio(), 20)
+        tabla = connection.ops.quote_name(Servicio._meta.db_table)
+        self.assertFalse([consulta for consulta in consultas if tabla in consulta['sql']])
+
+    def test_guardado(self):
+        self.assertEqual(self._precio(), 20)
+        self.servicio.precio = 25
+        self.servicio.save()
+        self.assertEqual(self._precio(), 25)
+        self.servicio.delete()
+        self.assertNotIn(self.servicio.pk, catalogo.servicios())
+
+    def test_edicion_en_lista_del_admin(self):
+        self.assertEqual(self._precio(), 20)
+        respuesta = self.client.post(reverse('barberia_admin:barberia_app_servicio_changelist'), {
+            'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '1',
+            'form-0-servicio_id': self.servicio.pk, 'form-0-precio': '30', 'form-0-activo': 'on',
+            '_save': 'Guardar',
+        })
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(self._precio(), 30)
+
+    def test_acciones_del_admin(self):
+        url = reverse('barberia_admin:barberia_app_servicio_changelist')
+        self.assertIn(self.servicio.pk, catalogo.servicios())
+        self.client.post(url, {'action': 'marcar_como_inactivo', '_selected_action': [self.servicio.pk]})
+        self.assertNotIn(self.servicio.pk, catalogo.servicios())
+        self.client.post(url, {'action': 'marcar_como_activo', '_selected_action': [self.servicio.pk]})
+        self.assertIn(self.servicio.pk, catalogo.servicios())
+
+    def test_importacion(self):
+        self.assertEqual(self._precio(), 20)
+        resultado = importacion.importar('servicios', [
+            ['nombre', 'categoria', 'duracion_minutos', 'precio'], [self.servicio.nombre, 'Cortes', '30', '22'],
+        ])
+        self.assertEqual(resultado['actualizados'], 1)
+        resultado = importacion.importar('productos', [
+            ['nombre', 'categoria', 'precio_venta', 'precio_costo'], ['Cera', 'Ceras', '9', '4'],
+        ])
+        self.assertEqual(resultado['creados'], 1)
+        self.assertEqual(self._precio(), 22)
+        self.assertEqual([fila['nombre'] for fila in catalogo.productos().values()], ['Cera'])
+
+    def test_max_edad(self):
+        # Un update() sin invalidar() no renueva el sello: la copia dura hasta MAX_EDAD
+        self.assertEqual(self._precio(), 20)
+        Servicio.objects.update(precio=40)
+        self.assertEqual(self._precio(), 20)
+        with override_settings(BARBERIA_CATALOGO={**catalogo.configuracion(), 'MAX_EDAD': 0}):
+            self.assertEqual(self._precio(), 40)
+
+    def test_check_rechaza_cache_por_proceso(self):
+        # Sin BARBERIA_REDIS_URL la caché compartida es una LocMemCache y --deploy la rechaza
+        self.assertEqual([error.id for error in checks.cache_catalogo(None)], ['barberia_app.E002'] * 2)
+        redis = {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/1'}
+        with override_settings(CACHES={**settings.CACHES, 'compartida': redis}):
+            self.assertEqual(checks.cache_catalogo(None), [])
+        with override_settings(CACHES={**settings.CACHES, 'compartida': redis}, BARBERIA_CATALOGO={'CACHE': 'default'}):
+            self.assertEqual([error.id for error in checks.cache_catalogo(None)], ['barberia_app.E002'])
+        with override_settings(CACHES={**settings.CACHES, 'compartida': redis}, BARBERIA_CATALOGO={'CACHE': 'otra'}):
+            self.assertEqual([error.id for error in checks.cache_catalogo(None)], ['barberia_app.E001'])
+        # El dashboard también: sus widgets y marcas de cambio en una LocMemCache no se comparten
+        with override_settings(
+            CACHES={**settings.CACHES, 'compartida': redis}, BARBERIA_DASHBOARD_CACHE={'CACHE': 'default'},
+        ):
+            errores = checks.cache_catalogo(None)
+        self.assertEqual([error.id for error in errores], ['barberia_app.E002'])
+        self.assertIn("BARBERIA_DASHBOARD_CACHE['CACHE']", errores[0].hint)
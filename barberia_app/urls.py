@@ -5,5 +5,11 @@ urlpatterns = [
     # Otras URLs...
     path('admin/crear-venta/<int:cita_id>/', views.crear_venta_desde_cita, name='crear_venta'),
     path('crear-venta/<int:cita_id>/', views.crear_venta_desde_cita, name='crear_venta'),
+    path('api/disponibilidad/', views.disponibilidad, name='disponibilidad'),
+    path('api/exportar/<str:nombre>/', views.exportar, name='exportar'),
+    # Widget de reservas
+    path('api/reservas/servicios/', views.reservas_servicios, name='reservas_servicios'),
+    path('api/reservas/disponibilidad/', views.reservas_disponibilidad, name='reservas_disponibilidad'),
+    path('api/reservas/', views.reservas_crear, name='reservas_crear'),
 
 ]
\ No newline at end of file
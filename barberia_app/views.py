@@ -1,57 +1,171 @@
+import json
+from datetime import date, timedelta
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import ValidationError
+from django.http import Http404, JsonResponse
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_GET, require_POST
 from .models import Cita, Venta, DetalleVenta, DetalleCita
+from . import disponibilidad as motor_disponibilidad
+from . import exportacion, replicas, reservas
+from .generacion_ventas import generar_venta_desde_cita
 from django.utils import timezone
 from django.urls import path
 @staff_member_required
 def crear_venta_desde_cita(request, object_id):
     cita = get_object_or_404(Cita, pk=object_id)
     
-    # Verificar que la cita no tenga una venta ya asociada
-    try:
-        venta_existente = Venta.objects.get(cita=cita)
+    # Crea la venta y sus líneas en una sola transacción; si la cita ya
+    # tiene venta asociada se devuelve la existente
+    venta, creada = generar_venta_desde_cita(cita.pk)
+    if not creada:
         # Usa tu admin site personalizado si es necesario
-        return redirect('barberia_admin:barberia_app_venta_change', venta_existente.pk)
-    except Venta.DoesNotExist:
-        pass
-    
-    # Crear la venta
-    venta = Venta(
-        cliente=cita.cliente,
-        empleado=cita.empleado,
-        cita=cita,
-        fecha_hora=timezone.now(),
-        subtotal=0,
-        impuestos=0,
-        descuentos=0,
-        total=0,
-        metodo_pago='efectivo',  # Valor predeterminado
-        estado='completada'
-    )
-    venta.save()
-    
-    # Añadir servicios de la cita como detalles de venta
-    subtotal = 0
-    for detalle_cita in DetalleCita.objects.filter(cita=cita):
-        detalle_venta = DetalleVenta(
-            venta=venta,
-            tipo='servicio',
-            servicio=detalle_cita.servicio,
-            cantidad=1,
-            precio_unitario=detalle_cita.precio_aplicado,
-            descuento_aplicado=0,
-            subtotal_linea=detalle_cita.precio_aplicado
-        )
-        detalle_venta.save()
-        subtotal += detalle_cita.precio_aplicado
-    
-    # Actualizar totales
-    venta.subtotal = subtotal
-    venta.total = subtotal + venta.impuestos - venta.descuentos
-    venta.save()
+        return redirect('barberia_admin:barberia_app_venta_change', venta.pk)
     
     return redirect('admin:barberia_app_venta_change', venta.pk)
 
+def parametros_disponibilidad(datos):
+    # (servicio_ids, empleado_id, desde, dias, cantidad); ValueError si no son válidos
+    try:
+        servicio_ids = [int(valor) for valor in datos.get('servicios', '').split(',') if valor]
+        empleado_id = int(datos['empleado']) if datos.get('empleado') else None
+        desde = date.fromisoformat(datos['desde']) if datos.get('desde') else None
+        dias = min(max(int(datos.get('dias', 14)), 1), 60)
+        cantidad = min(max(int(datos.get('n', 10)), 1), 100)
+    except ValueError:
+        raise ValueError('Parámetros inválidos')
+    if not servicio_ids:
+        raise ValueError('Debe indicar al menos un servicio')
+    return servicio_ids, empleado_id, desde, dias, cantidad
+
+
+def respuesta_huecos(duracion, huecos):
+    return JsonResponse({
+        'duracion_minutos': duracion,
+        'huecos': [
+            {
+                'inicio': timezone.localtime(hueco['inicio']).isoformat(),
+                'fin': timezone.localtime(hueco['fin']).isoformat(),
+                'empleado_id': hueco['empleado_id'],
+            }
+            for hueco in huecos
+        ],
+    })
+
+
+@staff_member_required
+@require_GET
+def disponibilidad(request):
+    # GET /api/disponibilidad/?servicios=1,2[&empleado=3][&desde=YYYY-MM-DD][&dias=14][&n=10]
+    try:
+        servicio_ids, empleado_id, desde, dias, cantidad = parametros_disponibilidad(request.GET)
+        duracion, huecos = motor_disponibilidad.buscar_huecos(
+            servicio_ids, desde=desde, dias=dias, cantidad=cantidad, empleado_id=empleado_id
+        )
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return respuesta_huecos(duracion, huecos)
+
+
+# Widget de reservas en línea (ver reservas.py)
+
+@require_GET
+@ensure_csrf_cookie
+def reservas_servicios(request):
+    # GET /api/reservas/servicios/ — también entrega la cookie CSRF para reservar
+    return JsonResponse({'servicios': reservas.catalogo()})
+
+
+@require_GET
+def reservas_disponibilidad(request):
+    # GET /api/reservas/disponibilidad/ con los mismos parámetros que /api/disponibilidad/
+    try:
+        servicio_ids, empleado_id, desde, dias, cantidad = parametros_disponibilidad(request.GET)
+        duracion, huecos = motor_disponibilidad.buscar_huecos(
+            servicio_ids, desde=desde, dias=dias, cantidad=cantidad, empleado_id=empleado_id
+        )
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return respuesta_huecos(duracion, huecos)
+
+
+def datos_reserva(cuerpo):
+    # Argumentos de reservas.reservar desde el JSON de la petición; ValueError si no son válidos
+    try:
+        datos = json.loads(cuerpo)
+        servicio_ids = datos['servicios']
+        empleado_id = int(datos['empleado'])
+        inicio = parse_datetime(datos['inicio'])
+        cliente = {campo: str(datos['cliente'][campo]).strip() for campo in ('nombre', 'apellido', 'telefono')}
+        cliente['email'] = datos['cliente'].get('email')
+    except (KeyError, TypeError, AttributeError, json.JSONDecodeError):
+        raise ValueError('Datos de la reserva incompletos')
+    # Una lista de ids enteros: ni un texto ("12" se recorrería dígito a dígito) ni booleanos
+    if not isinstance(servicio_ids, list) or not all(
+        isinstance(valor, int) and not isinstance(valor, bool) for valor in servicio_ids
+    ):
+        raise ValueError('servicios debe ser una lista de ids enteros')
+    if not servicio_ids or inicio is None or not all(cliente[campo] for campo in ('nombre', 'apellido', 'telefono')):
+        raise ValueError('Datos de la reserva incompletos')
+    if timezone.is_naive(inicio):
+        inicio = timezone.make_aware(inicio)
+    if inicio <= timezone.now():
+        raise ValueError('La reserva debe ser en el futuro')
+    return servicio_ids, empleado_id, inicio, cliente, datos.get('notas')
+
+
+def respuesta_reserva(cita):
+    inicio = timezone.localtime(cita.fecha_hora)
+    return JsonResponse({
+        'cita_id': cita.pk,
+        'empleado_id': cita.empleado_id,
+        'inicio': inicio.isoformat(),
+        'fin': (inicio + timedelta(minutes=cita.duracion_total)).isoformat(),
+        'estado': cita.estado,
+    }, status=201)
+
+
+def error_reserva(exc):
+    # La agenda ocupada (también un bloqueo agotado) es un conflicto (409); el resto, datos inválidos (400)
+    if isinstance(exc, ValidationError):
+        errores = exc.message_dict if hasattr(exc, 'error_dict') else {'__all__': exc.messages}
+        return JsonResponse({'error': errores}, status=409 if 'fecha_hora' in errores else 400)
+    return JsonResponse({'error': str(exc)}, status=400)
+
+
+@require_POST
+def reservas_crear(request):
+    # POST /api/reservas/ {"servicios": [1, 2], "empleado": 3, "inicio": "2025-01-31T10:00",
+    #                      "cliente": {"nombre", "apellido", "telefono"[, "email"]}[, "notas"]}
+    try:
+        cita = reservas.reservar(*datos_reserva(request.body))
+    except (ValueError, ValidationError) as exc:
+        return error_reserva(exc)
+    return respuesta_reserva(cita)
+
+@staff_member_required
+@require_GET
+@replicas.vista_en_replica
+def exportar(request, nombre):
+    # GET /api/exportar/<ventas|detalle_ventas|movimientos>/?formato=csv|jsonl[&desde=YYYY-MM-DD][&hasta=YYYY-MM-DD]
+    if nombre not in exportacion.EXPORTACIONES:
+        raise Http404('Exportación desconocida')
+    modelo = exportacion.EXPORTACIONES[nombre][0]
+    if not request.user.has_perm(f'{modelo._meta.app_label}.view_{modelo._meta.model_name}'):
+        return JsonResponse({'error': 'Sin permiso'}, status=403)
+    formato = request.GET.get('formato', 'csv')
+    try:
+        desde = date.fromisoformat(request.GET['desde']) if request.GET.get('desde') else None
+        hasta = date.fromisoformat(request.GET['hasta']) if request.GET.get('hasta') else None
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    if formato not in exportacion.FORMATOS:
+        return JsonResponse({'error': 'Formato inválido'}, status=400)
+
+    return exportacion.respuesta(nombre, exportacion.consulta(nombre, desde, hasta), formato)
+
 def get_urls(self):
     urls = super().get_urls()
     custom_urls = [
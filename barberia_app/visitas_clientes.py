@@ -0,0 +1,130 @@
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, Max, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Cita, Cliente, EstadoCita, EstadoVenta, Venta
+
+
+# Mantenimiento incremental de Cliente.ultima_visita, visitas y gasto_total.
+# Una visita es una cita completada o una venta completada sin cita (mostrador);
+# el gasto es la suma del total de las ventas completadas. Cada cita o venta
+# aporta (cliente_id, visitas, gasto, fecha) y al guardarla se suma la
+# diferencia con su aporte anterior con un UPDATE de una fila. Si una visita se
+# retira o retrocede en el tiempo, la última visita de ese cliente se recalcula
+# desde citas y ventas. Los cambios en bloque usan un UPDATE por conjuntos.
+
+LOTE = 1000
+
+CAMPOS_CITA = ('cliente_id', 'estado', 'fecha_hora')
+CAMPOS_VENTA = ('cliente_id', 'cita_id', 'estado', 'total', 'fecha_hora')
+
+
+def _decimal(valor):
+    if isinstance(valor, Decimal):
+        return valor
+    return Decimal(str(valor or 0))
+
+
+def aporte_cita(datos):
+    # 'datos' puede ser una instancia de Cita o un dict con CAMPOS_CITA
+    if isinstance(datos, Cita):
+        datos = {campo: getattr(datos, campo) for campo in CAMPOS_CITA}
+    if not datos['cliente_id'] or datos['estado'] != EstadoCita.COMPLETADA:
+        return None
+    return datos['cliente_id'], 1, Decimal(0), datos['fecha_hora']
+
+
+def aporte_venta(datos):
+    # 'datos' puede ser una instancia de Venta o un dict con CAMPOS_VENTA.
+    # La venta de una cita suma gasto pero no otra visita.
+    if isinstance(datos, Venta):
+        datos = {campo: getattr(datos, campo) for campo in CAMPOS_VENTA}
+    if not datos['cliente_id'] or datos['estado'] != EstadoVenta.COMPLETADA:
+        return None
+    return datos['cliente_id'], 0 if datos['cita_id'] else 1, _decimal(datos['total']), datos['fecha_hora']
+
+
+def _sumar(cliente_id, visitas, gasto, fecha):
+    Cliente.objects.filter(pk=cliente_id).update(
+        visitas=F('visitas') + visitas,
+        gasto_total=F('gasto_total') + gasto,
+        ultima_visita=Greatest(Coalesce('ultima_visita', Value(fecha)), Value(fecha)),
+    )
+
+
+def registrar_cambio(anterior, actual):
+    # Se llama después de guardar o borrar: la BD ya tiene el estado nuevo
+    if anterior == actual:
+        return
+    if anterior is None:
+        _sumar(*actual)
+    elif actual is not None and actual[0] == anterior[0] and actual[3] >= anterior[3]:
+        _sumar(actual[0], actual[1] - anterior[1], actual[2] - anterior[2], actual[3])
+    else:
+        recalcular({anterior[0]} | ({actual[0]} if actual else set()))
+
+
+def _por_cliente(queryset, agregado):
+    return Subquery(
+        queryset.filter(cliente_id=OuterRef('pk')).order_by().values('cliente_id')
+        .annotate(valor=agregado).values('valor')
+    )
+
+
+def citas_completadas(cita_ids):
+    # Citas que acaban de pasar a completadas en bloque: un UPDATE por lote para todos sus clientes
+    cita_ids = sorted(cita_ids)
+    actualizados = 0
+    for inicio in range(0, len(cita_ids), LOTE):
+        citas = Cita.objects.filter(pk__in=cita_ids[inicio:inicio + LOTE], cliente__isnull=False)
+        ultima = _por_cliente(citas, Max('fecha_hora'))
+        actualizados += Cliente.objects.filter(pk__in=citas.values('cliente_id')).update(
+            visitas=F('visitas') + _por_cliente(citas, Count('pk')),
+            ultima_visita=Greatest(Coalesce('ultima_visita', ultima), ultima),
+        )
+    return actualizados
+
+
+def _calculados():
+    # Valores completos de cada cliente leídos de citas y ventas por sus índices de cliente_id
+    citas = Cita.objects.filter(estado=EstadoCita.COMPLETADA)
+    ventas = Venta.objects.filter(estado=EstadoVenta.COMPLETADA)
+    ultima_cita = _por_cliente(citas, Max('fecha_hora'))
+    ultima_venta = _por_cliente(ventas, Max('fecha_hora'))
+    return {
+        'visitas': (
+            Coalesce(_por_cliente(citas, Count('pk')), 0)
+            # Filtro dentro del COUNT: con cita_id IS NULL en el WHERE el motor puede
+            # elegir el índice único de cita_id y recorrer todas las ventas de mostrador
+            + Coalesce(_por_cliente(ventas, Count('pk', filter=Q(cita__isnull=True))), 0)
+        ),
+        'gasto_total': Coalesce(
+            _por_cliente(ventas, Sum('total')), Value(Decimal(0)),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        'ultima_visita': Greatest(Coalesce(ultima_cita, ultima_venta), Coalesce(ultima_venta, ultima_cita)),
+    }
+
+
+def recalcular(cliente_ids):
+    cliente_ids = sorted(cliente_ids)
+    actualizados = 0
+    for inicio in range(0, len(cliente_ids), LOTE):
+        actualizados += Cliente.objects.filter(pk__in=cliente_ids[inicio:inicio + LOTE]).update(**_calculados())
+    return actualizados
+
+
+def reconstruir(desde_pk=None, lote=LOTE * 5):
+    # Recalcula todos los clientes (o los de pk >= desde_pk) por tramos de cliente_id;
+    # cada tramo es un UPDATE. Devuelve los clientes actualizados.
+    clientes = Cliente.objects.all() if desde_pk is None else Cliente.objects.filter(pk__gte=desde_pk)
+    limite = clientes.aggregate(ultimo=Max('pk'))['ultimo']
+    if limite is None:
+        return 0
+    inicio = desde_pk or 0
+    total = 0
+    while inicio <= limite:
+        total += clientes.filter(pk__gte=inicio, pk__lt=inicio + lote).update(**_calculados())
+        inicio += lote
+    return total
@@ -78,6 +78,9 @@ JAZZMIN_SETTINGS = {
         "barberia_app.Servicio": "fas fa-cut",
         "barberia_app.Producto": "fas fa-shopping-bag",
         "barberia_app.Venta": "fas fa-cash-register",
+        "barberia_app.MetricaVista": "fas fa-tachometer-alt",
+        "barberia_app.PeriodoComision": "fas fa-percentage",
+        "barberia_app.PronosticoReposicion": "fas fa-truck-loading",
     },
     # Puedes añadir esto para que el dashboard sea la página predeterminada después de iniciar sesión
     "default_icon_parents": "fas fa-chevron-circle-right",
@@ -92,12 +95,24 @@ JAZZMIN_SETTINGS = {
             "url": "admin:barberia_app_cita_crear_venta",  # URL correcta con namespace del admin
             "icon": "fas fa-cash-register",
         }],
+        "barberia_app": [{
+            "name": "Rendimiento",
+            "url": "admin:rendimiento",
+            "icon": "fas fa-tachometer-alt",
+            "permissions": ["barberia_app.view_metricavista"],
+        }, {
+            "name": "Comisiones",
+            "url": "admin:comisiones",
+            "icon": "fas fa-percentage",
+            "permissions": ["barberia_app.view_periodocomision"],
+        }],
     },
 }
 
 
 
 MIDDLEWARE = [
+    'barberia_app.middleware.InstrumentacionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -105,6 +120,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'barberia_app.middleware.AuditoriaMiddleware',
+    'barberia_app.middleware.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'barberia_project.urls'
@@ -145,6 +162,91 @@ DATABASES = {
     }
 }
 
+# Réplica de solo lectura para dashboard, reportes, exportaciones y auditoría
+# (ver barberia_app/replicas.py). Se activa definiendo BARBERIA_DB_REPLICA_HOST;
+# sin el alias 'replica' todo se lee del primario.
+if os.environ.get('BARBERIA_DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['BARBERIA_DB_REPLICA_HOST'],
+        'PORT': os.environ.get('BARBERIA_DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'USER': os.environ.get('BARBERIA_DB_REPLICA_USER', DATABASES['default']['USER']),
+        # En los tests la réplica apunta a la base de pruebas del primario
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['barberia_app.replicas.RouterReplica']
+
+BARBERIA_REPLICA = {
+    'ALIAS': 'replica',
+    # Segundos que una sesión lee del primario después de un POST (retraso de replicación tolerado)
+    'PEGAJOSIDAD': 10,
+}
+
+
+# Caché
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# LocMemCache es local a cada proceso; en producción con varios workers usar
+# un backend compartido (Redis o Memcached) para que la invalidación sea global.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'barberia',
+    },
+    # Compartida por todos los workers: lo que deben ver todos a la vez (sello
+    # del catálogo, widgets del dashboard y marcas de cambio). Redis se activa
+    # definiendo BARBERIA_REDIS_URL; sin ella es una LocMemCache aparte, válida
+    # con un solo proceso ('manage.py check --deploy' lo rechaza, ver checks.py).
+    'compartida': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'barberia-compartida',
+    },
+}
+
+if os.environ.get('BARBERIA_REDIS_URL'):
+    CACHES['compartida'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['BARBERIA_REDIS_URL'],
+        'KEY_PREFIX': 'barberia',
+    }
+
+# Catálogo de servicios y productos en memoria (ver barberia_app/catalogo.py)
+BARBERIA_CATALOGO = {
+    'CACHE': 'compartida',
+    'MAX_EDAD': 300,
+}
+
+# Caché por widget del dashboard (ver barberia_app/dashboard.py)
+BARBERIA_DASHBOARD_CACHE = {
+    'CACHE': 'compartida',
+    'TIMEOUT': 60,
+    'STALE_WHILE_REVALIDATE': False,
+    'STALE_TTL': 300,
+}
+
+# Auditoría de la aplicación (ver barberia_app/auditoria.py)
+BARBERIA_AUDITORIA = {
+    'ACTIVA': True,
+    'TAMANO_LOTE': 100,
+    'MAX_PENDIENTES': 1000,
+    'INTERVALO': 5,
+    # Meses que se conservan en la tabla auditoria; los anteriores se archivan
+    # con 'manage.py archivar_auditoria' en DIRECTORIO_ARCHIVO
+    'RETENCION_MESES': 6,
+    'DIRECTORIO_ARCHIVO': os.path.join(BASE_DIR, 'archivo_auditoria'),
+}
+
+# Instrumentación de peticiones (ver barberia_app/instrumentacion.py y /admin/rendimiento/)
+BARBERIA_INSTRUMENTACION = {
+    'ACTIVA': True,
+    'MUESTREO': 1.0,
+    'CAPACIDAD': 2000,
+    'SENTENCIAS': 200,
+    'EXPLAIN': False,
+    # Segundos entre volcados a la tabla metricas_vistas; None solo guarda en memoria
+    'INTERVALO_VOLCADO': None,
+}
 
 
 # Password validation
@@ -0,0 +1,21 @@
+"""
+Settings de los tests: 'python manage.py test' los usa si no se indica otro
+DJANGO_SETTINGS_MODULE (ver manage.py).
+"""
+
+from .settings import *  # noqa: F401,F403
+
+
+# Primario y réplica como dos bases SQLite independientes, sin replicación entre
+# ellas: ReplicaRoutingTests escribe datos distintos en cada una para comprobar
+# de cuál se lee. El runner las crea en memoria.
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'barberia_test.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'barberia_test_replica.sqlite3',
+    },
+}